@@ -0,0 +1,47 @@
+"""add graph outbox
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7b8c9d0e1f2"
+down_revision: Union[str, None] = "f6a7b8c9d0e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "graphoutbox",
+        sa.Column("outbox_id", sa.Integer(), nullable=False),
+        sa.Column("operation", sa.String(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("dispatched_at", sa.DateTime(), nullable=True),
+        sa.Column("failed_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("outbox_id"),
+    )
+    op.create_index(
+        "ix_graphoutbox_pending",
+        "graphoutbox",
+        ["outbox_id"],
+        postgresql_where=sa.text("dispatched_at IS NULL AND failed_at IS NULL"),
+    )
+    op.create_index("ix_graphoutbox_dispatched_at", "graphoutbox", ["dispatched_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_graphoutbox_dispatched_at", table_name="graphoutbox")
+    op.drop_index("ix_graphoutbox_pending", table_name="graphoutbox")
+    op.drop_table("graphoutbox")
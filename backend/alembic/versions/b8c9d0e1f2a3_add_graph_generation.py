@@ -0,0 +1,51 @@
+"""add graph generation
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8c9d0e1f2a3"
+down_revision: Union[str, None] = "a7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "graphgeneration",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("generation", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_graph_generation() RETURNS trigger AS $$
+        BEGIN
+            UPDATE graphgeneration SET generation = generation + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER graphhistoryevent_generation
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON graphhistoryevent
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_graph_generation()
+        """
+    )
+    op.execute("INSERT INTO graphgeneration (id, generation) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER graphhistoryevent_generation ON graphhistoryevent")
+    op.execute("DROP FUNCTION bump_graph_generation()")
+    op.drop_table("graphgeneration")
@@ -0,0 +1,81 @@
+"""add rating aggregates
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6g7
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3d4e5f6a7b8"
+down_revision: Union[str, None] = "b2c3d4e5f6g7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    entity_type = postgresql.ENUM("node", "edge", name="entitytype", create_type=False)
+    op.create_table(
+        "ratingaggregate",
+        sa.Column("poll_label", sa.String(), nullable=False),
+        sa.Column("entity_type", entity_type, nullable=False),
+        sa.Column("entity_key", sa.String(), nullable=False),
+        sa.Column("node_id", sa.Integer(), nullable=True),
+        sa.Column("source_id", sa.Integer(), nullable=True),
+        sa.Column("target_id", sa.Integer(), nullable=True),
+        sa.Column("value", sa.Float(), nullable=True),
+        sa.Column("median", sa.Float(), nullable=True),
+        sa.Column("mean", sa.Float(), nullable=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("poll_label", "entity_type", "entity_key"),
+    )
+    op.create_index(
+        "ix_ratingaggregate_rank",
+        "ratingaggregate",
+        ["poll_label", "entity_type", "value", "count"],
+    )
+    op.create_index(
+        "ix_graphhistoryevent_node_timestamp",
+        "graphhistoryevent",
+        ["entity_type", "node_id", "timestamp"],
+    )
+
+    # Backfill from the existing rating log, using the median as aggregate.
+    # Polls configured with another aggregation are fixed up by
+    # RatingHistoryPostgreSQLDB.refresh_rating_aggregates().
+    op.execute(
+        """
+        INSERT INTO ratingaggregate
+               (poll_label, entity_type, entity_key, node_id, source_id,
+                target_id, value, median, mean, count, updated_at)
+        SELECT poll_label, entity_type,
+               CASE WHEN node_id IS NOT NULL THEN node_id::text
+                    ELSE source_id || '-' || target_id END,
+               node_id, source_id, target_id,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY rating),
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY rating),
+               avg(rating), count(*), now()
+          FROM (
+            SELECT DISTINCT ON (poll_label, entity_type, node_id, source_id,
+                                target_id, username)
+                   poll_label, entity_type, node_id, source_id, target_id, rating
+              FROM ratingevent
+             ORDER BY poll_label, entity_type, node_id, source_id, target_id,
+                      username, timestamp DESC
+          ) AS latest
+         GROUP BY poll_label, entity_type, node_id, source_id, target_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_graphhistoryevent_node_timestamp", table_name="graphhistoryevent")
+    op.drop_index("ix_ratingaggregate_rank", table_name="ratingaggregate")
+    op.drop_table("ratingaggregate")
@@ -0,0 +1,75 @@
+"""bump graph generation on commit
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c9d0e1f2a3b4"
+down_revision: Union[str, None] = "b8c9d0e1f2a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("graphgeneration", sa.Column("xact", sa.BigInteger(), nullable=True))
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_graph_generation() RETURNS trigger AS $$
+        BEGIN
+            UPDATE graphgeneration
+               SET generation = generation + 1, xact = txid_current()
+             WHERE xact IS DISTINCT FROM txid_current();
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute("DROP TRIGGER graphhistoryevent_generation ON graphhistoryevent")
+    op.execute(
+        """
+        CREATE CONSTRAINT TRIGGER graphhistoryevent_generation
+            AFTER INSERT OR UPDATE OR DELETE ON graphhistoryevent
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION bump_graph_generation()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER graphhistoryevent_generation_truncate
+            AFTER TRUNCATE ON graphhistoryevent
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_graph_generation()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER graphhistoryevent_generation_truncate ON graphhistoryevent"
+    )
+    op.execute("DROP TRIGGER graphhistoryevent_generation ON graphhistoryevent")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_graph_generation() RETURNS trigger AS $$
+        BEGIN
+            UPDATE graphgeneration SET generation = generation + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER graphhistoryevent_generation
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON graphhistoryevent
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_graph_generation()
+        """
+    )
+    op.drop_column("graphgeneration", "xact")
@@ -0,0 +1,38 @@
+"""add ratingevent user index
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d4e5f6a7b8c9"
+down_revision: Union[str, None] = "c3d4e5f6a7b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_ratingevent_user_entity",
+        "ratingevent",
+        [
+            "username",
+            "entity_type",
+            "node_id",
+            "source_id",
+            "target_id",
+            "poll_label",
+            "timestamp",
+        ],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ratingevent_user_entity", table_name="ratingevent")
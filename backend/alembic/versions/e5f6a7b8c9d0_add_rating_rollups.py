@@ -0,0 +1,49 @@
+"""add rating rollups
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-19 11:00:00.000000
+
+Existing ratings are rolled up with `python -m backend.db.rollups backfill`,
+which streams the event log instead of replaying it in one statement.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5f6a7b8c9d0"
+down_revision: Union[str, None] = "d4e5f6a7b8c9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    entity_type = postgresql.ENUM("node", "edge", name="entitytype", create_type=False)
+    rollup_bucket = sa.Enum("hour", "day", name="rollupbucket")
+    op.create_table(
+        "ratingrollup",
+        sa.Column("poll_label", sa.String(), nullable=False),
+        sa.Column("entity_type", entity_type, nullable=False),
+        sa.Column("entity_key", sa.String(), nullable=False),
+        sa.Column("bucket", rollup_bucket, nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("node_id", sa.Integer(), nullable=True),
+        sa.Column("source_id", sa.Integer(), nullable=True),
+        sa.Column("target_id", sa.Integer(), nullable=True),
+        sa.Column("value", sa.Float(), nullable=True),
+        sa.Column("median", sa.Float(), nullable=True),
+        sa.Column("mean", sa.Float(), nullable=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "poll_label", "entity_type", "entity_key", "bucket", "bucket_start"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ratingrollup")
+    sa.Enum(name="rollupbucket").drop(op.get_bind(), checkfirst=True)
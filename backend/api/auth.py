@@ -8,6 +8,7 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 
 from backend.models.fixed import (
+    User,
     UserCreate,
     UserRead,
     SignupToken,
@@ -16,14 +17,22 @@ from backend.models.fixed import (
 )
 from backend.db.base import UserDatabaseInterface
 from backend.db.postgresql import UserPostgreSQLDB
-from backend.utils.security import verify_password, hash_password
+from backend.db.postgresql_async import AsyncUserPostgreSQLDB
+from backend.utils.security import hash_password_async, verify_password_async
+from backend.utils.cache import LRUCache
+from backend.settings import settings
 from backend.config import (
     ALLOW_SIGNUP,
     SIGNUP_REQUIRES_ADMIN_APPROVAL,
     SIGNUP_REQUIRES_TOKEN,
 )
 from sqlmodel import Session, select
-from backend.db.connections import get_relational_session
+from backend.db.connections import (
+    get_relational_session,
+    run_db,
+    run_in_session,
+    service,
+)
 import secrets
 
 
@@ -38,6 +47,38 @@ REFRESH_TOKEN_EXPIRE_DAYS = 7
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
 
+# username -> (token_version, UserRead), so that requests bearing an up-to-date
+# access token are authenticated without touching the database
+_user_cache = LRUCache(
+    maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_user(username: str) -> None:
+    """Forget the cached copy of a user, e.g. after changing their roles."""
+    _user_cache.invalidate(username)
+
+
+def _cache_user(user: User) -> UserRead:
+    user_read = UserRead(
+        username=user.username,
+        preferences=user.preferences,
+        is_active=user.is_active,
+        is_admin=user.is_admin,
+        is_super_admin=user.is_super_admin,
+    )
+    _user_cache.set(user.username, (user.token_version, user_read))
+    return user_read
+
+
+def access_token_claims(user: User) -> dict:
+    """
+    Claims of an access token: the user and the version of their roles. The
+    roles themselves are read from the cached copy of the user, or the
+    database, which tells whether that version is still current.
+    """
+    return {"sub": user.username, "ver": user.token_version}
+
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -66,12 +107,12 @@ def get_user_db() -> UserDatabaseInterface:
     if not database_url:
         logger.error("Database URL not configured")
         raise HTTPException(status_code=500, detail="Database URL not configured")
-    logger.debug("Creating UserPostgreSQLDB instance")
-    return UserPostgreSQLDB(database_url)
+    cls = AsyncUserPostgreSQLDB if settings.DB_ASYNC else UserPostgreSQLDB
+    return service(("user_db", database_url, cls), lambda: cls(database_url))
 
 
 @router.post("/refresh")
-def refresh_token(
+async def refresh_token(
     token: str = Depends(oauth2_scheme),  # send refresh token as bearer token
     db: UserDatabaseInterface = Depends(get_user_db),
 ):
@@ -85,12 +126,13 @@ def refresh_token(
         logger.warning("JWT decode failed during refresh")
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.get_user(username)
+    user = await run_db(db.get_user, username)
     if not user:
         logger.warning(f"User not found during token refresh: {username}")
         raise HTTPException(status_code=401, detail="User not found")
+    _cache_user(user)
 
-    new_access_token = create_access_token(data={"sub": username})
+    new_access_token = create_access_token(data=access_token_claims(user))
     new_refresh_token = create_refresh_token(data={"sub": username})
     logger.info(f"New tokens issued for user: {username}")
     return {"access_token": new_access_token, "refresh_token": new_refresh_token}
@@ -119,22 +161,58 @@ async def get_current_user(
     except jwt.PyJWTError:
         logger.warning("JWT decode failed")
         raise credentials_exception
+    token_version = payload.get("ver", 0)
+
+    cached = _user_cache.get(username)
+    if cached is None or cached[0] != token_version:
+        # unknown here, or either the token or our copy is outdated; the
+        # lookup must not block the event loop
+        user = await run_db(db.get_user, username)
+        if not user:
+            logger.warning(f"User not found: {username}")
+            raise credentials_exception
+        cached = (user.token_version, _cache_user(user))
 
-    user = db.get_user(username)
-    if not user:
-        logger.warning(f"User not found: {username}")
-        raise credentials_exception
+    current_version, user = cached
+    if token_version != current_version:
+        # roles changed since the token was issued: the client must refresh
+        logger.warning(f"Outdated access token for user: {username}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token is outdated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     logger.info(f"Current user validated: {username}")
     return user
 
 
+def _use_signup_token(token: str, username: str, session: Session) -> None:
+    """Validate a signup token and mark it as used by `username`."""
+    statement = select(SignupToken).where(SignupToken.token == token)
+    signup_token = session.exec(statement).first()
+
+    if not signup_token:
+        raise HTTPException(status_code=400, detail="Invalid signup token")
+
+    if signup_token.used_by is not None:
+        raise HTTPException(
+            status_code=400, detail="This signup token has already been used"
+        )
+
+    # Mark token as used
+    signup_token.used_by = username
+    signup_token.used_at = datetime.now(timezone.utc)
+    session.add(signup_token)
+    session.commit()
+
+
 class SignupRequest(BaseModel):
     user: UserCreate
     signup_token: str | None = None
 
 
 @router.post("/signup", response_model=UserRead)
-def signup(
+async def signup(
     request: SignupRequest,
     db: UserDatabaseInterface = Depends(get_user_db),
     session: Session = Depends(get_relational_session),
@@ -147,23 +225,9 @@ def signup(
         if not request.signup_token:
             raise HTTPException(status_code=400, detail="Signup token is required")
 
-        # Validate the token
-        statement = select(SignupToken).where(SignupToken.token == request.signup_token)
-        signup_token = session.exec(statement).first()
-
-        if not signup_token:
-            raise HTTPException(status_code=400, detail="Invalid signup token")
-
-        if signup_token.used_by is not None:
-            raise HTTPException(
-                status_code=400, detail="This signup token has already been used"
-            )
-
-        # Mark token as used
-        signup_token.used_by = request.user.username
-        signup_token.used_at = datetime.now(timezone.utc)
-        session.add(signup_token)
-        session.commit()
+        await run_in_session(
+            session, _use_signup_token, request.signup_token, request.user.username
+        )
 
         logger.info(
             f"Signup token {request.signup_token[:8]}... used by {request.user.username}"
@@ -171,24 +235,26 @@ def signup(
 
     data = request.user.dict()
     data["is_active"] = not SIGNUP_REQUIRES_ADMIN_APPROVAL
-    created = db.create_user(UserCreate(**data))
+    created = await run_db(db.create_user, UserCreate(**data))
     # TODO: notify admin if SIGNUP_REQUIRES_ADMIN_APPROVAL
     return created
 
 
 @router.post("/login")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: UserDatabaseInterface = Depends(get_user_db),
 ):
     logger.info(f"Login attempt for user: {form_data.username}")
-    full_user = db.get_user(form_data.username)
-    if not full_user or not verify_password(form_data.password, full_user.password):
+    full_user = await run_db(db.get_user, form_data.username)
+    if not full_user or not await verify_password_async(
+        form_data.password, full_user.password
+    ):
         logger.warning(f"Failed login for user: {form_data.username}")
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     if not full_user.is_active:
         raise HTTPException(status_code=403, detail="Account pending approval")
-    access_token = create_access_token(data={"sub": full_user.username})
+    access_token = create_access_token(data=access_token_claims(full_user))
     refresh_token = create_refresh_token(data={"sub": full_user.username})
     logger.info(f"Access and refresh tokens issued for user: {full_user.username}")
     return {
@@ -199,11 +265,11 @@ def login(
 
 
 @router.get("/security-question")
-def get_security_question(
+async def get_security_question(
     username: str, db: UserDatabaseInterface = Depends(get_user_db)
 ):
     logger.info(f"Requesting security question for username: {username}")
-    user = db.get_user(username)
+    user = await run_db(db.get_user, username)
     if not user:
         logger.warning(f"User not found for security question: {username}")
         raise HTTPException(status_code=404, detail="User not found")
@@ -217,12 +283,12 @@ class VerifySecurityQuestionRequest(BaseModel):
 
 
 @router.post("/verify-security-question")
-def verify_security_question(
+async def verify_security_question(
     request: VerifySecurityQuestionRequest,
     db: UserDatabaseInterface = Depends(get_user_db),
 ):
     logger.info(f"Verifying security question answer for user: {request.username}")
-    user = db.get_user(request.username)
+    user = await run_db(db.get_user, request.username)
     if not user or user.security_answer.lower() != request.answer.lower():
         logger.warning(f"Incorrect security answer for user: {request.username}")
         raise HTTPException(
@@ -241,7 +307,7 @@ class ResetPasswordRequest(BaseModel):
 
 
 @router.post("/reset-password")
-def reset_password(
+async def reset_password(
     request: ResetPasswordRequest, db: UserDatabaseInterface = Depends(get_user_db)
 ):
     logger.info("Attempting password reset")
@@ -255,13 +321,13 @@ def reset_password(
         logger.warning("JWT decode failed during password reset")
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    user = db.get_user(username)
+    user = await run_db(db.get_user, username)
     if not user:
         logger.warning(f"User not found for password reset: {username}")
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.password = hash_password(request.new_password)
-    db.update_user(user)
+    user.password = await hash_password_async(request.new_password)
+    await run_db(db.update_user, user)
     logger.info(f"Password reset successfully for user: {username}")
     return {"msg": "Password reset successful"}
 
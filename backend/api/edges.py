@@ -4,9 +4,20 @@ import logging
 import datetime
 from typing import Optional
 
-from fastapi import Body, Depends, APIRouter, HTTPException, Query, status, Path
+from fastapi import (
+    Body,
+    Depends,
+    APIRouter,
+    HTTPException,
+    Query,
+    Request,
+    status,
+    Path,
+)
+from sqlmodel import Session
 
 from backend.api.auth import get_current_user
+from backend.utils.responses import ModelResponse, graph_etag, not_modified
 from backend.utils.permissions import (
     can_read,
     can_create,
@@ -26,7 +37,11 @@ from backend.db.connections import (
     get_graph_db,
     get_graph_history_db,
     get_rating_history_db,
+    get_unit_of_work,
+    run_db,
 )
+from backend.db.memory import MemoryGraphDB
+from backend.db.outbox import enqueue_graph_change, wait_for_graph
 from backend.models.dynamic import DynamicEdge, EdgeTypeModels
 from backend.models.fixed import (
     GraphHistoryEvent,
@@ -50,7 +65,7 @@ router = APIRouter(prefix="/edges", tags=["edges"])
     summary="Batch: list ratings for multiple edges",
     response_model=dict[str, list[RatingEvent]],
 )
-def get_edges_ratings(
+async def get_edges_ratings(
     edge_ids: list[str] = Query(..., description="List of 'src-tgt' edge IDs"),
     poll_label: str = Query(..., description="Label of the poll to filter ratings"),
     user: UserRead = Depends(get_current_user),
@@ -64,12 +79,12 @@ def get_edges_ratings(
         )
 
     pairs = [(int(s), int(t)) for s, t in (e.split("-") for e in edge_ids)]
-    raw = db.get_edges_ratings(pairs, poll_label)
+    raw = await run_db(db.get_edges_ratings, pairs, poll_label)
     return {f"{s}-{t}": evs for (s, t), evs in raw.items()}
 
 
 @router.get("/ratings/median")
-def get_edges_median_ratings(
+async def get_edges_median_ratings(
     edge_ids: list[str] = Query(
         ..., description="List of edges in form 'source-target'"  # no alias
     ),
@@ -97,7 +112,7 @@ def get_edges_median_ratings(
         src_str, tgt_str = key.split("-")
         edges.append((int(src_str), int(tgt_str)))
 
-    medians = db.get_edges_median_ratings(edges, poll_label)
+    medians = await run_db(db.get_edges_median_ratings, edges, poll_label)
     duration = datetime.datetime.now() - start_time
     logger.info(
         f"Retrieved median ratings for {len(edge_ids)} edges in {duration.total_seconds() * 1000:.2f}ms"
@@ -119,8 +134,9 @@ def get_edges_median_ratings(
 # **** Edge CRUD operations ****
 
 
-@router.get("")
-def get_edges(
+@router.get("", response_model=list[DynamicEdge])
+async def get_edges(
+    request: Request,
     node_ids: Optional[list[NodeId]] = Query(
         None, description="Optional list of node IDs to filter connections"
     ),
@@ -132,7 +148,7 @@ def get_edges(
     ),
     user: UserRead = Depends(get_current_user),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
-) -> list[DynamicEdge]:
+) -> ModelResponse:
     """Return edges, optionally filtered by node connections or source/target pair."""
     # Check read permissions
     if not can_read(user):
@@ -141,31 +157,35 @@ def get_edges(
             detail="You must be logged in to view content",
         )
 
+    tag = await graph_etag(request, db_history)
+    if (response := not_modified(request, tag)) is not None:
+        return response
+
     # If source and target are provided, retrieve the specific edge
     if source is not None and target is not None:
         try:
-            edge = db_history.get_edge(source, target)
-            return [edge]
+            edge = await run_db(db_history.get_edge, source, target)
+            return ModelResponse([edge], request, tag)
         except HTTPException:
             # Edge not found, return empty list
-            return []
+            return ModelResponse([], request, tag)
 
-    full_edge_list = db_history.get_edge_list()
+    full_edge_list = await run_db(db_history.get_edge_list)
     if node_ids:
         edge_list = []
         # Get connections between the specified nodes
         for edge in full_edge_list:
             if edge.source in node_ids and edge.target in node_ids:
                 edge_list += [edge]
-        return edge_list
-    return full_edge_list
+        return ModelResponse(edge_list, request, tag)
+    return ModelResponse(full_edge_list, request, tag)
 
 
 @router.post("", status_code=201)
-def create_edge(
+async def create_edge(
     payload: dict = Body(...),
-    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ) -> DynamicEdge:  # type: ignore
     """Create an edge."""
@@ -182,10 +202,11 @@ def create_edge(
         raise HTTPException(400, f"Unknown edge_type {et!r}")
     # TODO: validate payload further, within graph, against Graph Schema
     edge = Model(**payload)
+    db_history = db_history.with_session(uow)
 
     # Check if edge already exists (identified by source and target node IDs)
     try:
-        existing_edge = db_history.get_edge(edge.source, edge.target)
+        existing_edge = await run_db(db_history.get_edge, edge.source, edge.target)
         # Edge already exists, return 409 Conflict with the existing edge data
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -200,17 +221,18 @@ def create_edge(
         if e.status_code != 404:
             raise
 
-    out_edge = db_history.create_edge(edge, username=user.username)
-    if db_graph is not None:
-        db_graph.create_edge(edge)
+    out_edge = await run_db(db_history.create_edge, edge, username=user.username)
+    outbox_id = await enqueue_graph_change(uow, "create_edge", edge=edge)
+    await run_db(uow.commit)
+    await wait_for_graph(outbox_id)
     return out_edge
 
 
 @router.put("")
-def update_edge(
+async def update_edge(
     payload: dict = Body(...),
-    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ) -> DynamicEdge:  # type: ignore
     """Update the properties of an edge."""
@@ -232,7 +254,8 @@ def update_edge(
     if not source_id or not target_id:
         raise HTTPException(400, "source and target are required for edge updates")
 
-    current_edge = db_history.get_edge(source_id, target_id)
+    db_history = db_history.with_session(uow)
+    current_edge = await run_db(db_history.get_edge, source_id, target_id)
     current_status = getattr(current_edge, "status", None) or "live"
 
     # Check field-level permissions based on status
@@ -266,18 +289,20 @@ def update_edge(
 
     # TODO: validate payload further, within graph, against Graph Schema
     edge = Model(**payload)
-    out_edge = db_history.update_edge(edge, username=user.username)
-    if db_graph is not None:
-        db_graph.update_edge(edge)
+    out_edge = await run_db(db_history.update_edge, edge, username=user.username)
+    outbox_id = await enqueue_graph_change(uow, "update_edge", edge=edge)
+    await run_db(uow.commit)
+    await wait_for_graph(outbox_id)
     return out_edge
 
 
 @router.post("/find")
-def find_edges(
+async def find_edges(
     source_id: NodeId = None,
     target_id: NodeId = None,
     edge_type: str = None,
     user: UserRead = Depends(get_current_user),
+    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
 ) -> list[DynamicEdge]:  # type: ignore
     """Return the edge associated with the provided ID."""
@@ -288,13 +313,17 @@ def find_edges(
             detail="You must be logged in to view content",
         )
 
-    return db_history.find_edges(
-        source_id=source_id, target_id=target_id, edge_type=edge_type
+    db = db_graph if isinstance(db_graph, MemoryGraphDB) else db_history
+    return await run_db(
+        db.find_edges,
+        source_id=source_id,
+        target_id=target_id,
+        edge_type=edge_type,
     )
 
 
 @router.get("/{source_id}/{target_id}")
-def get_edge(
+async def get_edge(
     source_id: NodeId,
     target_id: NodeId,
     user: UserRead = Depends(get_current_user),
@@ -308,16 +337,16 @@ def get_edge(
             detail="You must be logged in to view content",
         )
 
-    return db_history.get_edge(source_id, target_id)
+    return await run_db(db_history.get_edge, source_id, target_id)
 
 
 @router.delete("/{source_id}/{target_id}")
-def delete_edge(
+async def delete_edge(
     source_id: NodeId,
     target_id: NodeId,
     edge_type: str | None = None,
-    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ):
     """Delete the edge between two nodes and for an optional edge_type."""
@@ -328,13 +357,26 @@ def delete_edge(
             detail="Insufficient permissions to delete edges",
         )
 
-    db_history.delete_edge(source_id, target_id, edge_type, username=user.username)
-    if db_graph is not None:
-        db_graph.delete_edge(source_id, target_id, edge_type)
+    await run_db(
+        db_history.with_session(uow).delete_edge,
+        source_id,
+        target_id,
+        edge_type,
+        username=user.username,
+    )
+    outbox_id = await enqueue_graph_change(
+        uow,
+        "delete_edge",
+        source_id=source_id,
+        target_id=target_id,
+        edge_type=edge_type,
+    )
+    await run_db(uow.commit)
+    await wait_for_graph(outbox_id)
 
 
 @router.get("/{source_id}/{target_id}/history")
-def get_edge_history(
+async def get_edge_history(
     source_id: NodeId,
     target_id: NodeId,
     user: UserRead = Depends(get_current_user),
@@ -348,7 +390,7 @@ def get_edge_history(
             detail="You must be logged in to view content",
         )
 
-    return db_history.get_edge_history(source_id, target_id)
+    return await run_db(db_history.get_edge_history, source_id, target_id)
 
 
 # ****  per-edge ratings ****
@@ -363,7 +405,7 @@ ratings_router = APIRouter(
 @ratings_router.post(
     "", status_code=status.HTTP_201_CREATED, response_model=RatingEvent
 )
-def log_edge_rating(
+async def log_edge_rating(
     source_id: int = Path(...),
     target_id: int = Path(...),
     rating: RatingEvent = Body(...),
@@ -379,7 +421,7 @@ def log_edge_rating(
         )
 
     # Get the edge to check its status
-    edge = db_history.get_edge(source_id, target_id)
+    edge = await run_db(db_history.get_edge, source_id, target_id)
     edge_status = getattr(edge, "status", None) or "live"
 
     # Check if user can rate based on edge status
@@ -393,11 +435,11 @@ def log_edge_rating(
     rating.username = user.username
     rating.source_id = source_id
     rating.target_id = target_id
-    return db.log_rating(rating)
+    return await run_db(db.log_rating, rating)
 
 
 @ratings_router.get("/me")  # /rating/edge/{source_id}/{target_id}
-def get_edge_rating(
+async def get_edge_rating(
     source_id: int,
     target_id: int,
     poll_label: str,
@@ -407,11 +449,13 @@ def get_edge_rating(
     """
     Retrieve a user's rating for an edge.
     """
-    return db.get_edge_rating(source_id, target_id, poll_label, user.username)
+    return await run_db(
+        db.get_edge_rating, source_id, target_id, poll_label, user.username
+    )
 
 
 @ratings_router.get("/median")
-def get_edge_median_rating(
+async def get_edge_median_rating(
     source_id: int,
     target_id: int,
     poll_label: str,
@@ -429,12 +473,12 @@ def get_edge_median_rating(
         )
 
     logger.warning("Function may not be working as expected")
-    median = db.get_edge_median_rating(source_id, target_id, poll_label)
+    median = await run_db(db.get_edge_median_rating, source_id, target_id, poll_label)
     return {"median_rating": median}
 
 
 @ratings_router.get("")
-def get_edge_ratings(
+async def get_edge_ratings(
     source_id: int,
     target_id: int,
     poll_label: str
@@ -452,7 +496,7 @@ def get_edge_ratings(
             detail="You must be logged in to view content",
         )
 
-    ratings = db.get_edge_ratings(source_id, target_id, poll_label)
+    ratings = await run_db(db.get_edge_ratings, source_id, target_id, poll_label)
     # Convert each RatingEvent to dict.
     return {"ratings": ratings}
 
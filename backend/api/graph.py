@@ -2,14 +2,22 @@ import datetime
 from typing import Annotated
 import logging
 
-from fastapi import Depends, Query, status, APIRouter, HTTPException
+from fastapi import Depends, Query, Request, status, APIRouter, HTTPException
+from sqlmodel import Session
 
 from backend.api.auth import get_current_user
 from backend.config import EDGE_TYPE_BETWEEN, EDGE_TYPE_PROPS, NODE_TYPE_PROPS
 from backend.db.base import GraphDatabaseInterface, GraphHistoryRelationalInterface
-from backend.db.connections import get_graph_db, get_graph_history_db
+from backend.db.connections import (
+    get_graph_db,
+    get_graph_history_db,
+    get_unit_of_work,
+    run_db,
+)
+from backend.db.outbox import enqueue_graph_change, wait_for_graph
 from backend.models.dynamic import DynamicGraphExport, DynamicSubgraph
 from backend.models.fixed import NodeId, UserRead
+from backend.utils.responses import ModelResponse, graph_etag, not_modified
 from backend.version import __version__
 
 logger = logging.getLogger(__name__)
@@ -17,26 +25,37 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/graph", tags=["graph"])
 
 
-@router.get("")
-def get_whole_graph(
+@router.get("", response_model=DynamicGraphExport)
+async def get_whole_graph(
+    request: Request,
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
-) -> DynamicGraphExport:
+) -> ModelResponse:
     """Return full graph of nodes and edges from the database."""
     from backend.config import get_current_config_version, get_current_config_hash
 
-    out = db_history.get_whole_graph().model_dump()
-    out["commongraph_version"] = __version__
-    out["timestamp"] = datetime.datetime.now().isoformat()
-    out["schema_version"] = get_current_config_version()
-    out["schema_hash"] = get_current_config_hash()
-    return out
+    tag = await graph_etag(request, db_history)
+    if (response := not_modified(request, tag)) is not None:
+        return response
+    graph = await run_db(db_history.get_whole_graph)
+    return ModelResponse(
+        DynamicGraphExport.model_construct(
+            commongraph_version=__version__,
+            timestamp=datetime.datetime.now(),
+            schema_version=get_current_config_version(),
+            schema_hash=get_current_config_hash(),
+            nodes=graph.nodes,
+            edges=graph.edges,
+        ),
+        request,
+        tag,
+    )
 
 
 @router.put("")
-def update_subgraph(
+async def update_subgraph(
     subgraph: DynamicSubgraph,
-    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ) -> DynamicSubgraph:
     """Add missing nodes and edges and update existing ones (given IDs)."""
@@ -47,16 +66,19 @@ def update_subgraph(
             detail="Insufficient permissions to edit the graph.",
         )
 
-    out_subgraph = db_history.update_graph(subgraph, username=user.username)
-    if db_graph is not None:
-        db_graph.update_graph(subgraph)
+    out_subgraph = await run_db(
+        db_history.with_session(uow).update_graph, subgraph, username=user.username
+    )
+    outbox_id = await enqueue_graph_change(uow, "update_graph", subgraph=subgraph)
+    await run_db(uow.commit)
+    await wait_for_graph(outbox_id)
     return out_subgraph
 
 
 @router.delete("", status_code=status.HTTP_205_RESET_CONTENT)
-def reset_whole_graph(
-    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
+async def reset_whole_graph(
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ) -> None:
     """Delete all nodes and edges. Be careful!"""
@@ -66,21 +88,22 @@ def reset_whole_graph(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only super admins can reset the whole graph.",
         )
-    db_history.reset_whole_graph(username=user.username)
-    if db_graph is not None:
-        db_graph.reset_whole_graph()
+    await run_db(db_history.with_session(uow).reset_whole_graph, username=user.username)
+    outbox_id = await enqueue_graph_change(uow, "reset_whole_graph")
+    await run_db(uow.commit)
+    await wait_for_graph(outbox_id)
 
 
 @router.get("/summary")
-def get_graph_summary(
+async def get_graph_summary(
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
 ) -> dict[str, int]:
     """Count nodes and edges."""
-    return db_history.get_graph_summary()
+    return await run_db(db_history.get_graph_summary)
 
 
 @router.get("/schema")
-def get_schema():
+async def get_schema():
     """Return the schema of the graph database, as a graph."""
     edge_types = []
     for edge_type in EDGE_TYPE_PROPS.keys():
@@ -113,16 +136,22 @@ def get_schema():
 
 
 # needs to be placed after /schema and /summary
-@router.get("/{node_id}")
-def get_induced_subgraph(
+@router.get("/{node_id}", response_model=DynamicSubgraph)
+async def get_induced_subgraph(
     node_id: NodeId,
+    request: Request,
     levels: Annotated[int, Query(get=0)] = 2,
+    max_degree: Annotated[int | None, Query(ge=1)] = None,
     db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
-) -> DynamicSubgraph:
+) -> ModelResponse:
     """Return the subgraph induced from a particular element with an optional limit number of connections.
     If no neighbour is found, a singleton subgraph with a single node is returned from the provided ID.
+    With max_degree, each hop follows at most that many connections per node.
     """
-    if db_graph is not None:
-        return db_graph.get_induced_subgraph(node_id, levels)
-    return db_history.get_induced_subgraph(node_id, levels)
+    db = db_graph if db_graph is not None else db_history
+    tag = await graph_etag(request, db)
+    if (response := not_modified(request, tag)) is not None:
+        return response
+    subgraph = await run_db(db.get_induced_subgraph, node_id, levels, max_degree)
+    return ModelResponse(subgraph, request, tag)
@@ -1,10 +1,20 @@
 import logging
 import datetime
 
-from fastapi import Body, Depends, HTTPException, Query, APIRouter, status, Path
+from fastapi import (
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    APIRouter,
+    Request,
+    status,
+    Path,
+)
 from sqlmodel import Session
 
 from backend.api.auth import get_current_user
+from backend.utils.responses import ModelResponse, graph_etag, not_modified
 from backend.utils.permissions import (
     can_read,
     can_create,
@@ -24,8 +34,11 @@ from backend.db.connections import (
     get_graph_db,
     get_graph_history_db,
     get_rating_history_db,
-    get_relational_session,
+    get_unit_of_work,
+    run_db,
+    run_in_session,
 )
+from backend.db.outbox import enqueue_graph_change, wait_for_graph
 from backend.db.janusgraph import JanusGraphDB
 from backend.models.fixed import (
     GraphHistoryEvent,
@@ -33,6 +46,7 @@ from backend.models.fixed import (
     RatingEvent,
     UserRead,
     EntityType,
+    RollupBucket,
 )
 from backend.models.dynamic import (
     DynamicNode,
@@ -41,6 +55,7 @@ from backend.models.dynamic import (
     DynamicSubgraph,
 )
 from backend.properties import NodeStatus
+from backend.settings import settings
 from backend.api.scopes import get_or_create_scope
 
 logger = logging.getLogger(__name__)
@@ -49,7 +64,8 @@ router = APIRouter(prefix="/nodes", tags=["nodes"])
 
 
 @router.get("", response_model=list[NodeSearchResult])
-def search_nodes(
+async def search_nodes(
+    request: Request,
     node_type: list[str] | str = Query(None),
     title: str | None = None,
     scope: str | None = None,
@@ -69,9 +85,20 @@ def search_nodes(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You must be logged in to view content",
         )
+    if rating is not None:
+        raise HTTPException(
+            status_code=400, detail="Search by rating is not supported currently. "
+        )
+        # nodes_ids = [el.node_id for el in nodes]
+        # medians = db_ratings.get_nodes_median_ratings(nodes_ids, RatingType.support)
+        # return [node for node in nodes if medians[node.node_id] == rating]
 
+    tag = await graph_etag(request, db_graph if db_graph is not None else db_history)
+    if (response := not_modified(request, tag)) is not None:
+        return response
     if db_graph is not None:
-        nodes = db_graph.search_nodes(
+        nodes = await run_db(
+            db_graph.search_nodes,
             node_type=node_type,
             title=title,
             scope=scope,
@@ -80,7 +107,8 @@ def search_nodes(
             description=description,
         )
     else:
-        nodes = db_history.search_nodes(
+        nodes = await run_db(
+            db_history.search_nodes,
             node_type=node_type,
             title=title,
             scope=scope,
@@ -91,7 +119,7 @@ def search_nodes(
     out: list[NodeSearchResult] = []
     for node in nodes:
         # grab last event timestamp
-        history = db_history.get_node_history(node.node_id)
+        history = await run_db(db_history.get_node_history, node.node_id)
         last_ts = (
             history[-1].timestamp
             if history
@@ -101,20 +129,12 @@ def search_nodes(
         payload = node.model_dump()
         payload["last_modified"] = last_ts
         out.append(NodeSearchResult(**payload))
-
-    if rating is None:
-        return out
-    else:
-        raise HTTPException(
-            status_code=400, detail="Search by rating is not supported currently. "
-        )
-        # nodes_ids = [el.node_id for el in nodes]
-        # medians = db_ratings.get_nodes_median_ratings(nodes_ids, RatingType.support)
-        # return [node for node in nodes if medians[node.node_id] == rating]
+    return ModelResponse(out, request, tag)
 
 
-@router.get("/subgraph")
-def search_nodes_subgraph(
+@router.get("/subgraph", response_model=DynamicSubgraph)
+async def search_nodes_subgraph(
+    request: Request,
     node_type: list[str] | str = Query(None),
     title: str | None = None,
     scope: str | None = None,
@@ -125,10 +145,15 @@ def search_nodes_subgraph(
         1,
         description="Number of connection levels to include (0=only search results, 1=direct connections, etc.)",
     ),
+    max_elements: int = Query(
+        None,
+        ge=1,
+        description="Most nodes and edges to return, at most SEARCH_SUBGRAPH_MAX_ELEMENTS",
+    ),
     user: UserRead = Depends(get_current_user),
     db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
-) -> DynamicSubgraph:
+) -> ModelResponse:
     """
     Search for nodes and return a subgraph including their connections.
 
@@ -143,6 +168,8 @@ def search_nodes_subgraph(
       - 0: Only search results, no additional nodes
       - 1: Search results + direct neighbors + connections between them
       - 2: Search results + neighbors + neighbors' neighbors, etc.
+    - max_elements: Cap on the nodes plus edges returned, search results and
+      nearer nodes first, then the edges among the nodes kept
 
     Returns:
     - A subgraph containing nodes and edges showing the search results in context
@@ -154,8 +181,16 @@ def search_nodes_subgraph(
             detail="You must be logged in to view content",
         )
 
+    max_elements = min(
+        max_elements or settings.SEARCH_SUBGRAPH_MAX_ELEMENTS,
+        settings.SEARCH_SUBGRAPH_MAX_ELEMENTS,
+    )
+    tag = await graph_etag(request, db_graph if db_graph is not None else db_history)
+    if (response := not_modified(request, tag)) is not None:
+        return response
     if db_graph is not None:
-        subgraph = db_graph.get_search_subgraph(
+        subgraph = await run_db(
+            db_graph.get_search_subgraph,
             node_type=node_type,
             title=title,
             scope=scope,
@@ -163,9 +198,11 @@ def search_nodes_subgraph(
             tags=tags,
             description=description,
             levels=levels,
+            max_elements=max_elements,
         )
     else:
-        subgraph = db_history.get_search_subgraph(
+        subgraph = await run_db(
+            db_history.get_search_subgraph,
             node_type=node_type,
             title=title,
             scope=scope,
@@ -173,13 +210,14 @@ def search_nodes_subgraph(
             tags=tags,
             description=description,
             levels=levels,
+            max_elements=max_elements,
         )
 
-    return subgraph
+    return ModelResponse(subgraph, request, tag)
 
 
 @router.get("/random")
-def get_random_node(
+async def get_random_node(
     node_type: str | None = None,
     user: UserRead = Depends(get_current_user),
     db: GraphDatabaseInterface | None = Depends(get_graph_db),
@@ -193,13 +231,13 @@ def get_random_node(
             detail="You must be logged in to view content",
         )
 
-    if isinstance(db, JanusGraphDB):
-        return db.get_random_node(node_type)
-    return db_history.get_random_node(node_type)
+    if db is not None:
+        return await run_db(db.get_random_node, node_type)
+    return await run_db(db_history.get_random_node, node_type)
 
 
 @router.get("/{node_id}")
-def get_node(
+async def get_node(
     node_id: NodeId,
     user: UserRead = Depends(get_current_user),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
@@ -212,15 +250,15 @@ def get_node(
             detail="You must be logged in to view content",
         )
 
-    return db_history.get_node(node_id)
+    return await run_db(db_history.get_node, node_id)
 
 
 @router.post("", status_code=status.HTTP_201_CREATED)
-def create_node(
+async def create_node(
     payload: dict = Body(...),
     db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
-    session: Session = Depends(get_relational_session),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ) -> DynamicNode:  # type: ignore
     """Create a node."""
@@ -236,34 +274,38 @@ def create_node(
     if not Model:
         raise HTTPException(400, f"Unknown node_type {nt!r}")
 
+    db_history = db_history.with_session(uow)
+
     # Handle scope: ensure it exists in the scopes table
     if "scope" in payload and payload["scope"]:
         try:
-            get_or_create_scope(payload["scope"], session)
-            session.commit()  # Commit the scope creation
+            await run_in_session(uow, get_or_create_scope, payload["scope"])
         except Exception as e:
             logger.error(f"Failed to create scope: {e}")
-            session.rollback()
+            await run_db(uow.rollback)
             raise HTTPException(500, f"Failed to create scope: {str(e)}")
 
     # TODO: validate payload further, within graph, against Graph Schema
     node = Model(**payload)
 
-    if db_graph is not None:
-        node = db_graph.create_node(node)
+    if isinstance(db_graph, JanusGraphDB):
+        # synchronous, unlike other graph writes (see db/outbox.py): JanusGraph
+        # allocates the node ID
+        node = await run_db(db_graph.create_node, node)
         # logger.info(f"User {user.username} created node {node_out.node_id} in graph database too")
 
-    node_out = db_history.create_node(
-        node, username=user.username
+    node_out = await run_db(
+        db_history.create_node, node, username=user.username
     )  # reuse the ID allocated from the graph database
+    await run_db(uow.commit)
     return node_out
 
 
 @router.delete("/{node_id}")
-def delete_node(
+async def delete_node(
     node_id: NodeId,
-    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ):
     """Delete the node with provided ID."""
@@ -274,17 +316,19 @@ def delete_node(
             detail="Insufficient permissions to delete nodes",
         )
 
-    db_history.delete_node(node_id, username=user.username)
-    if db_graph is not None:
-        db_graph.delete_node(node_id)
+    await run_db(
+        db_history.with_session(uow).delete_node, node_id, username=user.username
+    )
+    outbox_id = await enqueue_graph_change(uow, "delete_node", node_id=node_id)
+    await run_db(uow.commit)
+    await wait_for_graph(outbox_id)
 
 
 @router.put("")
-def update_node(
+async def update_node(
     payload: dict = Body(...),
-    db_graph: GraphDatabaseInterface | None = Depends(get_graph_db),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
-    session: Session = Depends(get_relational_session),
+    uow: Session = Depends(get_unit_of_work),
     user: UserRead = Depends(get_current_user),
 ) -> DynamicNode:  # type: ignore
     """Update the properties of an existing node."""
@@ -305,7 +349,8 @@ def update_node(
     if not node_id:
         raise HTTPException(400, "node_id is required for updates")
 
-    current_node = db_history.get_node(node_id)
+    db_history = db_history.with_session(uow)
+    current_node = await run_db(db_history.get_node, node_id)
     current_status = getattr(current_node, "status", None) or "live"
 
     # Check field-level permissions based on status
@@ -341,23 +386,23 @@ def update_node(
     # Handle scope: ensure it exists in the scopes table
     if "scope" in payload and payload["scope"]:
         try:
-            get_or_create_scope(payload["scope"], session)
-            session.commit()  # Commit the scope creation
+            await run_in_session(uow, get_or_create_scope, payload["scope"])
         except Exception as e:
             logger.error(f"Failed to create scope: {e}")
-            session.rollback()
+            await run_db(uow.rollback)
             raise HTTPException(500, f"Failed to create scope: {str(e)}")
 
     # TODO: validate payload further, within graph, against Graph Schema
     node = Model(**payload)
-    node_out = db_history.update_node(node, username=user.username)
-    if db_graph is not None:
-        db_graph.update_node(node)
+    node_out = await run_db(db_history.update_node, node, username=user.username)
+    outbox_id = await enqueue_graph_change(uow, "update_node", node=node)
+    await run_db(uow.commit)
+    await wait_for_graph(outbox_id)
     return node_out
 
 
 @router.get("/{node_id}/history")
-def get_node_history(
+async def get_node_history(
     node_id: NodeId,
     user: UserRead = Depends(get_current_user),
     db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
@@ -370,14 +415,14 @@ def get_node_history(
             detail="You must be logged in to view content",
         )
 
-    return db_history.get_node_history(node_id)
+    return await run_db(db_history.get_node_history, node_id)
 
 
 # **** ratings for batches of nodes ****
 
 
 @router.get("/ratings/median")
-def get_nodes_median_ratings(
+async def get_nodes_median_ratings(
     node_ids: list[NodeId] = Query(...),
     poll_label: str
     | None = Query(None, description="Optional poll_label; if omitted, return all"),
@@ -397,7 +442,9 @@ def get_nodes_median_ratings(
     labels = [poll_label] if poll_label else list(POLLS_CFG.keys())
 
     # for each poll, get a map node_id → median
-    per_poll = {pl: db.get_nodes_median_ratings(node_ids, pl) for pl in labels}
+    per_poll = {
+        pl: await run_db(db.get_nodes_median_ratings, node_ids, pl) for pl in labels
+    }
 
     # invert into node-centric structure
     out: dict[int, dict[str, float | None]] = {
@@ -411,7 +458,7 @@ def get_nodes_median_ratings(
     response_model=dict[int, list[RatingEvent]],
     summary="Batch: list ratings for multiple nodes",
 )
-def get_nodes_ratings(
+async def get_nodes_ratings(
     node_ids: list[NodeId] = Query(..., description="List of node IDs"),
     poll_label: str = Query(..., description="Optional poll label to filter ratings"),
     user: UserRead = Depends(get_current_user),
@@ -424,7 +471,7 @@ def get_nodes_ratings(
             detail="You must be logged in to view content",
         )
 
-    return db.get_nodes_ratings(node_ids, poll_label)
+    return await run_db(db.get_nodes_ratings, node_ids, poll_label)
 
 
 # **** per-node ratings ****
@@ -439,7 +486,7 @@ ratings_router = APIRouter(
 @ratings_router.post(
     "", status_code=status.HTTP_201_CREATED, response_model=RatingEvent
 )
-def log_node_rating(
+async def log_node_rating(
     node_id: int = Path(..., description="ID of the node"),
     rating: RatingEvent = Body(...),
     user: UserRead = Depends(get_current_user),
@@ -454,7 +501,7 @@ def log_node_rating(
         )
 
     # Get the node to check its status
-    node = db_history.get_node(node_id)
+    node = await run_db(db_history.get_node, node_id)
     node_status = getattr(node, "status", None) or "live"
 
     # Check if user can rate based on node status
@@ -471,7 +518,7 @@ def log_node_rating(
         poll_label=rating.poll_label,
         rating=rating.rating,
     )
-    return db.log_rating(evt)
+    return await run_db(db.log_rating, evt)
 
 
 @ratings_router.get(
@@ -479,20 +526,20 @@ def log_node_rating(
     response_model=RatingEvent | None,
     summary="Get my rating for one node",
 )
-def get_my_node_rating(
+async def get_my_node_rating(
     node_id: int,
     poll_label: str = Query(..., description="Label of the poll to filter ratings"),
     user: UserRead = Depends(get_current_user),
     db: RatingHistoryRelationalInterface = Depends(get_rating_history_db),
 ) -> RatingEvent | None:
-    return db.get_node_rating(node_id, poll_label, user.username)
+    return await run_db(db.get_node_rating, node_id, poll_label, user.username)
 
 
 @ratings_router.get(
     "/median",
     summary="Get median rating for one node",
 )
-def get_node_median_rating(
+async def get_node_median_rating(
     node_id: int,
     poll_label: str = Query(..., description="Label of the poll to filter ratings"),
     user: UserRead = Depends(get_current_user),
@@ -508,12 +555,48 @@ def get_node_median_rating(
             detail="You must be logged in to view content",
         )
 
-    median = db.get_node_median_rating(node_id, poll_label)
+    median = await run_db(db.get_node_median_rating, node_id, poll_label)
     return {"median_rating": median}
 
 
+@ratings_router.get(
+    "/timeline",
+    summary="Get the aggregate rating of one node over time",
+)
+async def get_node_rating_timeline(
+    node_id: int,
+    poll_label: str = Query(..., description="Label of the poll to filter ratings"),
+    bucket: RollupBucket = Query(RollupBucket.day, description="'day' or 'hour'"),
+    start: datetime.datetime | None = Query(None, description="First bucket (UTC)"),
+    end: datetime.datetime | None = Query(None, description="Last bucket (UTC)"),
+    user: UserRead = Depends(get_current_user),
+    db: RatingHistoryRelationalInterface = Depends(get_rating_history_db),
+) -> list[dict]:
+    """
+    Retrieve one aggregate per day (or hour, over the recent retention window)
+    for a given node, served from the rating rollups, up to now and over at
+    most 10,000 buckets.
+    """
+    # Check read permissions
+    if not can_read(user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be logged in to view content",
+        )
+
+    return await run_db(
+        db.get_rating_timeline,
+        poll_label,
+        entity_type=EntityType.node,
+        node_id=node_id,
+        bucket=bucket,
+        start=start,
+        end=end,
+    )
+
+
 @ratings_router.get("", summary="List all ratings for one node")
-def get_node_ratings(
+async def get_node_ratings(
     node_id: int,
     poll_label: str = Query(..., description="Label of the poll to filter ratings"),
     user: UserRead = Depends(get_current_user),
@@ -529,7 +612,7 @@ def get_node_ratings(
             detail="You must be logged in to view content",
         )
 
-    ratings = db.get_node_ratings(node_id, poll_label)
+    ratings = await run_db(db.get_node_ratings, node_id, poll_label)
     # Convert each RatingEvent to dict.
     return {"ratings": ratings}
 
@@ -0,0 +1,118 @@
+import logging
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from backend.api.auth import get_current_user
+from backend.config import POLLS_CFG
+from backend.db.base import RatingHistoryRelationalInterface
+from backend.db.connections import get_rating_history_db, run_db
+from backend.models.fixed import EntityType, NodeId, UserRead
+from backend.utils.permissions import can_read
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/polls", tags=["ratings"])
+
+
+@router.get("/{poll_label}/top", summary="Top-k entities by aggregate rating")
+async def get_top_rated(
+    poll_label: str,
+    k: int = Query(10, ge=1, le=100, description="Number of entities to return"),
+    entity_type: EntityType = Query(EntityType.node),
+    node_type: list[str] | None = Query(None, description="Restrict to node types"),
+    scope: str | None = Query(None, description="Restrict to nodes of this scope"),
+    order: Literal["asc", "desc"] = Query(
+        "desc", description="'desc' for highest first, 'asc' for lowest first"
+    ),
+    user: UserRead = Depends(get_current_user),
+    db: RatingHistoryRelationalInterface = Depends(get_rating_history_db),
+) -> list[dict]:
+    """
+    Return the k entities with the highest (or lowest) aggregate value for a poll,
+    along with their vote count and current payload.
+    """
+    # Check read permissions
+    if not can_read(user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be logged in to view content",
+        )
+
+    if poll_label not in POLLS_CFG:
+        raise HTTPException(404, f"Unknown poll {poll_label!r}")
+    if entity_type == EntityType.edge and (node_type or scope):
+        raise HTTPException(400, "node_type and scope only apply to nodes")
+
+    return await run_db(
+        db.get_top_rated,
+        poll_label,
+        k=k,
+        entity_type=entity_type,
+        node_types=node_type,
+        scope=scope,
+        order=order,
+    )
+
+
+async def _option_histogram(poll: dict, histogram: dict[str, int]) -> dict[str, int]:
+    """Spread a value -> votes histogram over the poll's options, zero-filled."""
+    by_value = {float(value): votes for value, votes in histogram.items()}
+    out = {}
+    for option in poll.get("options", {}):
+        try:
+            out[option] = by_value.get(float(option), 0)
+        except ValueError:
+            out[option] = 0
+    return out
+
+
+@router.get(
+    "/{poll_label}/distribution",
+    summary="Batch: rating distribution and dispersion for nodes and edges",
+)
+async def get_rating_distributions(
+    poll_label: str,
+    node_ids: list[NodeId] | None = Query(None, description="List of node IDs"),
+    edge_ids: list[str] | None = Query(None, description="List of 'src-tgt' edge IDs"),
+    user: UserRead = Depends(get_current_user),
+    db: RatingHistoryRelationalInterface = Depends(get_rating_history_db),
+) -> dict[str, dict[str, dict | None]]:
+    """
+    Return, for each requested node and edge, the count, mean, standard deviation,
+    quartiles and IQR of the users' latest ratings. Discrete polls also get a
+    per-option histogram. Entities without ratings map to None.
+    """
+    # Check read permissions
+    if not can_read(user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be logged in to view content",
+        )
+
+    poll = POLLS_CFG.get(poll_label)
+    if poll is None:
+        raise HTTPException(404, f"Unknown poll {poll_label!r}")
+
+    node_ids = node_ids or []
+    pairs = [(int(s), int(t)) for s, t in (e.split("-") for e in edge_ids or [])]
+    raw = await run_db(
+        db.get_rating_distributions, poll_label, node_ids=node_ids, edges=pairs
+    )
+
+    def render(stats: dict | None) -> dict | None:
+        if stats is None:
+            return None
+        histogram = stats.pop("histogram")
+        if poll.get("options"):
+            stats["histogram"] = _option_histogram(poll, histogram)
+        return stats
+
+    return {
+        "nodes": {
+            str(nid): render(raw.get((EntityType.node, nid))) for nid in node_ids
+        },
+        "edges": {
+            f"{s}-{t}": render(raw.get((EntityType.edge, (s, t)))) for s, t in pairs
+        },
+    }
@@ -0,0 +1,157 @@
+import logging
+
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from pydantic import BaseModel, Field
+
+from backend.api.auth import get_current_user
+from backend.config import POLLS_CFG
+from backend.db.base import (
+    GraphHistoryRelationalInterface,
+    RatingHistoryRelationalInterface,
+)
+from backend.db.connections import (
+    get_graph_history_db,
+    get_rating_history_db,
+    run_db,
+)
+from backend.models.fixed import EntityType, NodeId, RatingEvent, UserRead
+from backend.utils.permissions import can_rate, can_rate_element
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ratings", tags=["ratings"])
+
+MAX_BATCH_SIZE = 500
+
+
+class RatingBatchItem(BaseModel):
+    entity_type: EntityType = Field(..., description="Type of entity (node or edge)")
+    node_id: NodeId | None = Field(None, description="ID of the node")
+    source_id: NodeId | None = Field(None, description="Edge's source node ID")
+    target_id: NodeId | None = Field(None, description="Edge's target node ID")
+    poll_label: str = Field(..., description="Must match a key in configured polls")
+    rating: float
+
+
+class RatingBatchResult(BaseModel):
+    status: int = Field(..., description="HTTP status the single-item call would give")
+    detail: str | None = None
+    rating: RatingEvent | None = None
+
+
+async def _rating_error(poll_label: str, value: float) -> str | None:
+    """Return why `value` is not a valid answer to the poll, if it is not."""
+    poll = POLLS_CFG.get(poll_label)
+    if poll is None:
+        return f"Unknown poll {poll_label!r}"
+    options = poll.get("options") or {}
+    if options:
+        allowed = set()
+        for option in options:
+            try:
+                allowed.add(float(option))
+            except ValueError:
+                continue
+        if value not in allowed:
+            return f"Rating must be one of the options of poll {poll_label!r}"
+    low_high = poll.get("range")
+    if low_high is not None and not low_high[0] <= value <= low_high[1]:
+        return f"Rating must lie within {low_high[0]} and {low_high[1]}"
+    return None
+
+
+@router.post(
+    "/batch",
+    response_model=list[RatingBatchResult],
+    summary="Batch: rate multiple nodes and edges",
+)
+async def log_ratings_batch(
+    items: list[RatingBatchItem] = Body(...),
+    user: UserRead = Depends(get_current_user),
+    db_history: GraphHistoryRelationalInterface = Depends(get_graph_history_db),
+    db: RatingHistoryRelationalInterface = Depends(get_rating_history_db),
+) -> list[RatingBatchResult]:
+    """
+    Log many ratings at once. Element statuses are checked with one lookup and
+    all accepted ratings are written in one transaction. Returns one result per
+    item, in order: 201 with the logged rating, or the status and detail the
+    single-item endpoint would have answered with.
+    """
+    # Check permissions
+    if not can_rate(user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions to rate",
+        )
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"At most {MAX_BATCH_SIZE} ratings per batch")
+
+    node_ids = {it.node_id for it in items if it.entity_type == EntityType.node}
+    pairs = {
+        (it.source_id, it.target_id)
+        for it in items
+        if it.entity_type == EntityType.edge
+    }
+    statuses = await run_db(
+        db_history.get_element_statuses,
+        node_ids=[nid for nid in node_ids if nid is not None],
+        edges=[pair for pair in pairs if None not in pair],
+    )
+
+    results: list[RatingBatchResult] = []
+    accepted: list[tuple[int, RatingEvent]] = []
+    for item in items:
+        if item.entity_type == EntityType.node:
+            key = (EntityType.node, item.node_id)
+            missing = item.node_id is None
+        else:
+            key = (EntityType.edge, (item.source_id, item.target_id))
+            missing = item.source_id is None or item.target_id is None
+        if missing:
+            results.append(
+                RatingBatchResult(
+                    status=422,
+                    detail=f"Missing identifiers for {item.entity_type.value}",
+                )
+            )
+            continue
+
+        error = _rating_error(item.poll_label, item.rating)
+        if error:
+            results.append(RatingBatchResult(status=400, detail=error))
+            continue
+
+        element_status = statuses.get(key)
+        if element_status is None:
+            results.append(
+                RatingBatchResult(
+                    status=404,
+                    detail=f"{item.entity_type.value.capitalize()} not found",
+                )
+            )
+            continue
+        if not can_rate_element(user, element_status):
+            results.append(
+                RatingBatchResult(
+                    status=403,
+                    detail=f"Cannot rate {item.entity_type.value}s with 'draft' status",
+                )
+            )
+            continue
+
+        evt = RatingEvent(
+            username=user.username,
+            entity_type=item.entity_type,
+            node_id=item.node_id if item.entity_type == EntityType.node else None,
+            source_id=item.source_id if item.entity_type == EntityType.edge else None,
+            target_id=item.target_id if item.entity_type == EntityType.edge else None,
+            poll_label=item.poll_label,
+            rating=item.rating,
+        )
+        accepted.append((len(results), evt))
+        results.append(RatingBatchResult(status=201))
+
+    logged = await run_db(db.log_ratings, [evt for _, evt in accepted])
+    for (index, _), evt in zip(accepted, logged):
+        results[index].rating = evt
+    return results
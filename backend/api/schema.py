@@ -3,7 +3,8 @@ from sqlmodel import Session
 from typing import List
 
 from backend.schema_manager import SchemaManager
-from backend.db.connections import get_graph_history_db
+from backend.db.config import get_engine
+from backend.settings import settings
 from backend.api.auth import get_current_user
 from backend.models.fixed import User
 from backend.models.schema import GraphSchema, SchemaMigration
@@ -14,8 +15,7 @@ router = APIRouter(prefix="/schema", tags=["schema"])
 
 def get_session():
     """Get database session for schema management"""
-    db = get_graph_history_db()
-    with Session(db.engine) as session:
+    with Session(get_engine(settings.POSTGRES_DB_URL)) as session:
         yield session
 
 
@@ -0,0 +1,117 @@
+"""
+Throughput of authenticated requests under concurrency.
+
+Fires `--concurrency` parallel GET /users/me requests, each with its own
+user's access token, at the app in-process and reports requests per second.
+`--mode blocking` authenticates with the former dependency, which looked the
+user up on the event loop; `--mode threadpool` uses the current one. The user
+cache is disabled so that every request performs the lookup.
+
+    python -m backend.benchmarks.auth_concurrency --mode blocking
+    python -m backend.benchmarks.auth_concurrency --mode threadpool
+
+Without `--database-url` the lookup is simulated by sleeping `--latency-ms`.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import jwt
+from fastapi import Depends
+
+from backend.api import auth
+from backend.main import app
+from backend.models.fixed import User, UserRead
+from backend.utils.cache import LRUCache
+
+
+class SimulatedUserDB:
+    """Answers get_user after a blocking pause, like a database round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def get_user(self, username: str) -> User:
+        time.sleep(self.latency)
+        return User(
+            username=username,
+            password="benchmark",
+            security_question=None,
+            security_answer=None,
+            is_active=True,
+        )
+
+
+async def blocking_get_current_user(
+    token: str = Depends(auth.oauth2_scheme),
+    db=Depends(auth.get_user_db),
+) -> UserRead:
+    """get_current_user as it was: the lookup runs on the event loop."""
+    payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    return db.get_user(payload["sub"])
+
+
+async def run(concurrency: int, rounds: int) -> float:
+    tokens = [
+        auth.create_access_token({"sub": f"bench{i}", "ver": 0})
+        for i in range(concurrency)
+    ]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://b") as client:
+
+        async def one(token: str) -> None:
+            response = await client.get(
+                "/users/me", headers={"Authorization": f"Bearer {token}"}
+            )
+            response.raise_for_status()
+
+        await asyncio.gather(*(one(t) for t in tokens))  # warm up
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await asyncio.gather(*(one(t) for t in tokens))
+        elapsed = time.perf_counter() - start
+    return concurrency * rounds / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=["blocking", "threadpool"], required=True)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--database-url", help="look users up in this database")
+    args = parser.parse_args()
+
+    auth._user_cache = LRUCache(maxsize=0)
+    if args.database_url:
+        from backend.db.postgresql import UserPostgreSQLDB
+
+        db = UserPostgreSQLDB(args.database_url)
+        for i in range(args.concurrency):
+            if db.get_user(f"bench{i}") is None:
+                db.update_user(
+                    User(
+                        username=f"bench{i}",
+                        password="benchmark",
+                        security_question=None,
+                        security_answer=None,
+                        is_active=True,
+                    )
+                )
+    else:
+        db = SimulatedUserDB(args.latency_ms / 1000)
+    app.dependency_overrides[auth.get_user_db] = lambda: db
+    if args.mode == "blocking":
+        app.dependency_overrides[auth.get_current_user] = blocking_get_current_user
+
+    throughput = asyncio.run(run(args.concurrency, args.rounds))
+    print(
+        f"{args.mode}: {throughput:.0f} requests/s "
+        f"({args.concurrency} concurrent, {args.rounds} rounds)"
+    )
+
+
+if __name__ == "__main__":
+    main()
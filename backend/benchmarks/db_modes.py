@@ -0,0 +1,150 @@
+"""
+Load test of the sync (psycopg2, threadpool) and async (asyncpg) database modes.
+
+Seeds `--nodes` nodes and a user into the database, then runs `--concurrency`
+clients against the app in-process, each sending `--requests` requests: node
+reads, median reads and, for a `--writes` share of them, ratings. Reports
+throughput and latency percentiles for the mode picked with `--mode`, which
+sets DB_ASYNC.
+
+    python -m backend.benchmarks.db_modes --mode sync --database-url postgresql://...
+    python -m backend.benchmarks.db_modes --mode async --database-url postgresql://...
+
+Both runs should use the same database and pool settings (DB_POOL_SIZE,
+DB_MAX_OVERFLOW); the sync mode is further bounded by the threadpool.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+from backend.api import auth
+from backend.config import POLLS_CFG
+from backend.db.connections import close_async_services, close_services
+from backend.db.postgresql import GraphHistoryPostgreSQLDB, UserPostgreSQLDB
+from backend.main import app
+from backend.models.dynamic import NodeTypeModels
+from backend.models.fixed import User
+from backend.settings import settings
+
+USERNAME = "bench-db-modes"
+
+
+def seed(database_url: str, nodes: int) -> tuple[str, list[int]]:
+    """Create the benchmark user and nodes; return a token and the node ids."""
+    users = UserPostgreSQLDB(database_url)
+    if users.get_user(USERNAME) is None:
+        users.update_user(
+            User(
+                username=USERNAME,
+                password="benchmark",
+                security_question=None,
+                security_answer=None,
+                is_active=True,
+            )
+        )
+    token = auth.create_access_token(auth.access_token_claims(users.get_user(USERNAME)))
+    graph = GraphHistoryPostgreSQLDB(database_url)
+    node_type, Model = next(iter(NodeTypeModels.items()))
+    node_ids = [
+        graph.create_node(
+            Model(node_type=node_type, title=f"benchmark {i}"), username=USERNAME
+        ).node_id
+        for i in range(nodes)
+    ]
+    return token, node_ids
+
+
+def a_rating() -> tuple[str, float]:
+    poll_label, poll = next(iter(POLLS_CFG.items()))
+    if poll.get("options"):
+        return poll_label, float(next(iter(poll["options"])))
+    return poll_label, float(poll["range"][0])
+
+
+async def run(
+    token: str, node_ids: list[int], concurrency: int, requests: int, writes: float
+) -> tuple[float, list[float]]:
+    headers = {"Authorization": f"Bearer {token}"}
+    poll_label, value = a_rating()
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://b", headers=headers, timeout=None
+    ) as client:
+
+        async def one(rng: random.Random) -> None:
+            node_id = rng.choice(node_ids)
+            roll = rng.random()
+            start = time.perf_counter()
+            if roll < writes:
+                response = await client.post(
+                    f"/nodes/{node_id}/ratings",
+                    json={
+                        "entity_type": "node",
+                        "node_id": node_id,
+                        "poll_label": poll_label,
+                        "rating": value,
+                    },
+                )
+            elif roll < (1 + writes) / 2:
+                response = await client.get(f"/nodes/{node_id}")
+            else:
+                response = await client.get(
+                    f"/nodes/{node_id}/ratings/median",
+                    params={"poll_label": poll_label},
+                )
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+        async def client_loop(seed: int) -> None:
+            rng = random.Random(seed)
+            for _ in range(requests):
+                await one(rng)
+
+        await client_loop(-1)  # warm up the pools
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=["sync", "async"], required=True)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--writes", type=float, default=0.1)
+    args = parser.parse_args()
+
+    settings.POSTGRES_DB_URL = args.database_url
+    settings.DB_ASYNC = args.mode == "async"
+    token, node_ids = seed(args.database_url, args.nodes)
+
+    async def measure():
+        try:
+            return await run(
+                token, node_ids, args.concurrency, args.requests, args.writes
+            )
+        finally:
+            close_services()
+            await close_async_services()
+
+    throughput, latencies = asyncio.run(measure())
+    cuts = statistics.quantiles(latencies, n=100)
+    print(
+        f"{args.mode}: {throughput:.0f} requests/s, "
+        f"p50 {cuts[49] * 1000:.1f} ms, p99 {cuts[98] * 1000:.1f} ms "
+        f"({args.concurrency} concurrent, {args.writes:.0%} writes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+End-to-end time and peak memory of the large graph responses.
+
+Serves a synthetic graph of `--nodes` nodes and `--edges-per-node` times as
+many edges from the in-memory graph database, then times `--requests` GETs of
+/graph, /graph/{node_id} and /nodes/subgraph sent to the app in-process, and
+reports the peak RSS of the process. With `--mode bytes` the endpoints are
+those of the app, whose models are serialized straight to bytes; with
+`--mode model` they are copies returning the models for FastAPI to validate
+and serialize, as before. Each mode should run in its own process, for its
+peak RSS to be its own:
+
+    python -m backend.benchmarks.graph_responses --mode bytes [--nodes 100000]
+    python -m backend.benchmarks.graph_responses --mode model [--nodes 100000]
+"""
+
+import argparse
+import asyncio
+import datetime
+import resource
+import statistics
+import time
+
+import httpx
+from fastapi import APIRouter
+
+from backend.api.auth import get_current_user
+from backend.config import valid_edge_types, valid_node_types
+from backend.db.connections import get_graph_db, get_graph_history_db
+from backend.db.memory import GraphArrays, MemoryGraphDB
+from backend.main import app
+from backend.models.dynamic import DynamicGraphExport, DynamicSubgraph
+from backend.models.fixed import UserRead
+from backend.settings import settings
+from backend.version import __version__
+
+
+def synthetic_graph(nodes: int, edges_per_node: int) -> MemoryGraphDB:
+    node_types = sorted(valid_node_types())
+    edge_types = sorted(valid_edge_types())
+    graph = MemoryGraphDB()
+    graph._arrays = GraphArrays.build(
+        [
+            {
+                "node_id": i,
+                "node_type": node_types[i % len(node_types)],
+                "title": f"node {i}",
+                "description": "a description of this node " * 4,
+                "tags": ["one", "two", f"tag{i % 100}"],
+            }
+            for i in range(nodes)
+        ],
+        [
+            {
+                "source": i,
+                "target": (i * 7 + k + 1) % nodes,
+                "edge_type": edge_types[(i + k) % len(edge_types)],
+            }
+            for i in range(nodes)
+            for k in range(edges_per_node)
+        ],
+    )
+    return graph
+
+
+def model_routes(graph: MemoryGraphDB) -> APIRouter:
+    """The endpoints as they were, returning models to FastAPI."""
+    router = APIRouter(prefix="/model")
+
+    @router.get("/graph")
+    async def get_whole_graph() -> DynamicGraphExport:
+        out = graph.get_whole_graph().model_dump()
+        out["commongraph_version"] = __version__
+        out["timestamp"] = datetime.datetime.now().isoformat()
+        out["schema_version"] = out["schema_hash"] = "benchmark"
+        return out
+
+    @router.get("/graph/{node_id}")
+    async def get_induced_subgraph(node_id: int, levels: int = 2) -> DynamicSubgraph:
+        return graph.get_induced_subgraph(node_id, levels)
+
+    @router.get("/nodes/subgraph")
+    async def search_nodes_subgraph(
+        title: str | None = None, levels: int = 1
+    ) -> DynamicSubgraph:
+        return graph.get_search_subgraph(
+            title=title,
+            levels=levels,
+            max_elements=settings.SEARCH_SUBGRAPH_MAX_ELEMENTS,
+        )
+
+    return router
+
+
+async def run(paths: list[str], requests: int) -> dict[str, tuple[list, int]]:
+    """The latencies and response size of each path."""
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://b", timeout=None
+    ) as client:
+        for path in paths:
+            latencies, size = [], 0
+            for _ in range(requests + 1):  # the first warms up
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+                size = len(response.content)
+            results[path] = latencies[1:], size
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=["bytes", "model"], required=True)
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--edges-per-node", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    graph = synthetic_graph(args.nodes, args.edges_per_node)
+    app.dependency_overrides[get_graph_db] = lambda: graph
+    app.dependency_overrides[get_graph_history_db] = lambda: graph
+    app.dependency_overrides[get_current_user] = lambda: UserRead(
+        username="benchmark", is_active=True, is_admin=False, is_super_admin=False
+    )
+    prefix = ""
+    if args.mode == "model":
+        app.include_router(model_routes(graph))
+        prefix = "/model"
+    paths = [
+        f"{prefix}/graph",
+        f"{prefix}/graph/0?levels=8",
+        f"{prefix}/nodes/subgraph?title=node%201&levels=1",
+    ]
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = asyncio.run(run(paths, args.requests))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    for path, (latencies, size) in results.items():
+        print(
+            f"{path:<48} {size / 1e6:7.1f} MB"
+            f"  median {statistics.median(latencies) * 1000:8.1f} ms"
+            f"  best {min(latencies) * 1000:8.1f} ms"
+        )
+    print(f"peak RSS {peak / 1024:.0f} MB ({(peak - baseline) / 1024:+.0f} MB serving)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Throughput of the conversion of JanusGraph elementMap()s to dynamic models.
+
+Builds `--vertices` vertex maps, spread over the configured node types, and as
+many edge maps, as elementMap() returns them, then times their conversion
+validated (the models' constructors) and trusted (model_construct), reported
+per 10k elements:
+
+    python -m backend.benchmarks.janusgraph_conversion [--vertices 10000] [--repeat 5]
+
+With --host, the fetch of the first --vertices vertices of that Gremlin server
+is also timed, as full Vertex objects and as elementMap() projections on the
+configured keys:
+
+    python -m backend.benchmarks.janusgraph_conversion --host localhost --traversal-source g
+"""
+
+import argparse
+import time
+
+from gremlin_python.process.traversal import Direction, T
+
+from backend.config import valid_edge_types, valid_node_types
+from backend.db.janusgraph import (
+    NODE_KEYS,
+    JanusGraphDB,
+    convert_edge_maps,
+    convert_vertex_maps,
+)
+
+PER = 10_000
+
+
+def vertex_maps(count: int) -> list[dict]:
+    node_types = sorted(valid_node_types())
+    return [
+        {
+            T.id: i,
+            T.label: "vertex",
+            "node_type": node_types[i % len(node_types)],
+            "title": f"node {i}",
+            "description": "a description " * 8,
+            "status": "live",
+            "tags": "one;two;three",
+        }
+        for i in range(count)
+    ]
+
+
+def edge_maps(count: int) -> list[dict]:
+    edge_types = sorted(valid_edge_types())
+    return [
+        {
+            T.id: f"e{i}",
+            T.label: edge_types[i % len(edge_types)],
+            Direction.OUT: {T.id: i, T.label: "vertex"},
+            Direction.IN: {T.id: i + 1, T.label: "vertex"},
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    """The fastest of `repeat` runs of fn(*args), in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(label: str, seconds: float, count: int) -> None:
+    print(
+        f"{label:<32} {seconds * PER / count * 1000:9.1f} ms per 10k"
+        f"  {count / seconds:12,.0f} /s"
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vertices", type=int, default=PER)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--host", help="Gremlin server to also time fetches from")
+    parser.add_argument("--traversal-source", default="g")
+    args = parser.parse_args(argv)
+
+    vertices, edges = vertex_maps(args.vertices), edge_maps(args.vertices)
+    for label, fn, maps, trusted in (
+        ("vertices, validated", convert_vertex_maps, vertices, False),
+        ("vertices, trusted", convert_vertex_maps, vertices, True),
+        ("edges, validated", convert_edge_maps, edges, False),
+        ("edges, trusted", convert_edge_maps, edges, True),
+    ):
+        report(label, best_of(args.repeat, fn, maps, trusted), len(maps))
+
+    if args.host:
+        graph = JanusGraphDB(args.host, args.traversal_source)
+        try:
+            with graph.connection() as g:
+                count = g.V().limit(args.vertices).count().next()
+                for label, fetch in (
+                    ("fetch, full vertices", lambda: g.V().limit(count).to_list()),
+                    (
+                        "fetch, elementMap() projection",
+                        lambda: g.V().limit(count).element_map(*NODE_KEYS).to_list(),
+                    ),
+                    (
+                        "fetch and convert, trusted",
+                        lambda: convert_vertex_maps(
+                            g.V().limit(count).element_map(*NODE_KEYS)
+                        ),
+                    ),
+                ):
+                    report(label, best_of(args.repeat, fetch), max(count, 1))
+                print(f"({count} vertices fetched)")
+        finally:
+            graph.close()
+
+
+if __name__ == "__main__":
+    main()
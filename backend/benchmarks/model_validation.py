@@ -0,0 +1,120 @@
+"""
+Validation time of dynamic subgraphs, with tagged and with plain unions.
+
+Writes a configuration with `--node-types` node types, those of the
+configuration in use and copies of them, and loads the models from it; then
+times the validation of a subgraph of `--elements` elements, half nodes spread
+over the node types and half edges, as DynamicSubgraph does it (unions tagged
+by node_type and edge_type) and as plain unions of the same models do it:
+
+    python -m backend.benchmarks.model_validation [--elements 20000] [--node-types 15]
+
+The configuration is read when the models are first imported, so the
+benchmark must run in a fresh process.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def write_config(node_types: int) -> Path:
+    """
+    A copy of the configuration in use, its node types completed with copies
+    up to `node_types`.
+    """
+    path = PROJECT_ROOT / (os.getenv("CONFIG_FILE") or "config/config-test.yaml")
+    config = yaml.safe_load(path.read_text())
+    templates = list(config["node_types"].values())
+    for i in range(len(templates), node_types):
+        config["node_types"][f"copy{i}"] = templates[i % len(templates)]
+    fd, name = tempfile.mkstemp(prefix="commongraph-bench-", suffix=".yaml")
+    with os.fdopen(fd, "w") as f:
+        yaml.safe_dump(config, f)
+    return Path(name)
+
+
+def subgraph(elements: int, node_types: list[str], edge_types: list[str]) -> dict:
+    count = elements // 2
+    return {
+        "nodes": [
+            {
+                "node_id": i,
+                "node_type": node_types[i % len(node_types)],
+                "title": f"node {i}",
+                "description": "a description " * 8,
+                "tags": ["one", "two"],
+            }
+            for i in range(count)
+        ],
+        "edges": [
+            {
+                "source": i,
+                "target": i + 1,
+                "edge_type": edge_types[i % len(edge_types)],
+            }
+            for i in range(elements - count)
+        ],
+    }
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    """The fastest of `repeat` runs of fn(*args), in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--elements", type=int, default=20_000)
+    parser.add_argument("--node-types", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    config = write_config(args.node_types)
+    os.environ["CONFIG_FILE"] = str(config)
+    try:
+        # imported only now, for the models to be those of that configuration
+        from typing import Union
+
+        from pydantic import TypeAdapter
+
+        from backend.models.dynamic import (
+            DynamicSubgraph,
+            EdgeTypeModels,
+            NodeTypeModels,
+        )
+    finally:
+        config.unlink()
+
+    data = subgraph(args.elements, list(NodeTypeModels), list(EdgeTypeModels))
+    plain = TypeAdapter(
+        tuple[
+            list[Union[tuple(NodeTypeModels.values())]],
+            list[Union[tuple(EdgeTypeModels.values())]],
+        ]
+    )
+    print(
+        f"{args.elements} elements, {len(NodeTypeModels)} node types, "
+        f"{len(EdgeTypeModels)} edge types"
+    )
+    for label, fn, arg in (
+        ("tagged unions", DynamicSubgraph.model_validate, data),
+        ("plain unions", plain.validate_python, (data["nodes"], data["edges"])),
+    ):
+        seconds = best_of(args.repeat, fn, arg)
+        print(f"{label:<16} {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
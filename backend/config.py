@@ -723,12 +723,17 @@ class SchemaChangeDetector:
 
 
 # 5. Helpers
-def valid_node_types() -> set[str]:
-    return set(NODE_TYPE_PROPS)
+# computed once, the configuration being read at startup only
+_VALID_NODE_TYPES = frozenset(NODE_TYPE_PROPS)
+_VALID_EDGE_TYPES = frozenset(EDGE_TYPE_PROPS)
 
 
-def valid_edge_types() -> set[str]:
-    return set(EDGE_TYPE_PROPS)
+def valid_node_types() -> frozenset[str]:
+    return _VALID_NODE_TYPES
+
+
+def valid_edge_types() -> frozenset[str]:
+    return _VALID_EDGE_TYPES
 
 
 def filter_node_props(node_type: str, data: dict) -> dict:
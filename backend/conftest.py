@@ -7,6 +7,8 @@ import os
 import sys
 from pathlib import Path
 
+import pytest
+
 # Ensure we're running from project root
 project_root = Path(__file__).parent.parent
 os.chdir(project_root)
@@ -22,3 +24,18 @@ if "POSTGRES_TEST_DB_URL" not in os.environ:
 # Set secret key for tests
 if "SECRET_KEY" not in os.environ:
     os.environ["SECRET_KEY"] = "test-secret-key-not-for-production"
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["sync", "async"])
+def db_async(request):
+    """
+    Run a module's database tests with the blocking repositories, then with
+    the asyncpg ones (DB_ASYNC). Their clients are entered as context managers,
+    so that the asyncpg pools live on one event loop, closed at shutdown.
+    """
+    from backend.settings import settings
+
+    previous = settings.DB_ASYNC
+    settings.DB_ASYNC = request.param
+    yield request.param
+    settings.DB_ASYNC = previous
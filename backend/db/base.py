@@ -1,3 +1,5 @@
+import datetime
+import inspect
 import logging
 from abc import ABC, ABCMeta, abstractmethod
 from functools import wraps
@@ -9,6 +11,8 @@ from backend.models.fixed import (
     UserCreate,
     NodeId,
     RatingEvent,
+    EntityType,
+    RollupBucket,
 )
 
 
@@ -16,14 +20,32 @@ logging.basicConfig(level=logging.WARNING)
 
 
 def log_method(func):
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            self.logger.debug(
+                "Entering: %s with args: %s kwargs: %s", func.__name__, args, kwargs
+            )
+            try:
+                result = await func(self, *args, **kwargs)
+                self.logger.debug("Exiting: %s with result: %s", func.__name__, result)
+                return result
+            except Exception as e:
+                self.logger.error(f"Exception in {func.__name__}: {e}")
+                raise
+
+        return async_wrapper
+
     @wraps(func)
     def wrapper(self, *args, **kwargs):
+        # formatted lazily: results may be whole graphs
         self.logger.debug(
-            f"Entering: {func.__name__} with args: {args} kwargs: {kwargs}"
+            "Entering: %s with args: %s kwargs: %s", func.__name__, args, kwargs
         )
         try:
             result = func(self, *args, **kwargs)
-            self.logger.debug(f"Exiting: {func.__name__} with result: {result}")
+            self.logger.debug("Exiting: %s with result: %s", func.__name__, result)
             return result
         except Exception as e:
             self.logger.error(f"Exception in {func.__name__}: {e}")
@@ -35,7 +57,12 @@ def log_method(func):
 class LogMeta(ABCMeta):
     def __new__(cls, name, bases, attrs):
         for attr_name, attr_value in attrs.items():
-            if callable(attr_value) and not attr_name.startswith("__"):
+            # classes are callable too, e.g. the `_sync_class` of async repositories
+            if (
+                callable(attr_value)
+                and not isinstance(attr_value, type)
+                and not attr_name.startswith("__")
+            ):
                 attrs[attr_name] = log_method(attr_value)
         return super().__new__(cls, name, bases, attrs)
 
@@ -44,6 +71,13 @@ class UserDatabaseInterface(ABC):
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    def with_session(self, session):
+        """
+        Return a repository sharing `session`, whose writes are committed by the
+        session's owner. Backends without relational sessions return themselves.
+        """
+        return self
+
     @abstractmethod
     def create_user(self, user: UserCreate) -> UserRead:
         pass
@@ -74,6 +108,13 @@ class RatingHistoryRelationalInterface(ABC):
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    def with_session(self, session):
+        """
+        Return a repository sharing `session`, whose writes are committed by the
+        session's owner. Backends without relational sessions return themselves.
+        """
+        return self
+
     @abstractmethod
     def log_rating(self, rating: RatingEvent) -> RatingEvent:
         """
@@ -81,6 +122,12 @@ class RatingHistoryRelationalInterface(ABC):
         """
         pass
 
+    def log_ratings(self, ratings: list[RatingEvent]) -> list[RatingEvent]:
+        """
+        Log several ratings in a single transaction.
+        """
+        pass
+
     def get_node_rating(
         self, node_id: NodeId, poll_label: str, username: str
     ) -> RatingEvent | None:
@@ -107,6 +154,18 @@ class RatingHistoryRelationalInterface(ABC):
         """
         pass
 
+    def get_user_ratings(
+        self,
+        username: str,
+        node_ids: list[NodeId] | None = None,
+        edges: list[tuple[NodeId, NodeId]] | None = None,
+        poll_label: str | None = None,
+    ) -> list[RatingEvent]:
+        """
+        Retrieve a user's latest rating per entity and poll for multiple nodes and edges.
+        """
+        pass
+
     def get_edge_ratings(
         self, source_id: int, target_id: int, poll_label: str
     ) -> list[RatingEvent]:
@@ -139,6 +198,48 @@ class RatingHistoryRelationalInterface(ABC):
         """
         pass
 
+    def get_top_rated(
+        self,
+        poll_label: str,
+        k: int = 10,
+        entity_type: EntityType = EntityType.node,
+        node_types: list[str] | None = None,
+        scope: str | None = None,
+        order: str = "desc",
+    ) -> list[dict]:
+        """
+        Retrieve the k entities with the highest (or lowest) aggregate rating.
+        """
+        pass
+
+    def get_rating_timeline(
+        self,
+        poll_label: str,
+        entity_type: EntityType = EntityType.node,
+        node_id: NodeId | None = None,
+        source_id: NodeId | None = None,
+        target_id: NodeId | None = None,
+        bucket: RollupBucket = RollupBucket.day,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[dict]:
+        """
+        Retrieve the aggregate rating of an entity per day or hour.
+        """
+        pass
+
+    def get_rating_distributions(
+        self,
+        poll_label: str,
+        node_ids: list[NodeId] | None = None,
+        edges: list[tuple[NodeId, NodeId]] | None = None,
+    ) -> dict[tuple[EntityType, NodeId | tuple[NodeId, NodeId]], dict]:
+        """
+        Retrieve count, dispersion, quartiles and histogram of the latest ratings
+        for multiple nodes and edges.
+        """
+        pass
+
 
 class GraphDatabaseInterface(ABC, metaclass=LogMeta):
     def __init__(self):
@@ -161,7 +262,9 @@ class GraphDatabaseInterface(ABC, metaclass=LogMeta):
         pass
 
     @abstractmethod
-    def get_induced_subgraph(self, node_id: NodeId, levels: NodeId) -> SubgraphBase:
+    def get_induced_subgraph(
+        self, node_id: NodeId, levels: int, max_degree: int | None = None
+    ) -> SubgraphBase:
         pass
 
     @abstractmethod
@@ -222,11 +325,26 @@ class GraphDatabaseInterface(ABC, metaclass=LogMeta):
     def update_edge(self, edge: EdgeBase) -> EdgeBase:
         pass
 
+    def get_generation(self) -> int | None:
+        """
+        A number which grows with every commit to the graph history reflected
+        in this graph, and which responses built from it are tagged with; None
+        if it cannot tell.
+        """
+        return None
+
 
 class GraphHistoryRelationalInterface(GraphDatabaseInterface):
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    def with_session(self, session):
+        """
+        Return a repository sharing `session`, whose writes are committed by the
+        session's owner. Backends without relational sessions return themselves.
+        """
+        return self
+
     # some inherited methods have added parameter username
     @abstractmethod
     def reset_whole_graph(self, username: str) -> None:
@@ -295,3 +413,14 @@ class GraphHistoryRelationalInterface(GraphDatabaseInterface):
     def list_tags(self, query: str | None = None, limit: int = 50) -> list[str]:
         """Return the tags that appear on nodes or edges."""
         pass
+
+    def get_element_statuses(
+        self,
+        node_ids: list[NodeId] | None = None,
+        edges: list[tuple[NodeId, NodeId]] | None = None,
+    ) -> dict[tuple[EntityType, NodeId | tuple[NodeId, NodeId]], str]:
+        """
+        Return the current status of several nodes and edges at once.
+        Missing and deleted elements are left out.
+        """
+        pass
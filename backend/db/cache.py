@@ -0,0 +1,189 @@
+"""
+Read-through cache of the graph history reads.
+
+The expensive reads of the graph history repository (whole graph, induced
+and search subgraphs, searches, edge lists, tags) are cached under a key of
+the method, its arguments and the graph generation, which every commit to
+the history bumps, whichever worker makes it (see GraphGeneration). A read
+first asks the repository for the generation, a single row lookup, so that
+entries of an older graph are never served and simply age out. It does so
+before reading, and with replicas both go to the same one (see
+db/routing.py), so an entry may reflect later commits, never miss earlier:
+one of a lagging replica is never stored under the generation of another.
+
+Entries are JSON, as pydantic-core serializes the results, rebuilt with
+construct_node/construct_edge on a hit: their size is accounted, every hit
+returns fresh objects the caller may modify, and loading one runs no code,
+unlike unpickling. They are kept in a per-worker LRU of at most
+GRAPH_CACHE_MAX_BYTES, and with GRAPH_CACHE_URL in a store shared by the
+workers as well (see utils/cache.py). Reads bound to a caller's session
+with `with_session` are not cached.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+from functools import wraps
+
+from pydantic_core import from_json, to_json
+from starlette.concurrency import run_in_threadpool
+
+from backend.db.base import GraphHistoryRelationalInterface
+from backend.db.routing import one_replica
+from backend.models.dynamic import DynamicSubgraph, construct_edge, construct_node
+from backend.settings import settings
+from backend.utils.cache import LRUCache, SharedCache
+from backend.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_MISS = object()
+
+
+def _subgraph(data: dict) -> DynamicSubgraph:
+    return DynamicSubgraph.model_construct(
+        nodes=[construct_node(node) for node in data["nodes"]],
+        edges=[construct_edge(edge) for edge in data["edges"]],
+    )
+
+
+def _nodes(data: list) -> list:
+    return [construct_node(node) for node in data]
+
+
+def _edges(data: list) -> list:
+    return [construct_edge(edge) for edge in data]
+
+
+# the repository methods whose results are cached, and how to rebuild each
+# from its JSON
+CACHED_READS = {
+    "get_whole_graph": _subgraph,
+    "get_graph_summary": dict,
+    "get_induced_subgraph": _subgraph,
+    "search_nodes": _nodes,
+    "get_search_subgraph": _subgraph,
+    "get_edge_list": _edges,
+    "find_edges": _edges,
+    "list_tags": list,
+}
+
+
+def cache_key(name: str, generation: int, args: tuple, kwargs: dict) -> str:
+    payload = json.dumps(
+        [name, generation, args, sorted(kwargs.items())], default=str
+    ).encode()
+    return f"graph:{generation}:{hashlib.sha256(payload).hexdigest()}"
+
+
+class CachedGraphHistoryDB:
+    """
+    The graph history `repository`, its CACHED_READS served from `local`
+    and, if given, `shared`; every other attribute is the repository's.
+    """
+
+    def __init__(
+        self,
+        repository: GraphHistoryRelationalInterface,
+        local: LRUCache,
+        shared: SharedCache | None = None,
+    ):
+        self.repository = repository
+        self.local = local
+        self.shared = shared
+        for name, rebuild in CACHED_READS.items():
+            method = getattr(repository, name)
+            if inspect.iscoroutinefunction(method):
+                setattr(self, name, self._cached_async(name, method, rebuild))
+            else:
+                setattr(self, name, self._cached(name, method, rebuild))
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def with_session(self, session):
+        return self.repository.with_session(session)
+
+    def _load(self, value: bytes | None, rebuild):
+        if value is None:
+            metrics.inc("graph_cache.misses")
+            return _MISS
+        metrics.inc("graph_cache.hits")
+        return rebuild(from_json(value))
+
+    def _store(self, key: str, result) -> bytes:
+        value = to_json(result)
+        if self.local.max_bytes is None or len(value) <= self.local.max_bytes:
+            self.local.set(key, value)
+            metrics.set_gauge("graph_cache.bytes", self.local.nbytes)
+            metrics.set_gauge("graph_cache.entries", len(self.local))
+        return value
+
+    def _cached(self, name: str, method, rebuild):
+        @wraps(method)
+        def read(*args, **kwargs):
+            with one_replica():
+                generation = self.repository.get_generation()
+                if generation is None:
+                    return method(*args, **kwargs)
+                key = cache_key(name, generation, args, kwargs)
+                value = self.local.get(key)
+                if value is None and self.shared is not None:
+                    value = self.shared.get(key)
+                    if value is not None:
+                        self.local.set(key, value)
+                if (result := self._load(value, rebuild)) is not _MISS:
+                    return result
+                result = method(*args, **kwargs)
+            value = self._store(key, result)
+            if self.shared is not None:
+                self.shared.set(key, value)
+            return result
+
+        return read
+
+    def _cached_async(self, name: str, method, rebuild):
+        @wraps(method)
+        async def read(*args, **kwargs):
+            with one_replica():
+                generation = await self.repository.get_generation()
+                if generation is None:
+                    return await method(*args, **kwargs)
+                key = cache_key(name, generation, args, kwargs)
+                value = self.local.get(key)
+                if value is None and self.shared is not None:
+                    value = await run_in_threadpool(self.shared.get, key)
+                    if value is not None:
+                        self.local.set(key, value)
+                if (result := self._load(value, rebuild)) is not _MISS:
+                    return result
+                result = await method(*args, **kwargs)
+            value = self._store(key, result)
+            if self.shared is not None:
+                await run_in_threadpool(self.shared.set, key, value)
+            return result
+
+        return read
+
+
+def cached_graph_reads(
+    repository: GraphHistoryRelationalInterface,
+) -> GraphHistoryRelationalInterface | CachedGraphHistoryDB:
+    """`repository` behind the cache configured, as is if none is."""
+    if settings.GRAPH_CACHE_MAX_BYTES <= 0 and not settings.GRAPH_CACHE_URL:
+        return repository
+    local = LRUCache(
+        maxsize=settings.GRAPH_CACHE_MAX_ENTRIES,
+        ttl=settings.GRAPH_CACHE_TTL_SECONDS,
+        max_bytes=max(settings.GRAPH_CACHE_MAX_BYTES, 0),
+    )
+    shared = None
+    if settings.GRAPH_CACHE_URL:
+        shared = SharedCache.from_url(
+            settings.GRAPH_CACHE_URL,
+            prefix="commongraph:",
+            ttl=settings.GRAPH_CACHE_TTL_SECONDS,
+        )
+        logger.info("Graph reads cached in a shared store too")
+    return CachedGraphHistoryDB(repository, local, shared)
@@ -1,12 +1,63 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel
 
-_engine = None
+from backend.settings import settings
 
+_engines = {}
+_async_engines = {}
 
-def get_engine(database_url: str):
-    global _engine
-    if _engine is None:
-        _engine = create_engine(database_url)
-        SQLModel.metadata.create_all(_engine)
-    return _engine
+
+def get_engine(database_url: str, create_tables: bool = True):
+    """
+    Return the process-wide, pooled engine for `database_url`. Tables are
+    created on first use unless `create_tables` is off, e.g. for replicas.
+    """
+    engine = _engines.get(database_url)
+    if engine is None:
+        engine = create_engine(
+            database_url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+        if create_tables:
+            SQLModel.metadata.create_all(engine)
+        _engines[database_url] = engine
+    return engine
+
+
+def get_async_engine(database_url: str, create_tables: bool = True):
+    """
+    Return the process-wide, pooled asyncpg engine for `database_url`, which
+    may name any PostgreSQL driver. Tables are created through the sync engine.
+    """
+    engine = _async_engines.get(database_url)
+    if engine is None:
+        if create_tables:
+            get_engine(database_url)
+        engine = create_async_engine(
+            make_url(database_url).set(drivername="postgresql+asyncpg"),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+        _async_engines[database_url] = engine
+    return engine
+
+
+def dispose_engines() -> None:
+    """Close every pooled connection, e.g. on shutdown."""
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
+
+
+async def dispose_async_engines() -> None:
+    """Close every pooled asyncpg connection, e.g. on shutdown."""
+    for engine in _async_engines.values():
+        await engine.dispose()
+    _async_engines.clear()
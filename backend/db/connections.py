@@ -1,6 +1,12 @@
+import inspect
 import logging
+import threading
+from typing import Callable, Hashable, TypeVar
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
 from backend.settings import settings
 from backend.db.base import (
     GraphHistoryRelationalInterface,
@@ -12,17 +18,108 @@ from backend.db.postgresql import (
     RatingHistoryPostgreSQLDB,
     UserPostgreSQLDB,
 )
+from backend.db.postgresql_async import (
+    AsyncGraphHistoryPostgreSQLDB,
+    AsyncRatingHistoryPostgreSQLDB,
+    AsyncUserPostgreSQLDB,
+    get_async_sessionmaker,
+)
 from backend.db.janusgraph import JanusGraphDB
-from backend.db.config import get_engine
+from backend.db.memory import MemoryGraphDB
+from backend.db.cache import cached_graph_reads
+from backend.db.config import get_engine, dispose_engines, dispose_async_engines
+from backend.db.outbox import start_dispatcher, stop_dispatcher
+from backend.db.routing import close_replicas, replicas
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# application-scoped repositories, created once by init_services (or lazily)
+_services: dict[Hashable, object] = {}
+_services_lock = threading.Lock()
+
+
+def service(key: Hashable, factory: Callable[[], T]) -> T:
+    """Return the shared instance registered under `key`, creating it once."""
+    instance = _services.get(key)
+    if instance is None:
+        with _services_lock:
+            instance = _services.get(key)
+            if instance is None:
+                instance = _services[key] = factory()
+    return instance
+
+
+def init_services() -> None:
+    """Create the repositories and their connection pools, from lifespan."""
+    get_user_db()
+    get_graph_history_db()
+    get_rating_history_db()
+    graph_db = get_graph_db()
+    if isinstance(graph_db, JanusGraphDB):
+        start_dispatcher(graph_db)
+    elif isinstance(graph_db, MemoryGraphDB):
+        graph_db.start()
+    replicas()
+    logger.info("Database services initialised")
+
+
+def close_services() -> None:
+    """Close the graph connection and every pooled database connection."""
+    stop_dispatcher()
+    for instance in _services.values():
+        if isinstance(instance, JanusGraphDB):
+            instance.close()
+        elif isinstance(instance, MemoryGraphDB):
+            instance.stop()
+    _services.clear()
+    close_replicas()
+    dispose_engines()
+
+
+async def close_async_services() -> None:
+    """Close the asyncpg pools, after `close_services`."""
+    await dispose_async_engines()
+
+
+async def run_db(method: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Call a repository method from an async endpoint, whichever the backend:
+    coroutine methods (DB_ASYNC) are awaited on the event loop, blocking
+    ones run in the threadpool.
+    """
+    if inspect.iscoroutinefunction(method):
+        return await method(*args, **kwargs)
+    return await run_in_threadpool(method, *args, **kwargs)
+
+
+async def run_in_session(uow: Session | AsyncSession, fn: Callable[..., T], *args):
+    """Call the blocking `fn(*args, session)` with the sync face of `uow`."""
+    if isinstance(uow, AsyncSession):
+        return await uow.run_sync(lambda session: fn(*args, session))
+    return await run_in_threadpool(fn, *args, uow)
+
 
 def get_graph_db():
     if settings.ENABLE_GRAPH_DB:
-        logger.info("Using JanusGraph database")
-        return JanusGraphDB(settings.JANUSGRAPH_HOST, settings.TRAVERSAL_SOURCE)
-    logger.info("Graph DB disabled")
+        return service(
+            "graph_db",
+            lambda: JanusGraphDB(
+                settings.JANUSGRAPH_HOST,
+                settings.TRAVERSAL_SOURCE,
+                pool_size=settings.JANUSGRAPH_POOL_SIZE,
+            ),
+        )
+    if settings.IN_MEMORY_GRAPH_DB:
+        return service(
+            "graph_db",
+            lambda: MemoryGraphDB(
+                settings.POSTGRES_DB_URL,
+                refresh_seconds=settings.MEMORY_GRAPH_REFRESH_SECONDS,
+                snapshot_dir=settings.MEMORY_GRAPH_SNAPSHOT_DIR or None,
+            ),
+        )
     return None
 
 
@@ -31,8 +128,8 @@ def get_user_db(
 ) -> UserDatabaseInterface:
     if db_type == "postgresql":
         database_url = settings.POSTGRES_DB_URL
-        logger.info(f"Using User PostgreSQL database at {database_url}")
-        return UserPostgreSQLDB(database_url)
+        cls = AsyncUserPostgreSQLDB if settings.DB_ASYNC else UserPostgreSQLDB
+        return service(("user_db", database_url, cls), lambda: cls(database_url))
     else:
         raise ValueError(f"Unsupported db type: {db_type} for user_db")
 
@@ -42,8 +139,15 @@ def get_graph_history_db(
 ) -> GraphHistoryRelationalInterface:
     if db_type == "postgresql":
         database_url = settings.POSTGRES_DB_URL
-        logger.info(f"Using Graph History PostgreSQL database at {database_url}")
-        return GraphHistoryPostgreSQLDB(database_url)
+        cls = (
+            AsyncGraphHistoryPostgreSQLDB
+            if settings.DB_ASYNC
+            else GraphHistoryPostgreSQLDB
+        )
+        return service(
+            ("graph_history_db", database_url, cls),
+            lambda: cached_graph_reads(cls(database_url)),
+        )
     else:
         raise ValueError(f"Unsupported db type: {db_type} for graph_history_db")
 
@@ -53,8 +157,14 @@ def get_rating_history_db(
 ) -> RatingHistoryRelationalInterface:
     if db_type == "postgresql":
         database_url = settings.POSTGRES_DB_URL
-        logger.info(f"Using Rating History PostgreSQL database at {database_url}")
-        return RatingHistoryPostgreSQLDB(database_url)
+        cls = (
+            AsyncRatingHistoryPostgreSQLDB
+            if settings.DB_ASYNC
+            else RatingHistoryPostgreSQLDB
+        )
+        return service(
+            ("rating_history_db", database_url, cls), lambda: cls(database_url)
+        )
     else:
         raise ValueError(f"Unsupported db type: {db_type} for graph_history_db")
 
@@ -67,3 +177,22 @@ def get_relational_session():
     engine = get_engine(settings.POSTGRES_DB_URL)
     with Session(engine) as session:
         yield session
+
+
+async def get_unit_of_work():
+    """
+    Dependency providing the unit of work of a request: one session, hence one
+    connection and one transaction, that repositories join via `with_session`.
+    The endpoint commits it once, with `run_db(uow.commit)`; anything left
+    uncommitted is rolled back when the request ends. The session is async
+    under DB_ASYNC.
+    """
+    if settings.DB_ASYNC:
+        async with get_async_sessionmaker(settings.POSTGRES_DB_URL)() as session:
+            yield session
+    else:
+        session = Session(get_engine(settings.POSTGRES_DB_URL))
+        try:
+            yield session
+        finally:
+            await run_in_threadpool(session.close)
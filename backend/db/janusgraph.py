@@ -1,17 +1,22 @@
 import warnings
 import logging
+import threading
 from contextlib import contextmanager
+from enum import Enum
+from typing import Callable, Iterable, get_args, get_origin
 
 from fastapi import HTTPException, Query
 from gremlin_python.process.anonymous_traversal import traversal
 from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
 from gremlin_python.process.graph_traversal import __
-from gremlin_python.process.traversal import Order, P
+from gremlin_python.process.traversal import Direction, Order, P, T
 from gremlin_python.structure.graph import Edge as GremlinEdge
 from gremlin_python.structure.graph import Vertex as Gremlin_vertex
 from janusgraph_python.driver.serializer import JanusGraphSONSerializersV3d0
 from janusgraph_python.process.traversal import Text
+from sqlmodel import SQLModel
 
+from backend.config import EDGE_TYPE_PROPS, NODE_TYPE_PROPS
 from backend.models.base import (
     NodeBase,
     EdgeBase,
@@ -19,37 +24,59 @@ from backend.models.base import (
     PartialNodeBase,
     EdgeBase,
 )
+from backend.models.dynamic import DynamicSubgraph, EdgeTypeModels, NodeTypeModels
 from backend.models.fixed import NodeId
 from backend.properties import NodeStatus
 from backend.db.base import GraphDatabaseInterface
 
 
 class JanusGraphDB(GraphDatabaseInterface):
-    def __init__(self, host: str, traversal_source: str):
+    def __init__(self, host: str, traversal_source: str, pool_size: int = 4):
         super().__init__()
         self.host = host
         self.traversal_source = traversal_source
+        self.pool_size = pool_size
+        self._remote = None
+        self._g = None
+        self._remote_lock = threading.Lock()
         self.logger.info(
             f"Initialized JanusGraphDB with host: {host} and traversal source: {traversal_source}"
         )
 
     @contextmanager
     def connection(self):
-        connection = DriverRemoteConnection(
-            f"ws://{self.host}:8182/gremlin",
-            self.traversal_source,
-            message_serializer=JanusGraphSONSerializersV3d0(),
-        )
-        g = traversal().with_remote(connection)
+        """
+        Yield a traversal source bound to the shared remote connection, which
+        keeps a pool of `pool_size` websockets open across calls.
+        """
+        with self._remote_lock:
+            if self._remote is None:
+                self._remote = DriverRemoteConnection(
+                    f"ws://{self.host}:8182/gremlin",
+                    self.traversal_source,
+                    message_serializer=JanusGraphSONSerializersV3d0(),
+                    pool_size=self.pool_size,
+                )
+                self._g = traversal().with_remote(self._remote)
+            g = self._g
         try:
             yield g
-        finally:
-            connection.close()
+        except OSError:
+            # the server went away: reconnect on next use
+            self.close()
+            raise
+
+    def close(self):
+        with self._remote_lock:
+            if self._remote is not None:
+                self._remote.close()
+                self._remote = None
+                self._g = None
 
     def get_whole_graph(self) -> SubgraphBase:
         with self.connection() as g:
-            nodes = [convert_gremlin_vertex(vertex) for vertex in g.V().to_list()]
-            edges = [convert_gremlin_edge(edge) for edge in g.E().to_list()]
+            nodes = convert_vertex_maps(g.V().element_map(*NODE_KEYS))
+            edges = convert_edge_maps(g.E().element_map(*EDGE_KEYS))
         return SubgraphBase(nodes=nodes, edges=edges)
 
     def get_graph_summary(self) -> dict:
@@ -118,36 +145,81 @@ class JanusGraphDB(GraphDatabaseInterface):
 
             return {"nodes": nodes_out, "edges": edges_out}
 
-    def get_induced_subgraph(self, node_id: int, levels: int) -> SubgraphBase:
+    def get_induced_subgraph(
+        self, node_id: int, levels: int, max_degree: int | None = None
+    ) -> SubgraphBase:
+        """
+        Return the nodes within `levels` hops of `node_id` and the edges among
+        them, in a single traversal projecting both with elementMap(). With
+        `max_degree`, each hop follows at most that many edges per node.
+        """
+        hop = __.both_e()
+        if max_degree is not None:
+            hop = __.local(__.both_e().limit(max_degree))
         with self.connection() as g:
-            try:
-                # Start traversal from the given node
-                trav = g.V(node_id).repeat(__.both_e().both_v()).times(levels).dedup()
-                vertices = trav.to_list()
-
-                if not vertices:
-                    vertex = g.V(node_id).next()
-                    return {"nodes": [convert_gremlin_vertex(vertex)], "edges": []}
-
-                # Collect edges separately
-                edge_trav = (
-                    g.V(node_id)
-                    .repeat(__.both_e().both_v())
-                    .times(levels)
-                    .dedup()
-                    .both_e()
+            trav = g.V(node_id).aggregate("v")
+            if levels > 0:
+                trav = trav.repeat(hop.other_v().dedup().aggregate("v")).times(levels)
+            result = (
+                trav.fold()
+                .project("nodes", "edges")
+                .by(__.select("v").unfold().dedup().element_map(*NODE_KEYS).fold())
+                .by(
+                    __.select("v")
+                    .unfold()
                     .dedup()
+                    .out_e()
+                    .where(__.in_v().where(P.within("v")))
+                    .element_map(*EDGE_KEYS)
+                    .fold()
                 )
-                edges = edge_trav.to_list()
+                .next()
+            )
+        if not result["nodes"]:
+            raise HTTPException(status_code=404, detail="Node not found")
+        return DynamicSubgraph(
+            nodes=convert_vertex_maps(result["nodes"]),
+            edges=convert_edge_maps(result["edges"]),
+        )
 
-                # Convert vertices and edges to the appropriate data models
-                nodes = [convert_gremlin_vertex(vertex) for vertex in vertices]
-                edges = [convert_gremlin_edge(edge) for edge in edges]
-                return {"nodes": nodes, "edges": edges}
-            except StopIteration:
-                raise HTTPException(status_code=404, detail="Node not found")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
+    @staticmethod
+    def _search(
+        g,
+        node_type: list[str] | str | None = None,
+        title: str | None = None,
+        scope: str | None = None,
+        status: list[NodeStatus] | NodeStatus | None = None,
+        tags: list[str] | None = None,
+        description: str | None = None,
+    ):
+        """The traversal of the vertices matching the search criteria."""
+        trav = g.V()
+        if node_type is not None:
+            if isinstance(node_type, list):
+                trav = trav.has("node_type", P.within(node_type))
+            elif isinstance(node_type, str):
+                trav = trav.has("node_type", node_type)
+        if title:
+            for word in title.split(" "):
+                trav = trav.has("title", Text.text_contains_fuzzy(word))
+            # trav = trav.has("title", Text.text_fuzzy(title))           # in-memory which can be costly
+        if scope:
+            for word in scope.split(" "):
+                trav = trav.has("scope", Text.text_contains_fuzzy(word))
+        if status is not None:
+            if isinstance(status, list):
+                trav = trav.has("status", P.within(status))
+            elif isinstance(status, NodeStatus):
+                trav = trav.has("status", status)
+        if tags:
+            for tag in tags:
+                trav = trav.has(
+                    "tags", Text.text_contains_fuzzy(tag)
+                )  # Ok for now because tags is parsed as string
+        if description:
+            for word in description.split(" "):
+                trav = trav.has("description", Text.text_contains_fuzzy(word))
+        return trav
 
     def search_nodes(
         self,
@@ -159,33 +231,8 @@ class JanusGraphDB(GraphDatabaseInterface):
         description: str | None = None,
     ) -> list[NodeBase]:
         with self.connection() as g:
-            trav = g.V()
-            if node_type is not None:
-                if isinstance(node_type, list):
-                    trav = trav.has("node_type", P.within(node_type))
-                elif isinstance(node_type, str):
-                    trav = trav.has("node_type", node_type)
-            if title:
-                for word in title.split(" "):
-                    trav = trav.has("title", Text.text_contains_fuzzy(word))
-                # trav = trav.has("title", Text.text_fuzzy(title))           # in-memory which can be costly
-            if scope:
-                for word in scope.split(" "):
-                    trav = trav.has("scope", Text.text_contains_fuzzy(scope))
-            if status is not None:
-                if isinstance(status, list):
-                    trav = trav.has("status", P.within(status))
-                elif isinstance(status, NodeStatus):
-                    trav = trav.has("status", status)
-            if tags:
-                for tag in tags:
-                    trav = trav.has(
-                        "tags", Text.text_contains_fuzzy(tag)
-                    )  # Ok for now because tags is parsed as string
-            if description:
-                for word in description.split(" "):
-                    trav = trav.has("description", Text.text_contains_fuzzy(word))
-            return [convert_gremlin_vertex(node) for node in trav.to_list()]
+            trav = self._search(g, node_type, title, scope, status, tags, description)
+            return convert_vertex_maps(trav.element_map(*NODE_KEYS))
 
     def get_search_subgraph(
         self,
@@ -196,71 +243,46 @@ class JanusGraphDB(GraphDatabaseInterface):
         tags: list[str] | None = None,
         description: str | None = None,
         levels: int = 1,
+        max_elements: int | None = None,
     ) -> SubgraphBase:
         """
         Retrieve nodes matching search criteria along with their connections
-        up to 'levels' depth using Gremlin traversals.
+        up to 'levels' depth, and the edges among them, in one traversal: the
+        frontier is expanded server-side, never sent back and forth as IDs,
+        and elements are streamed back one by one. At most `max_elements`
+        nodes and edges are returned, search results first.
         """
         with self.connection() as g:
-            # Start with search criteria
-            trav = g.V()
-            if node_type is not None:
-                if isinstance(node_type, list):
-                    trav = trav.has("node_type", P.within(node_type))
-                elif isinstance(node_type, str):
-                    trav = trav.has("node_type", node_type)
-            if title:
-                for word in title.split(" "):
-                    trav = trav.has("title", Text.text_contains_fuzzy(word))
-            if scope:
-                for word in scope.split(" "):
-                    trav = trav.has("scope", Text.text_contains_fuzzy(scope))
-            if status is not None:
-                if isinstance(status, list):
-                    trav = trav.has("status", P.within(status))
-                elif isinstance(status, NodeStatus):
-                    trav = trav.has("status", status)
-            if tags:
-                for tag in tags:
-                    trav = trav.has("tags", Text.text_contains_fuzzy(tag))
-            if description:
-                for word in description.split(" "):
-                    trav = trav.has("description", Text.text_contains_fuzzy(word))
-
-            # Get search result nodes
-            search_nodes = [convert_gremlin_vertex(v) for v in trav.to_list()]
-
-            if not search_nodes or levels == 0:
-                from backend.models.dynamic import DynamicSubgraph
-
-                return DynamicSubgraph(nodes=search_nodes, edges=[])
-
-            # Collect all node IDs starting from search results
-            search_ids = [node.node_id for node in search_nodes]
-
-            # Use Gremlin to get connected subgraph
-            # Start from search result nodes and expand by 'levels' hops
-            all_nodes_trav = g.V(*search_ids)
-            for _ in range(levels):
-                all_nodes_trav = all_nodes_trav.both()
-
-            # Get all unique nodes in the subgraph
-            all_nodes = [
-                convert_gremlin_vertex(v) for v in all_nodes_trav.dedup().to_list()
-            ]
-            all_node_ids = [node.node_id for node in all_nodes]
-
-            # Get all edges between these nodes
-            edges_trav = (
-                g.V(*all_node_ids)
-                .out_e()
-                .where(__.in_v().has_id(P.within(all_node_ids)))
+            trav = self._search(
+                g, node_type, title, scope, status, tags, description
+            ).aggregate("v")
+            if levels > 0:
+                trav = trav.repeat(__.both().dedup().aggregate("v")).times(levels)
+            trav = trav.fold().select("v").unfold().dedup()
+            if max_elements is not None:
+                trav = trav.limit(max_elements)
+            # nodes first, then the edges among them
+            trav = (
+                trav.aggregate("kept")
+                .fold()
+                .union(
+                    __.select("kept").unfold().element_map(*NODE_KEYS),
+                    __.select("kept")
+                    .unfold()
+                    .out_e()
+                    .where(__.in_v().where(P.within("kept")))
+                    .element_map(*EDGE_KEYS),
+                )
             )
-            edges = [convert_gremlin_edge(e) for e in edges_trav.to_list()]
-
-            from backend.models.dynamic import DynamicSubgraph
-
-            return DynamicSubgraph(nodes=all_nodes, edges=edges)
+            if max_elements is not None:
+                trav = trav.limit(max_elements)
+            nodes, edges = [], []
+            for element_map in trav:
+                if Direction.OUT in element_map:
+                    edges.append(convert_edge_map(element_map))
+                else:
+                    nodes.append(convert_vertex_map(element_map))
+        return DynamicSubgraph(nodes=nodes, edges=edges)
 
     def get_random_node(self, node_type: str = None) -> NodeBase:
         with self.connection() as g:
@@ -268,7 +290,13 @@ class JanusGraphDB(GraphDatabaseInterface):
                 trav = g.V()
                 if node_type is not None:
                     trav = trav.has_label(node_type)
-                vertex = trav.order().by(Order.shuffle).limit(1).next()
+                vertex = (
+                    trav.order()
+                    .by(Order.shuffle)
+                    .limit(1)
+                    .element_map(*NODE_KEYS)
+                    .next()
+                )
             except StopIteration:
                 if node_type is not None:
                     raise HTTPException(
@@ -279,15 +307,15 @@ class JanusGraphDB(GraphDatabaseInterface):
                     status_code=404,
                     detail="Error fetching a random node, there may be no node in the database",
                 )
-            return convert_gremlin_vertex(vertex)
+            return convert_vertex_map(vertex)
 
     def get_node(self, node_id: int) -> NodeBase:
         with self.connection() as g:
             try:
-                vertex = g.V(node_id).next()
+                vertex = g.V(node_id).element_map(*NODE_KEYS).next()
             except StopIteration:
                 raise HTTPException(status_code=404, detail="Node not found")
-            return convert_gremlin_vertex(vertex)
+            return convert_vertex_map(vertex)
 
     def create_node(self, node: NodeBase) -> NodeBase:
         with self.connection() as g:
@@ -313,18 +341,14 @@ class JanusGraphDB(GraphDatabaseInterface):
 
     def get_edge_list(self) -> list[EdgeBase]:
         with self.connection() as g:
-            return [
-                convert_gremlin_edge(edge)
-                for edge in g.E().to_list()
-                if edge is not None
-            ]
+            return convert_edge_maps(g.E().element_map(*EDGE_KEYS))
 
     def get_edge(self, source_id: int, target_id: int) -> EdgeBase:
         with self.connection() as g:
             try:
                 traversal = g.V(source_id).out_e().where(__.in_v().has_id(target_id))
-                edge = traversal.next()
-                return convert_gremlin_edge(edge)
+                edge = traversal.element_map(*EDGE_KEYS).next()
+                return convert_edge_map(edge)
             except StopIteration:
                 raise HTTPException(status_code=404, detail="Edge not found")
 
@@ -352,13 +376,7 @@ class JanusGraphDB(GraphDatabaseInterface):
                     trav = trav.has_label(edge_type)
 
                 # Execute the traversal and convert to list
-                edges = trav.to_list()
-
-                # Check if edges are found
-                if not edges:
-                    return []
-
-                return [convert_gremlin_edge(edge) for edge in edges]
+                return convert_edge_maps(trav.element_map(*EDGE_KEYS))
 
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
@@ -509,6 +527,103 @@ def unparse_stringlist(s: str) -> list[str]:
     return s.split(";")
 
 
+# properties elementMap() projects vertices and edges on, see convert_vertex_maps
+NODE_KEYS = ("node_type", *sorted(set().union(*NODE_TYPE_PROPS.values())))
+EDGE_KEYS = tuple(sorted(set().union(*EDGE_TYPE_PROPS.values())))
+
+_PARSERS: dict[type, tuple[tuple[str, Callable | None], ...]] = {}
+
+
+def _is_list(annotation) -> bool:
+    """Whether `annotation` is a list, possibly optional."""
+    return get_origin(annotation) is list or any(
+        get_origin(arg) is list for arg in get_args(annotation)
+    )
+
+
+def _parser(annotation) -> Callable | None:
+    """How a stored value is read back: lists are ";"-joined, enums by value."""
+    if _is_list(annotation):
+        return unparse_stringlist
+    for arg in (annotation, *get_args(annotation)):
+        if isinstance(arg, type) and issubclass(arg, Enum):
+            return arg
+    return None
+
+
+def _parsers(Model: type[SQLModel]) -> tuple[tuple[str, Callable | None], ...]:
+    """The fields of `Model`, each with the parser of its stored values."""
+    parsers = _PARSERS.get(Model)
+    if parsers is None:
+        parsers = _PARSERS[Model] = tuple(
+            (name, _parser(info.annotation))
+            for name, info in Model.model_fields.items()
+        )
+    return parsers
+
+
+def _from_map(
+    Model: type[SQLModel], data: dict, element_map: dict, trusted: bool
+) -> SQLModel:
+    # looked up by field, as the T and Direction keys hash slowly
+    for name, parse in _parsers(Model):
+        value = element_map.get(name)
+        if value is not None and name not in data:
+            data[name] = value if parse is None else parse(value)
+    # JanusGraph only holds what validated models wrote to it
+    return Model.model_construct(**data) if trusted else Model(**data)
+
+
+def convert_vertex_maps(
+    element_maps: Iterable[dict], trusted: bool = True
+) -> list[NodeBase]:
+    """
+    Convert elementMap()s of vertices to nodes of their types. With `trusted`,
+    values are parsed but not validated, and models built with
+    model_construct; vertices of unknown types are validated regardless.
+    """
+    nodes = []
+    for element_map in element_maps:
+        node_type = element_map.get("node_type") or element_map.get(T.label)
+        Model = NodeTypeModels.get(node_type)
+        data = {"node_id": element_map[T.id], "node_type": node_type}
+        if Model is None:
+            nodes.append(_from_map(NodeBase, data, element_map, trusted=False))
+        else:
+            nodes.append(_from_map(Model, data, element_map, trusted))
+    return nodes
+
+
+def convert_edge_maps(
+    element_maps: Iterable[dict], trusted: bool = True
+) -> list[EdgeBase]:
+    """Convert elementMap()s of edges to edges of their types, see convert_vertex_maps."""
+    edges = []
+    for element_map in element_maps:
+        edge_type = element_map[T.label]
+        Model = EdgeTypeModels.get(edge_type)
+        data = {
+            "source": element_map[Direction.OUT][T.id],
+            "target": element_map[Direction.IN][T.id],
+            "edge_type": edge_type,
+        }
+        if Model is None:
+            edges.append(_from_map(EdgeBase, data, element_map, trusted=False))
+        else:
+            edges.append(_from_map(Model, data, element_map, trusted))
+    return edges
+
+
+def convert_vertex_map(element_map: dict, trusted: bool = True) -> NodeBase:
+    """Convert the elementMap() of a vertex to a node of its type."""
+    return convert_vertex_maps([element_map], trusted)[0]
+
+
+def convert_edge_map(element_map: dict, trusted: bool = True) -> EdgeBase:
+    """Convert the elementMap() of an edge to an edge of its type."""
+    return convert_edge_maps([element_map], trusted)[0]
+
+
 def convert_gremlin_vertex(vertex: Gremlin_vertex) -> NodeBase:
     """Convert a gremlin vertex to a NodeBase object."""
     d = dict()
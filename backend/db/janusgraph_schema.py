@@ -0,0 +1,204 @@
+"""
+JanusGraph schema and index bootstrap.
+
+    python -m backend.db.janusgraph_schema [--graph NAME] [--reindex] [--timeout SECONDS]
+
+Creates, unless they exist, a property key for node_type and every configured
+node and edge property, an edge label for every edge type, composite indexes
+for the properties that searches filter on by equality, and a mixed index for
+those they match text in. Indexes created, and keys added to the mixed index,
+are reindexed over the existing data, and waited on until enabled; --reindex
+reindexes every index. Runs are idempotent.
+
+Run it once JanusGraph is up; SchemaManager.apply_schema_update runs it again,
+in the background, when a schema update adds properties or types.
+"""
+
+import argparse
+import logging
+import threading
+
+from gremlin_python.driver.client import Client
+from janusgraph_python.driver.serializer import JanusGraphSONSerializersV3d0
+
+from backend.config import EDGE_TYPE_PROPS, NODE_TYPE_PROPS
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# graphs of the server, by traversal source, see janusgraph_config/
+GRAPHS = {"g": "graph", "g_test": "test"}
+
+# properties filtered on with has(key, value), each with its composite index
+EQUALITY_FIELDS = ("node_type", "status")
+# properties matched with Text predicates, in the mixed index
+TEXT_FIELDS = ("title", "scope", "description", "tags")
+MIXED_INDEX = "node_text"
+# name of the index backend in main.properties (index.search.backend)
+INDEX_BACKEND = "search"
+
+# schema changes that may need new keys, labels or index keys
+SCHEMA_CHANGES = frozenset(
+    {"add_node_type", "add_node_property", "add_edge_type", "add_edge_property"}
+)
+
+# Every value is stored as a string, lists joined with ";", see janusgraph.py.
+_CREATE = """
+import org.janusgraph.core.schema.Mapping
+
+def jg = __graph__
+jg.tx().rollback()
+def mgmt = jg.openManagement()
+def created = []
+def pending = []
+keys.each { name ->
+    if (!mgmt.containsPropertyKey(name)) {
+        mgmt.makePropertyKey(name).dataType(String.class).cardinality(Cardinality.SINGLE).make()
+        created << "property key " + name
+    }
+}
+labels.each { name ->
+    if (!mgmt.containsEdgeLabel(name)) {
+        mgmt.makeEdgeLabel(name).make()
+        created << "edge label " + name
+    }
+}
+composite.each { name, fields ->
+    if (!mgmt.containsGraphIndex(name)) {
+        def builder = mgmt.buildIndex(name, Vertex.class)
+        fields.each { builder.addKey(mgmt.getPropertyKey(it)) }
+        builder.buildCompositeIndex()
+        created << "composite index " + name
+        pending << name
+    }
+}
+mixed.each { name, fields ->
+    def index = mgmt.getGraphIndex(name)
+    if (index == null) {
+        def builder = mgmt.buildIndex(name, Vertex.class)
+        fields.each { builder.addKey(mgmt.getPropertyKey(it), Mapping.TEXT.asParameter()) }
+        builder.buildMixedIndex(backend)
+        created << "mixed index " + name
+        pending << name
+    } else {
+        def indexed = index.getFieldKeys()*.name()
+        fields.findAll { !(it in indexed) }.each {
+            mgmt.addIndexKey(index, mgmt.getPropertyKey(it), Mapping.TEXT.asParameter())
+            created << "mixed index key " + name + "." + it
+            if (!(name in pending)) pending << name
+        }
+    }
+}
+mgmt.commit()
+// wrapped, as the server would stream a bare map as its entries
+[[created: created, pending: pending, all: composite.keySet() + mixed.keySet()]]
+"""
+
+# REINDEX builds the index over existing data, then enables it
+_REINDEX = """
+import java.time.temporal.ChronoUnit
+import org.janusgraph.core.schema.SchemaAction
+import org.janusgraph.core.schema.SchemaStatus
+import org.janusgraph.graphdb.database.management.ManagementSystem
+
+def jg = __graph__
+jg.tx().rollback()
+ManagementSystem.awaitGraphIndexStatus(jg, name)
+    .status(SchemaStatus.REGISTERED, SchemaStatus.ENABLED)
+    .timeout(timeout, ChronoUnit.SECONDS).call()
+def mgmt = jg.openManagement()
+mgmt.updateIndex(mgmt.getGraphIndex(name), SchemaAction.REINDEX).get()
+mgmt.commit()
+ManagementSystem.awaitGraphIndexStatus(jg, name)
+    .status(SchemaStatus.ENABLED)
+    .timeout(timeout, ChronoUnit.SECONDS).call().getSucceeded()
+"""
+
+
+def schema_bindings() -> dict:
+    """The keys, labels and indexes the configuration calls for."""
+    node_props = set().union(*NODE_TYPE_PROPS.values())
+    edge_props = set().union(*EDGE_TYPE_PROPS.values())
+    keys = {"node_type", *node_props, *edge_props}
+    text_fields = [f for f in TEXT_FIELDS if f in node_props]
+    return {
+        "keys": sorted(keys),
+        "labels": sorted(EDGE_TYPE_PROPS),
+        "composite": {f"by_{f}": [f] for f in EQUALITY_FIELDS if f in keys},
+        "mixed": {MIXED_INDEX: text_fields} if text_fields else {},
+        "backend": INDEX_BACKEND,
+    }
+
+
+def _client(traversal_source: str) -> Client:
+    return Client(
+        f"ws://{settings.JANUSGRAPH_HOST}:8182/gremlin",
+        traversal_source,
+        message_serializer=JanusGraphSONSerializersV3d0(),
+    )
+
+
+def bootstrap(
+    graph: str | None = None, reindex: bool = False, timeout: int = 600
+) -> list[str]:
+    """Bring the schema of `graph` in line with the configuration, see module doc."""
+    graph = graph or GRAPHS.get(settings.TRAVERSAL_SOURCE, "graph")
+    if not graph.isidentifier():
+        raise ValueError(f"Invalid graph name: {graph}")
+    # management scripts may run for long: reindexing scans the whole graph
+    options = {"evaluationTimeout": (timeout + 60) * 1000}
+    client = _client(settings.TRAVERSAL_SOURCE)
+    try:
+        result = client.submit(
+            _CREATE.replace("__graph__", graph),
+            schema_bindings(),
+            request_options=options,
+        ).one()[0]
+        log = list(result["created"])
+        for name in result["all"] if reindex else result["pending"]:
+            enabled = client.submit(
+                _REINDEX.replace("__graph__", graph),
+                {"name": name, "timeout": timeout},
+                request_options=options,
+            ).one()[0]
+            log.append(
+                f"index {name} {'enabled' if enabled else 'not enabled in time'}"
+            )
+        return log
+    finally:
+        client.close()
+
+
+def bootstrap_in_background(changes: list[dict]) -> None:
+    """Bootstrap again if schema `changes` may need new keys or index keys."""
+    if not settings.ENABLE_GRAPH_DB:
+        return
+    if not any(change.get("type") in SCHEMA_CHANGES for change in changes):
+        return
+
+    def run():
+        try:
+            for line in bootstrap():
+                logger.info(f"JanusGraph schema: {line}")
+        except Exception as e:
+            logger.error(f"JanusGraph schema bootstrap failed: {e}")
+
+    threading.Thread(target=run, name="janusgraph-schema", daemon=True).start()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--graph", help="graph of the server, by default that of TRAVERSAL_SOURCE"
+    )
+    parser.add_argument("--reindex", action="store_true", help="reindex every index")
+    parser.add_argument("--timeout", type=int, default=600)
+    args = parser.parse_args(argv)
+
+    for line in bootstrap(args.graph, reindex=args.reindex, timeout=args.timeout):
+        print(line)
+    print("JanusGraph schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
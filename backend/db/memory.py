@@ -0,0 +1,1165 @@
+"""
+In-memory graph database, for deployments without JanusGraph.
+
+With IN_MEMORY_GRAPH_DB, each worker holds the current graph in compact
+arrays: node IDs, type codes and property values indexed by node position,
+every string interned once in a table, and the edges in CSR form, outgoing
+and incoming, over node positions. The graph is loaded from the latest states
+of the graph history at startup, then kept current by a thread applying the
+events logged since, every MEMORY_GRAPH_REFRESH_SECONDS; reads may lag writes
+by as much.
+
+Arrays are never modified in place: a batch of events makes new ones, which
+are swapped in at once, so a read sees a single state of the graph
+throughout. Only the elements changed are built anew, the others are copied
+as they are (see GraphArrays.apply), until the arrays are due a rebuild.
+
+With MEMORY_GRAPH_SNAPSHOT_DIR, the workers of a host share the arrays
+instead: one of them refreshes the graph and writes it as a snapshot, which
+all map read-only (see db/snapshot.py). Arrays read from a snapshot are
+memoryviews of the mapped file rather than arrays, to the same effect.
+"""
+
+import logging
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from enum import Enum
+from typing import Iterable, Sequence, get_args, get_origin
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from backend.db.base import GraphDatabaseInterface
+from backend.db.config import get_engine
+from backend.db.snapshot import SnapshotStore
+from backend.models.base import EdgeBase, NodeBase, SubgraphBase
+from backend.models.dynamic import DynamicSubgraph, construct_edge, construct_node
+from backend.models.fixed import EntityState, GraphHistoryEvent, NodeId
+from backend.properties import NodeStatus, PredefinedProperties
+
+logger = logging.getLogger(__name__)
+
+# an event ID missing above the last one applied may belong to a transaction
+# still to commit: it is looked for again this long
+_GAP_SECONDS = 60
+
+_NONE = -1  # string code of unset values, and type code of deleted elements
+
+# the arrays are rebuilt once the elements appended or deleted since they were
+# built are 1/_REBUILD_SHARE of them, and at least _REBUILD_MIN
+_REBUILD_SHARE = 8
+_REBUILD_MIN = 4096
+
+
+def _is_list(annotation) -> bool:
+    return get_origin(annotation) is list or any(
+        get_origin(arg) is list for arg in get_args(annotation)
+    )
+
+
+# properties are strings, enums of strings, or lists of strings
+PROPERTIES = tuple(PredefinedProperties.model_fields)
+LIST_PROPERTIES = frozenset(
+    name
+    for name, info in PredefinedProperties.model_fields.items()
+    if _is_list(info.annotation)
+)
+
+
+class _Strings:
+    """Strings interned while building arrays, by code."""
+
+    def __init__(self):
+        self.values: list[str] = []
+        self.codes: dict[str, int] = {}
+
+    def code(self, value) -> int:
+        if value is None:
+            return _NONE
+        value = value.value if isinstance(value, Enum) else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def sort(self) -> array:
+        """Sort the strings; return the new code of each old one."""
+        order = sorted(range(len(self.values)), key=self.values.__getitem__)
+        recode = array("i", [0]) * len(order)
+        for new, old in enumerate(order):
+            recode[old] = new
+        self.values = [self.values[old] for old in order]
+        return recode
+
+
+class StringTable:
+    """Sorted strings, the i-th being data[offsets[i]:offsets[i + 1]] in UTF-8."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def of(cls, values: list[str]) -> "StringTable":
+        offsets, data = array("q", [0]), bytearray()
+        for value in values:
+            data += value.encode()
+            offsets.append(len(data))
+        return cls(offsets, bytes(data))
+
+    def extended(self, values: list[str]) -> "StringTable":
+        """A table of these strings, then `values`."""
+        offsets = _copy(self.offsets, "q")
+        data = bytearray(self.data[: offsets[-1]])
+        for value in values:
+            data += value.encode()
+            offsets.append(len(data))
+        return StringTable(offsets, bytes(data))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.data[self.offsets[i] : self.offsets[i + 1]], "utf-8")
+
+
+class AppendedStrings:
+    """The sorted strings `base`, then `tail`, those added since, unsorted."""
+
+    def __init__(self, base, tail: list[str]):
+        self.base = base
+        self.tail = tail
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.tail)
+
+    def __getitem__(self, i: int) -> str:
+        n = len(self.base)
+        return self.base[i] if i < n else self.tail[i - n]
+
+
+class Lists:
+    """Lists of codes, the i-th being codes[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, offsets, codes):
+        self.offsets = offsets
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        return self.codes[self.offsets[i] : self.offsets[i + 1]]
+
+
+class _Positions:
+    """
+    Positions of live nodes by ID, node IDs being sorted up to position
+    `count`; `appended` holds those of the live nodes after.
+    """
+
+    def __init__(self, node_ids, node_types, count: int, appended: dict):
+        self.node_ids = node_ids
+        self.node_types = node_types
+        self.count = count
+        self.appended = appended
+
+    def get(self, node_id: NodeId) -> int | None:
+        p = self.appended.get(node_id)
+        if p is not None:
+            return p
+        p = bisect_left(self.node_ids, node_id, 0, self.count)
+        if (
+            p < self.count
+            and self.node_ids[p] == node_id
+            and self.node_types[p] != _NONE
+        ):
+            return p
+        return None
+
+    def __getitem__(self, node_id: NodeId) -> int:
+        p = self.get(node_id)
+        if p is None:
+            raise KeyError(node_id)
+        return p
+
+
+def _columns(rows: list[dict], strings: _Strings) -> dict[str, array | Lists]:
+    columns = {}
+    for name in PROPERTIES:
+        if name in LIST_PROPERTIES:
+            offsets, codes = array("i", [0]), array("i")
+            for row in rows:
+                codes.extend(strings.code(v) for v in row.get(name) or ())
+                offsets.append(len(codes))
+            columns[name] = Lists(offsets, codes)
+        else:
+            columns[name] = array("i", (strings.code(row.get(name)) for row in rows))
+    return columns
+
+
+def _copy(values, typecode: str) -> array:
+    """A copy of the integers `values`, an array or a memoryview of one."""
+    copy = array(typecode)
+    copy.frombytes(memoryview(values).cast("B"))
+    return copy
+
+
+def _copy_columns(columns: dict) -> dict[str, array | Lists]:
+    return {
+        name: (
+            Lists(_copy(column.offsets, "i"), _copy(column.codes, "i"))
+            if isinstance(column, Lists)
+            else _copy(column, "i")
+        )
+        for name, column in columns.items()
+    }
+
+
+def _recode(codes: array, recode: array) -> array:
+    return array("i", (_NONE if c == _NONE else recode[c] for c in codes))
+
+
+def _csr(count: int, keys) -> tuple[array, array]:
+    """Offsets into, and edge indexes sorted by, node positions `keys`."""
+    offsets = array("i", [0]) * (count + 1)
+    for key in keys:
+        offsets[key + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    order = array("i", [0]) * len(keys)
+    fill = array("i", offsets)
+    for edge, key in enumerate(keys):
+        order[fill[key]] = edge
+        fill[key] += 1
+    return offsets, order
+
+
+class GraphArrays:
+    """
+    The graph as arrays. Nodes are numbered by position, in the order of their
+    IDs, edges by index; `out_offsets[p]:out_offsets[p + 1]` slices the
+    indexes of the edges out of the node at position p from `out_edges`,
+    likewise for `in_`. Properties are columns of codes into the sorted
+    `strings`, Lists of codes for list properties.
+
+    Elements changed since the arrays were built are appended after those
+    the CSR arrays index, strings after the sorted ones, and the elements
+    they replace are kept, of type _NONE: reads skip these, and look up the
+    edges of appended ones in dicts (see `apply`).
+
+    Any sequence of integers will do for arrays, and of strings for `strings`:
+    arrays built here, or memoryviews of a snapshot, see db/snapshot.py.
+    """
+
+    def __init__(
+        self,
+        strings,
+        node_ids,
+        node_types,
+        node_props: dict,
+        edge_sources,
+        edge_targets,
+        edge_types,
+        edge_props: dict,
+        csr: tuple | None = None,
+    ):
+        self.strings = strings
+        self.node_ids = node_ids
+        self.node_types = node_types
+        self.node_props = node_props
+        self.edge_sources = edge_sources
+        self.edge_targets = edge_targets
+        self.edge_types = edge_types
+        self.edge_props = edge_props
+        if csr is None:
+            csr = (
+                *_csr(len(node_ids), edge_sources),
+                *_csr(len(node_ids), edge_targets),
+            )
+        self.out_offsets, self.out_edges, self.in_offsets, self.in_edges = csr
+
+        # elements past these were appended, see `apply`
+        self.indexed_nodes = len(self.out_offsets) - 1
+        self.indexed_edges = len(self.out_edges)
+        self.sorted_strings = len(
+            strings.base if isinstance(strings, AppendedStrings) else strings
+        )
+        self.deleted_nodes = _copy(node_types, "i").count(_NONE)
+        self.deleted_edges = _copy(edge_types, "i").count(_NONE)
+        appended = {
+            node_ids[p]: p
+            for p in range(self.indexed_nodes, len(node_ids))
+            if node_types[p] != _NONE
+        }
+        self.position = _Positions(node_ids, node_types, self.indexed_nodes, appended)
+        self._appended_out: dict[int, list[int]] = {}
+        self._appended_in: dict[int, list[int]] = {}
+        for e in range(self.indexed_edges, len(edge_types)):
+            if edge_types[e] != _NONE:
+                self._appended_out.setdefault(edge_sources[e], []).append(e)
+                self._appended_in.setdefault(edge_targets[e], []).append(e)
+        self._appended_codes = {
+            strings[i]: i for i in range(self.sorted_strings, len(strings))
+        }
+
+    @classmethod
+    def build(cls, nodes: Iterable[dict], edges: Iterable[dict]) -> "GraphArrays":
+        """Build the arrays of the `nodes` and `edges` payloads, as in the history."""
+        strings = _Strings()
+        nodes = sorted(nodes, key=lambda payload: payload["node_id"])
+        node_ids = array("q", (payload["node_id"] for payload in nodes))
+        node_types = array("i", (strings.code(p["node_type"]) for p in nodes))
+        node_props = _columns(nodes, strings)
+
+        position = _Positions(node_ids, node_types, len(node_ids), {})
+        sources, targets, edge_types, rows = array("i"), array("i"), array("i"), []
+        for payload in edges:
+            source = position.get(payload["source"])
+            target = position.get(payload["target"])
+            if source is None or target is None:
+                continue  # dangling: one of its nodes was deleted
+            sources.append(source)
+            targets.append(target)
+            edge_types.append(strings.code(payload["edge_type"]))
+            rows.append(payload)
+        edge_props = _columns(rows, strings)
+
+        # codes into the sorted strings, to look them up by bisection
+        recode = strings.sort()
+        for columns in (node_props, edge_props):
+            for name, column in columns.items():
+                if isinstance(column, Lists):
+                    column.codes = _recode(column.codes, recode)
+                else:
+                    columns[name] = _recode(column, recode)
+        return cls(
+            strings.values,
+            node_ids,
+            _recode(node_types, recode),
+            node_props,
+            sources,
+            targets,
+            _recode(edge_types, recode),
+            edge_props,
+        )
+
+    @classmethod
+    def empty(cls) -> "GraphArrays":
+        return cls.build([], [])
+
+    def __len__(self) -> int:
+        return len(self.node_ids) - self.deleted_nodes
+
+    def edge_count(self) -> int:
+        return len(self.edge_types) - self.deleted_edges
+
+    def positions(self) -> Sequence[int]:
+        """Positions of the nodes, in the order of their IDs."""
+        count = len(self.node_ids)
+        if not self.deleted_nodes and count == self.indexed_nodes:
+            return range(count)
+        live = [p for p in range(count) if self.node_types[p] != _NONE]
+        if count > self.indexed_nodes:
+            live.sort(key=self.node_ids.__getitem__)
+        return live
+
+    def edge_indexes(self) -> Sequence[int]:
+        if not self.deleted_edges:
+            return range(len(self.edge_types))
+        return [e for e in range(len(self.edge_types)) if self.edge_types[e] != _NONE]
+
+    def code(self, value: str | Enum) -> int | None:
+        """The code of `value` in `strings`, None if absent."""
+        value = value.value if isinstance(value, Enum) else value
+        i = bisect_left(self.strings, value, 0, self.sorted_strings)
+        if i < self.sorted_strings and self.strings[i] == value:
+            return i
+        return self._appended_codes.get(value)
+
+    # payloads, to rebuild from
+
+    def _props(self, columns: dict, i: int) -> dict:
+        strings, props = self.strings, {}
+        for name, column in columns.items():
+            value = column[i]
+            if name in LIST_PROPERTIES:
+                if len(value):
+                    props[name] = [strings[code] for code in value]
+            elif value != _NONE:
+                props[name] = strings[value]
+        return props
+
+    def node_payload(self, p: int) -> dict:
+        return {
+            "node_id": self.node_ids[p],
+            "node_type": self.strings[self.node_types[p]],
+            **self._props(self.node_props, p),
+        }
+
+    def edge_payload(self, e: int) -> dict:
+        return {
+            "source": self.node_ids[self.edge_sources[e]],
+            "target": self.node_ids[self.edge_targets[e]],
+            "edge_type": self.strings[self.edge_types[e]],
+            **self._props(self.edge_props, e),
+        }
+
+    def apply(
+        self,
+        nodes: dict[NodeId, dict | None],
+        edges: dict[tuple[NodeId, NodeId], dict | None],
+    ) -> "GraphArrays":
+        """
+        New arrays with the nodes and edges of `nodes` and `edges`, by ID and
+        by (source, target), upserted, or deleted where None.
+
+        No element is moved, so that the arrays of the others are copied as
+        they are, CSR arrays included: those changed are marked deleted and
+        their new states appended, with the edges of a changed node, to point
+        at its new position. The arrays are rebuilt once these make up too
+        large a share of them, see _REBUILD_SHARE.
+        """
+        new = _Appender(self)
+        moved = {}  # edges of changed nodes, by (source, target)
+        for node_id, payload in nodes.items():
+            p = self.position.get(node_id)
+            if p is None:
+                continue
+            new.node_types[p] = _NONE
+            for e in (*self.out_of(p), *self.in_of(p)):
+                if new.edge_types[e] != _NONE:
+                    new.edge_types[e] = _NONE
+                    if payload is not None:
+                        edge = self.edge_payload(e)
+                        moved[edge["source"], edge["target"]] = edge
+        for source_id, target_id in edges:
+            moved.pop((source_id, target_id), None)
+            e = self.edge_index(source_id, target_id)
+            if e is not None:
+                new.edge_types[e] = _NONE
+        for payload in nodes.values():
+            if payload is not None:
+                new.add_node(payload)
+        for payload in (*moved.values(), *edges.values()):
+            if payload is not None:
+                new.add_edge(payload)
+
+        arrays = new.arrays()
+        appended = len(arrays.node_ids) - arrays.indexed_nodes
+        appended += len(arrays.edge_types) - arrays.indexed_edges
+        changed = appended + arrays.deleted_nodes + arrays.deleted_edges
+        built = arrays.indexed_nodes + arrays.indexed_edges
+        if changed > max(_REBUILD_MIN, built // _REBUILD_SHARE):
+            return GraphArrays.build(
+                [arrays.node_payload(p) for p in arrays.positions()],
+                [arrays.edge_payload(e) for e in arrays.edge_indexes()],
+            )
+        return arrays
+
+    # models
+
+    def node(self, p: int) -> NodeBase:
+        return construct_node(self.node_payload(p))
+
+    def edge(self, e: int) -> EdgeBase:
+        return construct_edge(self.edge_payload(e))
+
+    # traversals
+
+    def _edges_at(self, p: int, offsets, indexed, appended: dict) -> list[int]:
+        found = (
+            [*indexed[offsets[p] : offsets[p + 1]]] if p < self.indexed_nodes else []
+        )
+        found += appended.get(p, ())
+        if self.deleted_edges:
+            found = [e for e in found if self.edge_types[e] != _NONE]
+        return found
+
+    def out_of(self, p: int) -> list[int]:
+        """Indexes of the edges out of the node at `p`."""
+        return self._edges_at(p, self.out_offsets, self.out_edges, self._appended_out)
+
+    def in_of(self, p: int) -> list[int]:
+        """Indexes of the edges into the node at `p`."""
+        return self._edges_at(p, self.in_offsets, self.in_edges, self._appended_in)
+
+    def edge_index(self, source_id: NodeId, target_id: NodeId) -> int | None:
+        source = self.position.get(source_id)
+        target = self.position.get(target_id)
+        if source is None or target is None:
+            return None
+        return next(
+            (e for e in self.out_of(source) if self.edge_targets[e] == target), None
+        )
+
+    def neighbours(self, p: int, max_degree: int | None = None) -> list[int]:
+        """Positions of the nodes next to that at `p`, either way."""
+        found = [self.edge_targets[e] for e in self.out_of(p)]
+        found += [self.edge_sources[e] for e in self.in_of(p)]
+        return found if max_degree is None else found[:max_degree]
+
+    def expand(
+        self,
+        start: Iterable[int],
+        levels: int,
+        max_degree: int | None = None,
+        max_nodes: int | None = None,
+    ) -> list[int]:
+        """Positions within `levels` hops of those of `start`, breadth first."""
+        kept = list(dict.fromkeys(start))[:max_nodes]
+        seen = set(kept)
+        queue = deque((p, 0) for p in kept)
+        while queue:
+            p, level = queue.popleft()
+            if level == levels:
+                continue
+            for q in self.neighbours(p, max_degree):
+                if q not in seen:
+                    if max_nodes is not None and len(kept) >= max_nodes:
+                        return kept
+                    seen.add(q)
+                    kept.append(q)
+                    queue.append((q, level + 1))
+        return kept
+
+    def edges_among(self, positions: list[int]) -> list[int]:
+        """Indexes of the edges between nodes at `positions`."""
+        inside = set(positions)
+        return [
+            e
+            for p in positions
+            for e in self.out_of(p)
+            if self.edge_targets[e] in inside
+        ]
+
+    def subgraph(self, positions: list[int], edges: list[int]) -> DynamicSubgraph:
+        return DynamicSubgraph.model_construct(
+            nodes=[self.node(p) for p in positions],
+            edges=[self.edge(e) for e in edges],
+        )
+
+    def search(
+        self,
+        node_type: list[str] | str | None = None,
+        title: str | None = None,
+        scope: str | None = None,
+        status: list[NodeStatus] | NodeStatus | None = None,
+        tags: list[str] | None = None,
+        description: str | None = None,
+    ) -> list[int]:
+        """
+        Positions of the nodes matching all filters, as GraphHistoryPostgreSQLDB
+        matches them: types and statuses among those given, every word of the
+        text filters in the text, every tag in the tags, case aside.
+        """
+        matches = self.positions()
+        strings = self.strings
+        for name, value in (("node_type", node_type), ("status", status)):
+            if value is None:
+                continue
+            values = value if isinstance(value, list) else [value]
+            wanted = {self.code(v) for v in values}
+            column = self.node_types if name == "node_type" else self.node_props[name]
+            matches = [p for p in matches if column[p] in wanted]
+        for name, value in (
+            ("title", title),
+            ("scope", scope),
+            ("description", description),
+        ):
+            if value is None:
+                continue
+            column, words = self.node_props[name], value.lower().split()
+            matches = [
+                p
+                for p in matches
+                if column[p] != _NONE
+                and all(w in strings[column[p]].lower() for w in words)
+            ]
+        if tags is not None:
+            column, wanted = self.node_props["tags"], {t.lower() for t in tags}
+            matches = [
+                p
+                for p in matches
+                if wanted <= {strings[code].lower() for code in column[p]}
+            ]
+        return list(matches)
+
+    # snapshots
+
+    def sections(self) -> dict:
+        """The arrays by name, to write a snapshot of."""
+        strings, appended = self.strings, []
+        if isinstance(strings, AppendedStrings):
+            strings, appended = strings.base, strings.tail
+        if not isinstance(strings, StringTable):
+            strings = StringTable.of(strings)
+        if appended:
+            strings = strings.extended(appended)
+        sections = {
+            "strings.offsets": strings.offsets,
+            "strings.data": strings.data,
+            "strings.sorted": array("q", [self.sorted_strings]),
+            "node_ids": self.node_ids,
+            "node_types": self.node_types,
+            "edge_sources": self.edge_sources,
+            "edge_targets": self.edge_targets,
+            "edge_types": self.edge_types,
+            "out_offsets": self.out_offsets,
+            "out_edges": self.out_edges,
+            "in_offsets": self.in_offsets,
+            "in_edges": self.in_edges,
+        }
+        for prefix, columns in (("node", self.node_props), ("edge", self.edge_props)):
+            for name, column in columns.items():
+                if isinstance(column, Lists):
+                    sections[f"{prefix}.{name}.offsets"] = column.offsets
+                    sections[f"{prefix}.{name}.codes"] = column.codes
+                else:
+                    sections[f"{prefix}.{name}"] = column
+        return sections
+
+    @classmethod
+    def from_sections(cls, sections: dict) -> "GraphArrays":
+        """The arrays of a snapshot, without copying them."""
+
+        def columns(prefix: str) -> dict:
+            return {
+                name: (
+                    Lists(
+                        sections[f"{prefix}.{name}.offsets"],
+                        sections[f"{prefix}.{name}.codes"],
+                    )
+                    if name in LIST_PROPERTIES
+                    else sections[f"{prefix}.{name}"]
+                )
+                for name in PROPERTIES
+            }
+
+        strings = StringTable(sections["strings.offsets"], sections["strings.data"])
+        count = sections["strings.sorted"][0]
+        if count < len(strings):
+            strings = AppendedStrings(
+                StringTable(strings.offsets[: count + 1], strings.data),
+                [strings[i] for i in range(count, len(strings))],
+            )
+        return cls(
+            strings,
+            sections["node_ids"],
+            sections["node_types"],
+            columns("node"),
+            sections["edge_sources"],
+            sections["edge_targets"],
+            sections["edge_types"],
+            columns("edge"),
+            csr=tuple(
+                sections[name]
+                for name in ("out_offsets", "out_edges", "in_offsets", "in_edges")
+            ),
+        )
+
+
+class _Appender:
+    """Copies of the arrays of `arrays`, to change as GraphArrays.apply does."""
+
+    def __init__(self, arrays: GraphArrays):
+        self.base = arrays
+        self.node_ids = _copy(arrays.node_ids, "q")
+        self.node_types = _copy(arrays.node_types, "i")
+        self.node_props = _copy_columns(arrays.node_props)
+        self.edge_sources = _copy(arrays.edge_sources, "i")
+        self.edge_targets = _copy(arrays.edge_targets, "i")
+        self.edge_types = _copy(arrays.edge_types, "i")
+        self.edge_props = _copy_columns(arrays.edge_props)
+        self.strings: list[str] = []  # new ones
+        self.codes: dict[str, int] = {}
+        self.positions: dict[NodeId, int] = {}  # of the nodes appended
+
+    def code(self, value) -> int:
+        if value is None:
+            return _NONE
+        value = value.value if isinstance(value, Enum) else str(value)
+        code = self.base.code(value)
+        if code is None:
+            code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.base.strings) + len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def position(self, node_id: NodeId) -> int | None:
+        p = self.positions.get(node_id)
+        if p is None:
+            p = self.base.position.get(node_id)
+        if p is None or self.node_types[p] == _NONE:
+            return None
+        return p
+
+    def _add_props(self, columns: dict, payload: dict) -> None:
+        for name, column in columns.items():
+            if isinstance(column, Lists):
+                column.codes.extend(self.code(v) for v in payload.get(name) or ())
+                column.offsets.append(len(column.codes))
+            else:
+                column.append(self.code(payload.get(name)))
+
+    def add_node(self, payload: dict) -> None:
+        self.positions[payload["node_id"]] = len(self.node_ids)
+        self.node_ids.append(payload["node_id"])
+        self.node_types.append(self.code(payload["node_type"]))
+        self._add_props(self.node_props, payload)
+
+    def add_edge(self, payload: dict) -> None:
+        source = self.position(payload["source"])
+        target = self.position(payload["target"])
+        if source is None or target is None:
+            return  # dangling, as in GraphArrays.build
+        self.edge_sources.append(source)
+        self.edge_targets.append(target)
+        self.edge_types.append(self.code(payload["edge_type"]))
+        self._add_props(self.edge_props, payload)
+
+    def arrays(self) -> GraphArrays:
+        strings = self.base.strings
+        if self.strings:
+            if isinstance(strings, AppendedStrings):
+                strings = AppendedStrings(strings.base, strings.tail + self.strings)
+            else:
+                strings = AppendedStrings(strings, self.strings)
+        base = self.base
+        return GraphArrays(
+            strings,
+            self.node_ids,
+            self.node_types,
+            self.node_props,
+            self.edge_sources,
+            self.edge_targets,
+            self.edge_types,
+            self.edge_props,
+            csr=(base.out_offsets, base.out_edges, base.in_offsets, base.in_edges),
+        )
+
+
+def _position(arrays: GraphArrays, node_id: NodeId) -> int:
+    p = arrays.position.get(node_id)
+    if p is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return p
+
+
+class MemoryGraphDB(GraphDatabaseInterface):
+    """
+    The graph held by this worker, see module doc. Writes made through it
+    change this copy only; the history remains the source of truth.
+    """
+
+    _LATEST = {
+        "node": """
+            SELECT DISTINCT ON (node_id) node_id AS key, state, payload
+              FROM {table}
+             WHERE entity_type = 'node' {where}
+             ORDER BY node_id, timestamp DESC, event_id DESC
+            """,
+        "edge": """
+            SELECT DISTINCT ON (source_id, target_id)
+                   source_id, target_id, state, payload
+              FROM {table}
+             WHERE entity_type = 'edge' {where}
+             ORDER BY source_id, target_id, timestamp DESC, event_id DESC
+            """,
+    }
+
+    def __init__(
+        self,
+        database_url: str | None = None,
+        refresh_seconds: float = 1,
+        snapshot_dir: str | None = None,
+    ):
+        super().__init__()
+        self.database_url = database_url
+        self.refresh_seconds = refresh_seconds
+        self.snapshots = SnapshotStore(snapshot_dir) if snapshot_dir else None
+        self._generation = 0
+        self._arrays = GraphArrays.empty()
+        self._lock = threading.Lock()  # serialises builds
+        self._first_event: int | None = None
+        self._last_event = 0
+        self._gaps: dict[int, float] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def arrays(self) -> GraphArrays:
+        return self._arrays
+
+    def _engine(self) -> Engine:
+        return get_engine(self.database_url)
+
+    def _latest(self, session: Session, kind: str, where: str = "", **params):
+        stmt = text(
+            self._LATEST[kind].format(
+                table=GraphHistoryEvent.__tablename__, where=where
+            )
+        )
+        for row in session.exec(stmt, params=params):
+            alive = row.state != EntityState.deleted.name and row.payload
+            if kind == "node":
+                key = row.key
+                payload = {**row.payload, "node_id": key} if alive else None
+            else:
+                key = (row.source_id, row.target_id)
+                payload = (
+                    {**row.payload, "source": key[0], "target": key[1]}
+                    if alive
+                    else None
+                )
+            yield key, payload
+
+    def _note_gaps(self, seen: Iterable[int], upto: int) -> None:
+        now = time.time()  # kept in snapshots, read by other processes
+        missing = set(range(self._last_event + 1, upto)) - set(seen)
+        for event_id in missing:
+            self._gaps.setdefault(event_id, now)
+        for event_id in [e for e in self._gaps if e in seen]:
+            del self._gaps[event_id]
+        for event_id in [e for e, t in self._gaps.items() if now - t > _GAP_SECONDS]:
+            del self._gaps[event_id]
+
+    def _load_history(self) -> None:
+        with self._lock, Session(self._engine()) as session:
+            first, last = session.exec(
+                text(
+                    "SELECT min(event_id), max(event_id) "
+                    f"FROM {GraphHistoryEvent.__tablename__}"
+                )
+            ).one()
+            nodes = [p for _, p in self._latest(session, "node") if p is not None]
+            edges = [p for _, p in self._latest(session, "edge") if p is not None]
+            self._arrays = GraphArrays.build(nodes, edges)
+            self._first_event, self._last_event = first, last or 0
+            self._gaps.clear()
+        self.logger.info(
+            f"Loaded {len(nodes)} nodes and {len(edges)} edges up to event {last}"
+        )
+
+    def _follow(self) -> bool:
+        """Map the latest snapshot, if newer than ours; return whether one exists."""
+        generation = self.snapshots.generation()
+        if not generation:
+            return False
+        if generation == self._generation:
+            return True
+        sections, meta = self.snapshots.read(generation)
+        if meta["properties"] != list(PROPERTIES):
+            raise ValueError("The graph snapshot was written for other properties")
+        with self._lock:
+            self._arrays = GraphArrays.from_sections(sections)
+            self._first_event, self._last_event = (
+                meta["first_event"],
+                meta["last_event"],
+            )
+            self._gaps = {int(e): t for e, t in meta["gaps"].items()}
+            self._generation = generation
+        return True
+
+    def _publish(self) -> None:
+        """Write our graph as the next snapshot, and map it."""
+        with self._lock:
+            sections = self._arrays.sections()
+            meta = {
+                "first_event": self._first_event,
+                "last_event": self._last_event,
+                "gaps": self._gaps,
+                "properties": list(PROPERTIES),
+            }
+        generation = self.snapshots.write(sections, meta)
+        self.logger.info(f"Published graph snapshot {generation}")
+        self._follow()
+
+    def load(self) -> None:
+        """
+        Load the whole graph: from the latest snapshot if there is one, else
+        from the history, publishing it as the first snapshot.
+        """
+        if self.snapshots is None:
+            self._load_history()
+            return
+        with self.snapshots.lock() as writing:
+            if self._follow():
+                return
+            self._load_history()
+            if writing:
+                self._publish()
+
+    def _changes(self, session: Session) -> tuple[list, dict, dict]:
+        """The events since the last refresh, and the latest states they set."""
+        rows = session.exec(
+            text(
+                "SELECT event_id, entity_type, node_id, source_id, target_id "
+                f"FROM {GraphHistoryEvent.__tablename__} "
+                "WHERE event_id > :last OR event_id = ANY(CAST(:gaps AS BIGINT[]))"
+            ),
+            params={"last": self._last_event, "gaps": list(self._gaps)},
+        ).all()
+        node_ids = {r.node_id for r in rows if r.entity_type == "node"}
+        edge_keys = {
+            (r.source_id, r.target_id) for r in rows if r.entity_type == "edge"
+        }
+        # keys whose events are all gone no longer exist
+        nodes = dict.fromkeys(node_ids)
+        edges = dict.fromkeys(edge_keys)
+        if node_ids:
+            where = "AND node_id = ANY(CAST(:ids AS BIGINT[]))"
+            nodes.update(self._latest(session, "node", where, ids=list(node_ids)))
+        if edge_keys:
+            where = (
+                "AND (source_id, target_id) IN (SELECT * FROM unnest("
+                "CAST(:sources AS BIGINT[]), CAST(:targets AS BIGINT[])))"
+            )
+            sources = [s for s, _ in edge_keys]
+            targets = [t for _, t in edge_keys]
+            edges.update(
+                self._latest(session, "edge", where, sources=sources, targets=targets)
+            )
+        return rows, nodes, edges
+
+    def _catch_up(self) -> int:
+        """Apply the events logged since the last refresh; return how many."""
+        with Session(self._engine()) as session:
+            first = session.exec(
+                text(f"SELECT min(event_id) FROM {GraphHistoryEvent.__tablename__}")
+            ).scalar()
+            if first == self._first_event:
+                rows, nodes, edges = self._changes(session)
+        if first != self._first_event:  # not loaded yet, or history reset
+            self._load_history()
+            return len(self._arrays) or 1
+        if not rows:
+            self._note_gaps([], self._last_event + 1)  # expires old gaps
+            return 0
+        with self._lock:
+            self._arrays = self._arrays.apply(nodes, edges)
+            last = max(r.event_id for r in rows)
+            self._note_gaps([r.event_id for r in rows], last)
+            self._last_event = max(self._last_event, last)
+        return len(rows)
+
+    def refresh(self) -> int:
+        """
+        Bring the graph up to date; return how many events were applied. With
+        snapshots, the worker holding the lock applies them and publishes the
+        result, the others swap to the latest snapshot.
+        """
+        if self.snapshots is None:
+            return self._catch_up()
+        with self.snapshots.lock() as writing:
+            self._follow()
+            if not writing:
+                return 0
+            applied = self._catch_up()
+            if applied:
+                self._publish()
+            return applied
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"In-memory graph refresh failed: {e}")
+
+    def start(self) -> None:
+        """Load the graph, then keep it current from a background thread."""
+        self.load()
+        self._thread = threading.Thread(
+            target=self._loop, name="memory-graph", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _apply(self, nodes: dict | None = None, edges: dict | None = None) -> None:
+        with self._lock:
+            self._arrays = self._arrays.apply(nodes or {}, edges or {})
+
+    def _find(
+        self,
+        arrays: GraphArrays,
+        source_id: NodeId | None = None,
+        target_id: NodeId | None = None,
+        edge_type: str | None = None,
+    ) -> list[int]:
+        if source_id is not None:
+            p = arrays.position.get(source_id)
+            if p is None:
+                return []
+            found = arrays.out_of(p)
+        elif target_id is not None:
+            p = arrays.position.get(target_id)
+            if p is None:
+                return []
+            found = arrays.in_of(p)
+        else:
+            found = arrays.edge_indexes()
+        if target_id is not None:
+            q = arrays.position.get(target_id)
+            found = [e for e in found if arrays.edge_targets[e] == q]
+        if edge_type is not None:
+            code = arrays.code(edge_type)
+            found = [e for e in found if arrays.edge_types[e] == code]
+        return list(found)
+
+    # reads
+
+    def get_whole_graph(self) -> SubgraphBase:
+        arrays = self._arrays
+        return arrays.subgraph(list(arrays.positions()), list(arrays.edge_indexes()))
+
+    def get_graph_summary(self) -> dict:
+        arrays = self._arrays
+        return {"nodes": len(arrays), "edges": arrays.edge_count()}
+
+    def get_generation(self) -> int | None:
+        # the last event applied, once all those below it are: not while the
+        # graph is not loaded yet, or while events missing below may still come
+        if self._first_event is None or self._gaps:
+            return None
+        return self._last_event
+
+    def get_induced_subgraph(
+        self, node_id: NodeId, levels: int, max_degree: int | None = None
+    ) -> SubgraphBase:
+        arrays = self._arrays
+        start = _position(arrays, node_id)
+        positions = arrays.expand([start], levels, max_degree)
+        return arrays.subgraph(positions, arrays.edges_among(positions))
+
+    def search_nodes(
+        self,
+        node_type: list[str] | str | None = None,
+        title: str | None = None,
+        scope: str | None = None,
+        status: list[NodeStatus] | NodeStatus | None = None,
+        tags: list[str] | None = None,
+        description: str | None = None,
+    ) -> list[NodeBase]:
+        arrays = self._arrays
+        found = arrays.search(node_type, title, scope, status, tags, description)
+        return [arrays.node(p) for p in found]
+
+    def get_search_subgraph(
+        self,
+        node_type: list[str] | str | None = None,
+        title: str | None = None,
+        scope: str | None = None,
+        status: list[NodeStatus] | NodeStatus | None = None,
+        tags: list[str] | None = None,
+        description: str | None = None,
+        levels: int = 1,
+        max_elements: int | None = None,
+    ) -> SubgraphBase:
+        """
+        Nodes matching the search criteria, those up to `levels` hops away,
+        and the edges among them; at most `max_elements` nodes and edges,
+        nodes in BFS order first.
+        """
+        arrays = self._arrays
+        found = arrays.search(node_type, title, scope, status, tags, description)
+        positions = arrays.expand(found, levels, max_nodes=max_elements)
+        edges = arrays.edges_among(positions)
+        if max_elements is not None:
+            edges = edges[: max_elements - len(positions)]
+        return arrays.subgraph(positions, edges)
+
+    def get_random_node(self, node_type: str = None) -> NodeBase:
+        arrays = self._arrays
+        positions = arrays.positions()
+        if node_type is not None:
+            code = arrays.code(node_type)
+            positions = [p for p in positions if arrays.node_types[p] == code]
+        if not positions:
+            raise HTTPException(
+                status_code=404, detail="No node found matching criteria"
+            )
+        return arrays.node(random.choice(positions))
+
+    def get_node(self, node_id: NodeId) -> NodeBase:
+        arrays = self._arrays
+        return arrays.node(_position(arrays, node_id))
+
+    def get_edge_list(self) -> list[EdgeBase]:
+        arrays = self._arrays
+        return [arrays.edge(e) for e in arrays.edge_indexes()]
+
+    def get_edge(self, source_id: NodeId, target_id: NodeId) -> EdgeBase:
+        arrays = self._arrays
+        found = self._find(arrays, source_id, target_id)
+        if not found:
+            raise HTTPException(status_code=404, detail="Edge not found")
+        return arrays.edge(found[0])
+
+    def find_edges(
+        self,
+        source_id: NodeId = None,
+        target_id: NodeId = None,
+        edge_type: str = None,
+    ) -> list[EdgeBase]:
+        arrays = self._arrays
+        return [
+            arrays.edge(e) for e in self._find(arrays, source_id, target_id, edge_type)
+        ]
+
+    # writes, to this copy only
+
+    def reset_whole_graph(self) -> None:
+        with self._lock:
+            self._arrays = GraphArrays.empty()
+
+    def update_graph(self, subgraph: SubgraphBase) -> SubgraphBase:
+        self._apply(
+            {node.node_id: node.model_dump() for node in subgraph.nodes},
+            {(edge.source, edge.target): edge.model_dump() for edge in subgraph.edges},
+        )
+        return subgraph
+
+    def create_node(self, node: NodeBase) -> NodeBase:
+        if node.node_id is None:
+            raise HTTPException(
+                status_code=400, detail="The history allocates node IDs"
+            )
+        self._apply({node.node_id: node.model_dump()})
+        return node
+
+    def delete_node(self, node_id: NodeId) -> None:
+        _position(self._arrays, node_id)
+        self._apply({node_id: None})
+
+    def update_node(self, node: NodeBase) -> NodeBase:
+        _position(self._arrays, node.node_id)
+        self._apply({node.node_id: node.model_dump()})
+        return node
+
+    def create_edge(self, edge: EdgeBase) -> EdgeBase:
+        arrays = self._arrays
+        _position(arrays, edge.source)
+        _position(arrays, edge.target)
+        self._apply(edges={(edge.source, edge.target): edge.model_dump()})
+        return edge
+
+    def delete_edge(
+        self, source_id: NodeId, target_id: NodeId, edge_type: str = None
+    ) -> None:
+        self._apply(edges={(source_id, target_id): None})
+
+    def update_edge(self, edge: EdgeBase) -> EdgeBase:
+        self.get_edge(edge.source, edge.target)
+        self._apply(edges={(edge.source, edge.target): edge.model_dump()})
+        return edge
@@ -0,0 +1,453 @@
+"""
+Transactional outbox towards the graph database.
+
+With ENABLE_GRAPH_DB, write endpoints do not call JanusGraph themselves: they
+`enqueue_graph_change` within their unit of work, so that the call commits or
+rolls back with the history events it mirrors. A dispatcher thread per worker
+then applies pending calls in order, GRAPH_OUTBOX_BATCH_SIZE at a time, and a
+PostgreSQL advisory lock lets a single worker dispatch at once. Every call is
+applied as an upsert, so applying it twice, e.g. when a batch is retried, is
+harmless.
+
+Outbox IDs are drawn when a call is added, not when it commits. So that the
+calls on an element are dispatched in the order they committed, adding one
+takes transaction-level advisory locks on the elements it changes, held
+until its unit of work ends: a later call on the same element waits for that
+commit before drawing its ID. Calls on other elements may commit out of ID
+order, which is harmless as each sets the full state of its own elements;
+resetting the graph locks them all.
+
+A call failing on a connection error is retried with exponential backoff,
+holding back the later calls on any of its elements (all of them after a
+reset), and given up on after GRAPH_OUTBOX_MAX_ATTEMPTS. One the graph
+database rejects (HTTPException), or whose payload is invalid (a validation,
+value, key or type error), is given up on at once, as retrying it would only
+fail again. Given-up calls keep their error in `last_error`.
+
+Node creations remain synchronous, as JanusGraph allocates the node IDs that
+the history reuses.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from backend.db.base import GraphDatabaseInterface
+from backend.db.config import get_engine
+from backend.models.dynamic import (
+    DynamicEdgeAdapter,
+    DynamicNodeAdapter,
+    DynamicSubgraph,
+)
+from backend.models.fixed import GraphOutbox
+from backend.settings import settings
+from backend.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_xact_lock key held while dispatching a batch
+_LOCK_KEY = 0x6F7574626F78
+# held shared by every call being added, exclusive by those changing everything
+_GRAPH_LOCK_KEY = 0x6F7574626F79
+_MAX_BACKOFF_SECONDS = 300
+_WAIT_POLL_SECONDS = 0.05
+# failures that retrying a call cannot fix
+_INVALID_CALL = (ValidationError, ValueError, KeyError, TypeError)
+
+_PENDING = text(
+    """
+    SELECT count(*), min(created_at)
+    FROM graphoutbox
+    WHERE dispatched_at IS NULL AND failed_at IS NULL
+    """
+)
+
+
+def _utcnow() -> datetime.datetime:
+    """Timestamps are stored without time zone, in UTC."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _node(payload: dict):
+    return DynamicNodeAdapter.validate_python(payload)
+
+
+def _edge(payload: dict):
+    return DynamicEdgeAdapter.validate_python(payload)
+
+
+def _update_node(graph: GraphDatabaseInterface, node: dict) -> None:
+    graph.update_node(_node(node))
+
+
+def _delete_node(graph: GraphDatabaseInterface, node_id: int) -> None:
+    try:
+        graph.delete_node(node_id)
+    except HTTPException as e:
+        if e.status_code != 404:  # otherwise already deleted
+            raise
+
+
+def _upsert_edge(graph: GraphDatabaseInterface, edge: dict) -> None:
+    edge = _edge(edge)
+    try:
+        graph.update_edge(edge)
+    except HTTPException as e:
+        if e.status_code != 404:
+            raise
+        graph.create_edge(edge)
+
+
+def _delete_edge(
+    graph: GraphDatabaseInterface,
+    source_id: int,
+    target_id: int,
+    edge_type: str | None = None,
+) -> None:
+    graph.delete_edge(source_id, target_id, edge_type)
+
+
+def _update_graph(graph: GraphDatabaseInterface, subgraph: dict) -> None:
+    graph.update_graph(DynamicSubgraph(**subgraph))
+
+
+def _reset_whole_graph(graph: GraphDatabaseInterface) -> None:
+    graph.reset_whole_graph()
+
+
+OPERATIONS: dict[str, Callable[..., None]] = {
+    "update_node": _update_node,
+    "delete_node": _delete_node,
+    "create_edge": _upsert_edge,
+    "update_edge": _upsert_edge,
+    "delete_edge": _delete_edge,
+    "update_graph": _update_graph,
+    "reset_whole_graph": _reset_whole_graph,
+}
+
+
+def apply(graph: GraphDatabaseInterface, operation: str, payload: dict) -> None:
+    """Apply one outbox call to `graph`."""
+    OPERATIONS[operation](graph, **payload)
+
+
+def _node_keys(node_id) -> list[str]:
+    return [f"node:{node_id}"] if node_id is not None else []
+
+
+def _edge_keys(source_id, target_id) -> list[str]:
+    # and its ends, as deleting a node deletes its edges
+    return [
+        f"edge:{source_id}:{target_id}",
+        *_node_keys(source_id),
+        *_node_keys(target_id),
+    ]
+
+
+def element_keys(operation: str, payload: dict) -> list[str] | None:
+    """The elements a call changes, None for all of them."""
+    if operation == "reset_whole_graph":
+        return None
+    if operation == "update_node":
+        return _node_keys(payload["node"].get("node_id"))
+    if operation == "delete_node":
+        return _node_keys(payload["node_id"])
+    if operation in ("create_edge", "update_edge"):
+        return _edge_keys(payload["edge"]["source"], payload["edge"]["target"])
+    if operation == "delete_edge":
+        return _edge_keys(payload["source_id"], payload["target_id"])
+    subgraph = payload["subgraph"]
+    keys = [k for node in subgraph["nodes"] for k in _node_keys(node.get("node_id"))]
+    for edge in subgraph["edges"]:
+        keys += _edge_keys(edge["source"], edge["target"])
+    return keys
+
+
+def _lock_id(key: str) -> int:
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big", signed=True)
+
+
+def _lock_elements(operation: str, payload: dict, session: Session) -> None:
+    """Take the locks of the elements a call changes, until `session` ends."""
+    keys = element_keys(operation, payload)
+    if keys is None:
+        session.exec(
+            text("SELECT pg_advisory_xact_lock(:key)"),
+            params={"key": _GRAPH_LOCK_KEY},
+        )
+        return
+    session.exec(
+        text("SELECT pg_advisory_xact_lock_shared(:key)"),
+        params={"key": _GRAPH_LOCK_KEY},
+    )
+    # in a single order, so that no two transactions deadlock
+    for lock_id in sorted({_lock_id(key) for key in keys}):
+        session.exec(
+            text("SELECT pg_advisory_xact_lock(:key)"), params={"key": lock_id}
+        )
+
+
+def add_to_outbox(operation: str, payload: dict, session: Session) -> int:
+    """Add a call to the outbox within `session`; return its ID."""
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown graph operation: {operation}")
+    payload = jsonable_encoder(payload)
+    _lock_elements(operation, payload, session)
+    row = GraphOutbox(operation=operation, payload=payload)
+    session.add(row)
+    session.flush()
+    return row.outbox_id
+
+
+async def enqueue_graph_change(
+    uow: Session | AsyncSession, operation: str, **payload
+) -> int | None:
+    """
+    Add the call `operation(**payload)` of the graph database to the outbox,
+    within the unit of work `uow`; return its ID, or None without graph database.
+    """
+    if not settings.ENABLE_GRAPH_DB:
+        return None
+    if isinstance(uow, AsyncSession):
+        return await uow.run_sync(
+            lambda session: add_to_outbox(operation, payload, session)
+        )
+    return await run_in_threadpool(add_to_outbox, operation, payload, uow)
+
+
+def backoff(attempts: int, interval: float) -> float:
+    """Seconds to wait before the next attempt, after `attempts` failed ones."""
+    return min(interval * 2**attempts, _MAX_BACKOFF_SECONDS)
+
+
+class OutboxDispatcher:
+    """Applies the outbox to the graph database, from a background thread."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        graph: GraphDatabaseInterface,
+        batch_size: int = 100,
+        interval: float = 1,
+        max_attempts: int = 10,
+        retention_days: int = 7,
+    ):
+        self.engine = engine
+        self.graph = graph
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.retention = datetime.timedelta(days=retention_days)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_prune = 0.0
+
+    def _attempt(self, row: GraphOutbox, now: datetime.datetime) -> bool:
+        """Apply `row`; return whether the calls after it may be applied."""
+        try:
+            with metrics.timer("graph_outbox.apply_seconds"):
+                apply(self.graph, row.operation, row.payload)
+        except HTTPException as e:
+            logger.error(f"Graph rejected outbox call {row.outbox_id}: {e.detail}")
+            row.last_error = str(e.detail)
+            row.failed_at = now
+            metrics.inc("graph_outbox.failed")
+            return True
+        except _INVALID_CALL as e:
+            logger.error(f"Invalid outbox call {row.outbox_id}: {e!r}")
+            row.last_error = repr(e)
+            row.failed_at = now
+            metrics.inc("graph_outbox.failed")
+            return True
+        except Exception as e:
+            row.attempts += 1
+            row.last_error = repr(e)
+            if row.attempts >= self.max_attempts:
+                logger.error(f"Giving up on outbox call {row.outbox_id}: {e!r}")
+                row.failed_at = now
+                metrics.inc("graph_outbox.failed")
+                return True
+            delay = backoff(row.attempts, self.interval)
+            logger.warning(
+                f"Outbox call {row.outbox_id} failed, retrying in {delay:.0f}s: {e!r}"
+            )
+            row.next_attempt_at = now + datetime.timedelta(seconds=delay)
+            metrics.inc("graph_outbox.retried")
+            return False
+        row.dispatched_at = now
+        metrics.inc("graph_outbox.dispatched")
+        return True
+
+    def dispatch(self) -> int:
+        """
+        Apply the next batch of pending calls, unless another worker is
+        dispatching; return the number of calls settled.
+        """
+        with Session(self.engine) as session:
+            locked = session.exec(
+                text("SELECT pg_try_advisory_xact_lock(:key)"),
+                params={"key": _LOCK_KEY},
+            ).scalar()
+            if not locked:
+                return 0
+            rows = session.exec(
+                select(GraphOutbox)
+                .where(
+                    GraphOutbox.dispatched_at.is_(None),
+                    GraphOutbox.failed_at.is_(None),
+                )
+                .order_by(GraphOutbox.outbox_id)
+                .limit(self.batch_size)
+            ).all()
+            settled = self._settle(rows, _utcnow())
+            session.commit()
+            self._report(session)
+        return settled
+
+    def _settle(self, rows: list[GraphOutbox], now: datetime.datetime) -> int:
+        """
+        Attempt `rows` in order, but those changing an element of a call held
+        back before them; return the number of calls settled.
+        """
+        settled = 0
+        held: set[str] = set()
+        hold_all = False
+        for row in rows:
+            try:
+                keys = element_keys(row.operation, row.payload)
+            except _INVALID_CALL:
+                keys = []  # to be given up on, holding nothing back
+            if hold_all or (held and (keys is None or held.intersection(keys))):
+                go_on = False
+            elif row.next_attempt_at is not None and row.next_attempt_at > now:
+                go_on = False
+            else:
+                go_on = self._attempt(row, now)
+            if go_on:
+                settled += 1
+            elif keys is None:
+                hold_all = True
+            else:
+                held.update(keys)
+        return settled
+
+    def _report(self, session: Session) -> None:
+        pending, oldest = session.exec(_PENDING).one()
+        lag = (_utcnow() - oldest).total_seconds() if oldest is not None else 0
+        metrics.set_gauge("graph_outbox.pending", pending)
+        metrics.set_gauge("graph_outbox.lag_seconds", max(lag, 0))
+
+    def prune(self) -> int:
+        """Drop the calls dispatched more than `retention` ago; return how many."""
+        with Session(self.engine) as session:
+            result = session.exec(
+                text("DELETE FROM graphoutbox WHERE dispatched_at < :cutoff"),
+                params={"cutoff": _utcnow() - self.retention},
+            )
+            session.commit()
+            return result.rowcount
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                settled = self.dispatch()
+                if time.monotonic() - self._last_prune > 3600:
+                    self._last_prune = time.monotonic()
+                    self.prune()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+                settled = 0
+            if settled < self.batch_size:  # caught up, or backing off
+                self._wake.wait(self.interval)
+
+    def wake(self) -> None:
+        """Dispatch now rather than at the next poll."""
+        self._wake.set()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._loop, name="graph-outbox", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+
+_dispatcher: OutboxDispatcher | None = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_dispatcher(graph: GraphDatabaseInterface) -> OutboxDispatcher:
+    """Start the outbox dispatcher of this worker, once."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = OutboxDispatcher(
+                get_engine(settings.POSTGRES_DB_URL),
+                graph,
+                batch_size=settings.GRAPH_OUTBOX_BATCH_SIZE,
+                interval=settings.GRAPH_OUTBOX_POLL_SECONDS,
+                max_attempts=settings.GRAPH_OUTBOX_MAX_ATTEMPTS,
+                retention_days=settings.GRAPH_OUTBOX_RETENTION_DAYS,
+            )
+            _dispatcher.start()
+    return _dispatcher
+
+
+def stop_dispatcher() -> None:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop()
+            _dispatcher = None
+
+
+def _dispatched(engine: Engine, outbox_id: int) -> bool:
+    with Session(engine) as session:
+        return bool(
+            session.exec(
+                text(
+                    "SELECT dispatched_at IS NOT NULL FROM graphoutbox "
+                    "WHERE outbox_id = :id"
+                ),
+                params={"id": outbox_id},
+            ).scalar()
+        )
+
+
+async def wait_for_graph(outbox_id: int | None) -> bool:
+    """
+    Wait up to GRAPH_OUTBOX_WAIT_SECONDS for a committed call to reach the
+    graph database, so that the client reads its write back from there;
+    return whether it did.
+    """
+    timeout = settings.GRAPH_OUTBOX_WAIT_SECONDS
+    if outbox_id is None or timeout <= 0:
+        return False
+    if _dispatcher is not None:
+        _dispatcher.wake()
+    engine = get_engine(settings.POSTGRES_DB_URL)
+    deadline = time.monotonic() + timeout
+    while not await run_in_threadpool(_dispatched, engine, outbox_id):
+        if time.monotonic() >= deadline:
+            metrics.inc("graph_outbox.wait_timeouts")
+            return False
+        await asyncio.sleep(_WAIT_POLL_SECONDS)
+    return True
@@ -1,10 +1,17 @@
-from typing import List
+from contextlib import contextmanager
+from typing import Iterator, List
+from itertools import groupby
+import copy
+import datetime
+import hashlib
+import inspect
 import random
 import logging
+import statistics
 
 from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlmodel import SQLModel, Session, select
 from fastapi import HTTPException, Query
 
@@ -23,23 +30,253 @@ from backend.models.fixed import (
     User,
     UserRead,
     UserCreate,
+    GraphGeneration,
     GraphHistoryEvent,
     EntityType,
     EntityState,
     RatingEvent,
+    RatingAggregate,
+    RatingRollup,
+    RollupBucket,
 )
 from backend.properties import NodeStatus
-from backend.models.dynamic import NodeTypeModels, EdgeTypeModels, DynamicSubgraph
+from backend.models.dynamic import (
+    NodeTypeModels,
+    EdgeTypeModels,
+    DynamicSubgraph,
+    construct_edge,
+    construct_node,
+)
 from backend.utils.security import hash_password
+from backend.utils.cache import LRUCache
 from backend.db.config import get_engine
+from backend.db.routing import pinned, read_only, replica_url, replicas, routed
 from backend.settings import settings
+from backend.config import POLLS_CFG, AggregationMethod
 
 # logger in debug mode
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# SQL expression computing a poll's configured aggregate over `rating`
+_AGGREGATION_SQL = {
+    AggregationMethod.MEDIAN: "percentile_cont(0.5) WITHIN GROUP (ORDER BY rating)",
+    AggregationMethod.MEAN: "avg(rating)",
+    AggregationMethod.COUNT: "count(*)",
+}
+
+# the same aggregates in Python, for rollups rebuilt from a stream of events
+_AGGREGATION_PY = {
+    AggregationMethod.MEDIAN: statistics.median,
+    AggregationMethod.MEAN: statistics.fmean,
+    AggregationMethod.COUNT: len,
+}
+
+_ROLLUP_STEP = {
+    RollupBucket.hour: datetime.timedelta(hours=1),
+    RollupBucket.day: datetime.timedelta(days=1),
+}
+# most points a timeline returns, e.g. about 27 years of days
+_MAX_TIMELINE_POINTS = 10_000
+
+# leaderboards are keyed by poll_label first, see log_rating for invalidation;
+# reads pinned to the primary skip it, see get_top_rated
+_leaderboard_cache = LRUCache(maxsize=256, ttl=60)
+
+
+# matches edges against two parallel id arrays, which both psycopg2 and
+# asyncpg bind natively, unlike a tuple of tuples
+_PAIRS_FILTER = (
+    "(source_id, target_id) IN ("
+    "SELECT * FROM unnest(CAST(:sids AS INTEGER[]), CAST(:tids AS INTEGER[])))"
+)
+
+
+def _pairs_params(edges) -> dict:
+    return {"sids": [s for s, _ in edges], "tids": [t for _, t in edges]}
+
+
+def _aggregation_method(poll_label: str) -> AggregationMethod:
+    method = POLLS_CFG.get(poll_label, {}).get("aggregation")
+    return AggregationMethod(method or AggregationMethod.MEDIAN)
+
+
+def _aggregation_sql(poll_label: str) -> str:
+    return _AGGREGATION_SQL[_aggregation_method(poll_label)]
+
+
+def _entity_filter(rating: RatingEvent) -> tuple[str, str]:
+    """Return the SQL filter matching `rating`'s entity, and its entity_key."""
+    if rating.entity_type == EntityType.node:
+        return "node_id = :nid", str(rating.node_id)
+    return (
+        "source_id = :sid AND target_id = :tid",
+        f"{rating.source_id}-{rating.target_id}",
+    )
+
+
+def _aggregate_lock_id(rating: RatingEvent) -> int:
+    """The advisory lock of the aggregates of `rating`'s entity and poll."""
+    _, entity_key = _entity_filter(rating)
+    key = f"rating:{rating.poll_label}:{rating.entity_type.value}:{entity_key}"
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big", signed=True)
+
+
+def _utc_naive(timestamp: datetime.datetime) -> datetime.datetime:
+    """Timestamps are stored without time zone, in UTC."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _utcnow() -> datetime.datetime:
+    return _utc_naive(datetime.datetime.now(datetime.timezone.utc))
+
+
+def _hourly_cutoff() -> datetime.datetime:
+    """Hourly rollups starting before this are dropped, see prune_rating_rollups."""
+    retention = datetime.timedelta(days=settings.RATING_ROLLUP_HOURLY_RETENTION_DAYS)
+    return _bucket_start(_utcnow() - retention, RollupBucket.hour)
+
+
+def _bucket_start(
+    timestamp: datetime.datetime, bucket: RollupBucket
+) -> datetime.datetime:
+    timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+    if bucket == RollupBucket.day:
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def _check_timeline_span(
+    start: datetime.datetime, end: datetime.datetime, bucket: RollupBucket
+) -> None:
+    if (end - start) // _ROLLUP_STEP[bucket] >= _MAX_TIMELINE_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A timeline spans at most {_MAX_TIMELINE_POINTS} {bucket.value}s",
+        )
 
-class UserPostgreSQLDB(UserDatabaseInterface):
+
+def _rollups_from_events(
+    key: tuple, events, hourly_cutoff: datetime.datetime
+) -> Iterator[dict]:
+    """
+    Replay the time-ordered rating events of one entity and poll, yielding a
+    rollup row at the end of every bucket in which a rating was logged. Of the
+    hourly buckets before `hourly_cutoff`, only the last one is kept, as the
+    starting value of the hourly series.
+    """
+    poll_label, entity_type, node_id, source_id, target_id = key
+    aggregate = _AGGREGATION_PY[_aggregation_method(poll_label)]
+    base = {
+        "pl": poll_label,
+        "etype": EntityType(entity_type).value,
+        "key": str(node_id) if node_id is not None else f"{source_id}-{target_id}",
+        "nid": node_id,
+        "sid": source_id,
+        "tid": target_id,
+    }
+    latest: dict[str, float] = {}
+
+    def snapshot(bucket: RollupBucket, start: datetime.datetime) -> dict:
+        ratings = list(latest.values())
+        return {
+            **base,
+            "bucket": bucket.value,
+            "start": start,
+            "value": aggregate(ratings),
+            "median": statistics.median(ratings),
+            "mean": statistics.fmean(ratings),
+            "count": len(ratings),
+        }
+
+    current: dict[RollupBucket, datetime.datetime | None] = {
+        RollupBucket.day: None,
+        RollupBucket.hour: None,
+    }
+    stale_hour = None
+    for event in events:
+        timestamp = _utc_naive(event.timestamp)
+        for bucket in list(current):
+            start = _bucket_start(timestamp, bucket)
+            if current[bucket] is not None and current[bucket] != start:
+                row = snapshot(bucket, current[bucket])
+                if bucket == RollupBucket.hour and row["start"] < hourly_cutoff:
+                    stale_hour = row
+                else:
+                    if bucket == RollupBucket.hour and stale_hour is not None:
+                        yield stale_hour
+                        stale_hour = None
+                    yield row
+            current[bucket] = start
+        latest[event.username] = event.rating
+
+    for bucket, start in current.items():
+        if start is None:
+            continue
+        row = snapshot(bucket, start)
+        if bucket == RollupBucket.hour and stale_hour and row["start"] >= hourly_cutoff:
+            yield stale_hour
+        yield row
+
+
+class _UnitOfWorkMixin:
+    """
+    Lets a repository join a caller-owned session, see `with_session`.
+    Methods open sessions with `_session()` and end writes with `_commit()`;
+    when bound, these reuse the caller's session and only flush, leaving the
+    single commit of the unit of work to the caller.
+    """
+
+    _bound_session: Session | None = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # send the sessions of `read_only` methods to replicas, see db/routing.py
+        for name, value in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.isfunction(value):
+                setattr(cls, name, routed(value))
+
+    def with_session(self, session: Session):
+        """Return a copy of this repository working within `session`."""
+        bound = copy.copy(self)
+        bound._bound_session = session
+        return bound
+
+    @contextmanager
+    def _session(self):
+        if self._bound_session is not None:
+            yield self._bound_session
+            return
+        url = replica_url()
+        if url is None:
+            with Session(self.engine) as session:
+                yield session
+            return
+        try:
+            with Session(get_engine(url, create_tables=False)) as session:
+                yield session
+        except OperationalError:
+            replicas().mark_down(url)
+            raise
+
+    @classmethod
+    def within(cls, session: Session):
+        """Return a repository with no engine of its own, working within `session`."""
+        bound = cls.__new__(cls)
+        bound.logger = logging.getLogger(cls.__name__)
+        bound._bound_session = session
+        return bound
+
+    def _commit(self, session: Session) -> None:
+        if self._bound_session is None:
+            session.commit()
+        else:
+            session.flush()
+
+
+class UserPostgreSQLDB(_UnitOfWorkMixin, UserDatabaseInterface):
     def __init__(self, database_url: str):
         super().__init__()
         self.engine = get_engine(database_url)
@@ -48,8 +285,10 @@ class UserPostgreSQLDB(UserDatabaseInterface):
         )
 
     def create_user(self, user: UserCreate) -> UserRead:
-        with Session(self.engine) as session:
-            hashed_password = hash_password(user.password)
+        return self._insert_user(user, hash_password(user.password))
+
+    def _insert_user(self, user: UserCreate, hashed_password: str) -> UserRead:
+        with self._session() as session:
             db_user = User(
                 username=user.username,
                 password=hashed_password,
@@ -59,13 +298,14 @@ class UserPostgreSQLDB(UserDatabaseInterface):
                 is_active=user.is_active,
                 is_admin=user.is_admin,
             )
-            session.add(db_user)
             try:
-                session.commit()
-                session.refresh(db_user)
+                # a savepoint, not to roll back a caller's unit of work
+                with session.begin_nested():
+                    session.add(db_user)
             except IntegrityError:
-                session.rollback()
                 raise HTTPException(status_code=400, detail="User already exists")
+            self._commit(session)
+            session.refresh(db_user)
             return UserRead(
                 username=db_user.username,
                 preferences=db_user.preferences,
@@ -75,15 +315,15 @@ class UserPostgreSQLDB(UserDatabaseInterface):
             )
 
     def get_user(self, username: str) -> User | None:
-        with Session(self.engine) as session:
+        with self._session() as session:
             statement = select(User).where(User.username == username)
             result = session.exec(statement).first()
             return result
 
     def update_user(self, user: User) -> UserRead:
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(user)
-            session.commit()
+            self._commit(session)
             session.refresh(user)
             return UserRead(
                 username=user.username,
@@ -94,7 +334,7 @@ class UserPostgreSQLDB(UserDatabaseInterface):
             )
 
     def update_preferences(self, username: str, new_prefs: dict) -> UserRead:
-        with Session(self.engine) as session:
+        with self._session() as session:
             statement = select(User).where(User.username == username)
             user = session.exec(statement).first()
             if not user:
@@ -108,7 +348,7 @@ class UserPostgreSQLDB(UserDatabaseInterface):
             self.logger.info(f"New preferences to be updated: {new_prefs}")
             self.logger.info(f"Updated preferences after merge: {user.preferences}")
             session.add(user)
-            session.commit()
+            self._commit(session)
             session.refresh(user)
             self.logger.info(
                 f"Final preferences in database after commit: {user.preferences}"
@@ -126,9 +366,10 @@ class UserPostgreSQLDB(UserDatabaseInterface):
         SQLModel.metadata.drop_all(self.engine)
         SQLModel.metadata.create_all(self.engine)
 
+    @read_only
     def list_users(self) -> List[UserRead]:
         """Fetch and return all users as UserRead."""
-        with Session(self.engine) as session:
+        with self._session() as session:
             statement = select(User)
             results = session.exec(statement).all()
             return [
@@ -143,7 +384,7 @@ class UserPostgreSQLDB(UserDatabaseInterface):
             ]
 
 
-class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
+class RatingHistoryPostgreSQLDB(_UnitOfWorkMixin, RatingHistoryRelationalInterface):
     def __init__(self, database_url: str):
         super().__init__()
         self.engine = get_engine(database_url)
@@ -160,23 +401,592 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
         """
         Log a rating for a given entity and user.
         """
-        with Session(self.engine) as session:
+        with self._session() as session:
+            self._lock_aggregates(session, [rating])
             session.add(rating)
-            session.commit()
+            session.flush()
+            self._refresh_aggregate(session, rating)
+            self._commit(session)
             session.refresh(rating)
             if hasattr(self, "logger"):
                 self.logger.debug(
                     f"Logged rating by {rating.username} for {rating.entity_type}"
                 )
-            return rating
+        _leaderboard_cache.invalidate(predicate=lambda key: key[0] == rating.poll_label)
+        return rating
 
+    def log_ratings(self, ratings: list[RatingEvent]) -> list[RatingEvent]:
+        """
+        Log several ratings, and refresh the aggregates they touch, in one
+        transaction.
+        """
+        if not ratings:
+            return []
+        with self._session() as session:
+            self._lock_aggregates(session, ratings)
+            session.add_all(ratings)
+            session.flush()
+            refreshed = set()
+            for rating in ratings:
+                key = (
+                    rating.poll_label,
+                    rating.entity_type,
+                    rating.node_id,
+                    rating.source_id,
+                    rating.target_id,
+                )
+                if key not in refreshed:
+                    self._refresh_aggregate(session, rating)
+                    refreshed.add(key)
+            self._commit(session)
+            for rating in ratings:
+                session.refresh(rating)
+            self.logger.debug(f"Logged {len(ratings)} ratings in one transaction")
+        labels = {rating.poll_label for rating in ratings}
+        _leaderboard_cache.invalidate(predicate=lambda key: key[0] in labels)
+        return ratings
+
+    def _lock_aggregates(self, session: Session, ratings: list[RatingEvent]) -> None:
+        """
+        Lock the aggregates `ratings` refresh until the transaction ends. A
+        refresh reads the ratings committed when it starts: one racing another
+        of the same entity would miss the other's rating, then overwrite its
+        aggregate with a stale one. Locks are taken in a single order, so that
+        no two batches deadlock.
+        """
+        for lock_id in sorted({_aggregate_lock_id(rating) for rating in ratings}):
+            session.exec(
+                text("SELECT pg_advisory_xact_lock(:key)"), params={"key": lock_id}
+            )
+
+    def _refresh_aggregate(self, session: Session, rating: RatingEvent) -> None:
+        """
+        Recompute the aggregate of the entity and poll `rating` belongs to,
+        within the caller's transaction.
+        """
+        entity_filter, entity_key = _entity_filter(rating)
+        stmt = text(
+            f"""
+            INSERT INTO {RatingAggregate.__tablename__}
+                   (poll_label, entity_type, entity_key, node_id, source_id,
+                    target_id, value, median, mean, count, updated_at)
+            SELECT :pl, :etype, :key,
+                   CAST(:nid AS INTEGER), CAST(:sid AS INTEGER), CAST(:tid AS INTEGER),
+                   {_aggregation_sql(rating.poll_label)},
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY rating),
+                   avg(rating), count(*), now()
+              FROM (
+                SELECT DISTINCT ON (username) rating
+                  FROM {RatingEvent.__tablename__}
+                 WHERE entity_type = :etype
+                   AND poll_label = :pl
+                   AND {entity_filter}
+                 ORDER BY username, timestamp DESC
+              ) AS latest
+            ON CONFLICT (poll_label, entity_type, entity_key) DO UPDATE
+               SET value = EXCLUDED.value,
+                   median = EXCLUDED.median,
+                   mean = EXCLUDED.mean,
+                   count = EXCLUDED.count,
+                   updated_at = EXCLUDED.updated_at;
+            """
+        )
+        session.exec(
+            stmt,
+            params={
+                "pl": rating.poll_label,
+                "etype": rating.entity_type.value,
+                "key": entity_key,
+                "nid": rating.node_id,
+                "sid": rating.source_id,
+                "tid": rating.target_id,
+            },
+        )
+        self._refresh_rollups(session, rating)
+
+    def _refresh_rollups(self, session: Session, rating: RatingEvent) -> None:
+        """
+        Bring the daily and hourly rollups of `rating`'s entity and poll up to
+        date, within the caller's transaction. A rating logged now only touches
+        the current buckets; a backdated one also refreshes the later buckets.
+        """
+        entity_filter, entity_key = _entity_filter(rating)
+        timestamp = _utc_naive(rating.timestamp)
+        cutoff = _hourly_cutoff()
+        for bucket in RollupBucket:
+            # hourly rollups are not (re)created before the retention cutoff
+            with_current = bucket == RollupBucket.day or timestamp >= cutoff
+            stmt = text(
+                f"""
+                INSERT INTO {RatingRollup.__tablename__}
+                       (poll_label, entity_type, entity_key, bucket, bucket_start,
+                        node_id, source_id, target_id, value, median, mean, count)
+                SELECT :pl, :etype, :key, :bucket, b.bucket_start,
+                       CAST(:nid AS INTEGER), CAST(:sid AS INTEGER),
+                       CAST(:tid AS INTEGER),
+                       agg.value, agg.median, agg.mean, agg.count
+                  FROM (
+                    SELECT date_trunc(:bucket, CAST(:ts AS TIMESTAMP)) AS bucket_start
+                     WHERE :with_current
+                    UNION
+                    SELECT bucket_start
+                      FROM {RatingRollup.__tablename__}
+                     WHERE poll_label = :pl
+                       AND entity_type = :etype
+                       AND entity_key = :key
+                       AND bucket = :bucket
+                       AND bucket_start > date_trunc(:bucket, CAST(:ts AS TIMESTAMP))
+                  ) AS b
+                  CROSS JOIN LATERAL (
+                    SELECT {_aggregation_sql(rating.poll_label)} AS value,
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY rating)
+                               AS median,
+                           avg(rating) AS mean,
+                           count(*) AS count
+                      FROM (
+                        SELECT DISTINCT ON (username) rating
+                          FROM {RatingEvent.__tablename__}
+                         WHERE entity_type = :etype
+                           AND poll_label = :pl
+                           AND {entity_filter}
+                           AND timestamp < b.bucket_start + CAST(:step AS INTERVAL)
+                         ORDER BY username, timestamp DESC
+                      ) AS latest
+                  ) AS agg
+                ON CONFLICT (poll_label, entity_type, entity_key, bucket,
+                             bucket_start) DO UPDATE
+                   SET value = EXCLUDED.value,
+                       median = EXCLUDED.median,
+                       mean = EXCLUDED.mean,
+                       count = EXCLUDED.count;
+                """
+            )
+            session.exec(
+                stmt,
+                params={
+                    "pl": rating.poll_label,
+                    "etype": rating.entity_type.value,
+                    "key": entity_key,
+                    "bucket": bucket.value,
+                    "ts": timestamp,
+                    "with_current": with_current,
+                    "step": _ROLLUP_STEP[bucket],
+                    "nid": rating.node_id,
+                    "sid": rating.source_id,
+                    "tid": rating.target_id,
+                },
+            )
+
+    def backfill_rating_rollups(
+        self, poll_label: str | None = None, batch_size: int = 1000
+    ) -> int:
+        """
+        Rebuild the rollups (of one poll, or all) from the rating log. Events are
+        streamed once, in entity and time order, and replayed in Python rather
+        than recomputing the latest ratings as of every bucket in SQL.
+        Returns the number of rollup rows written.
+        """
+        where = "WHERE poll_label = :pl" if poll_label else ""
+        params = {"pl": poll_label} if poll_label else {}
+        events = text(
+            f"""
+            SELECT poll_label, entity_type, node_id, source_id, target_id,
+                   username, rating, timestamp
+              FROM {RatingEvent.__tablename__}
+              {where}
+             ORDER BY poll_label, entity_type, node_id, source_id, target_id,
+                      timestamp
+            """
+        ).execution_options(stream_results=True, yield_per=batch_size)
+        insert = text(
+            f"""
+            INSERT INTO {RatingRollup.__tablename__}
+                   (poll_label, entity_type, entity_key, bucket, bucket_start,
+                    node_id, source_id, target_id, value, median, mean, count)
+            VALUES (:pl, :etype, :key, :bucket, :start, :nid, :sid, :tid,
+                    :value, :median, :mean, :count)
+            ON CONFLICT (poll_label, entity_type, entity_key, bucket,
+                         bucket_start) DO UPDATE
+               SET value = EXCLUDED.value,
+                   median = EXCLUDED.median,
+                   mean = EXCLUDED.mean,
+                   count = EXCLUDED.count;
+            """
+        )
+
+        cutoff = _hourly_cutoff()
+        written = 0
+        with self._session() as session:
+            session.exec(
+                text(f"DELETE FROM {RatingRollup.__tablename__} {where}"),
+                params=params,
+            )
+            pending = []
+            rows = session.exec(events, params=params)
+            for key, group in groupby(
+                rows,
+                key=lambda r: (
+                    r.poll_label,
+                    r.entity_type,
+                    r.node_id,
+                    r.source_id,
+                    r.target_id,
+                ),
+            ):
+                pending.extend(_rollups_from_events(key, group, cutoff))
+                if len(pending) >= batch_size:
+                    session.exec(insert, params=pending)
+                    written += len(pending)
+                    pending = []
+            if pending:
+                session.exec(insert, params=pending)
+                written += len(pending)
+            self._commit(session)
+        self.logger.info(f"Backfilled {written} rating rollups")
+        return written
+
+    def prune_rating_rollups(self) -> int:
+        """
+        Drop hourly rollups older than the retention window, except the last
+        one of each series, which the timeline carries forward.
+        """
+        table = RatingRollup.__tablename__
+        stmt = text(
+            f"""
+            DELETE FROM {table} AS r
+             WHERE r.bucket = 'hour'
+               AND r.bucket_start < :cutoff
+               AND EXISTS (
+                   SELECT 1
+                     FROM {table} AS n
+                    WHERE n.poll_label = r.poll_label
+                      AND n.entity_type = r.entity_type
+                      AND n.entity_key = r.entity_key
+                      AND n.bucket = 'hour'
+                      AND n.bucket_start > r.bucket_start
+                      AND n.bucket_start < :cutoff
+               )
+            """
+        )
+        with self._session() as session:
+            result = session.exec(stmt, params={"cutoff": _hourly_cutoff()})
+            self._commit(session)
+            return result.rowcount
+
+    @read_only
+    def get_rating_timeline(
+        self,
+        poll_label: str,
+        entity_type: EntityType = EntityType.node,
+        node_id: NodeId | None = None,
+        source_id: NodeId | None = None,
+        target_id: NodeId | None = None,
+        bucket: RollupBucket = RollupBucket.day,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[dict]:
+        """
+        Return one point per bucket from `start` (default: the first rating, or
+        the hourly retention cutoff) to `end` (default and at the latest: now),
+        at most _MAX_TIMELINE_POINTS of them. Buckets without new ratings carry
+        the previous aggregate forward.
+        """
+        if entity_type == EntityType.node:
+            entity_key = str(node_id)
+        else:
+            entity_key = f"{source_id}-{target_id}"
+        now = _bucket_start(_utcnow(), bucket)
+        try:
+            end = min(_bucket_start(_utc_naive(end), bucket), now) if end else now
+            if start is not None:
+                start = _bucket_start(_utc_naive(start), bucket)
+        except OverflowError:
+            raise HTTPException(status_code=400, detail="Timestamp out of range")
+        if start is None:
+            if bucket == RollupBucket.hour:
+                start = _hourly_cutoff()
+        elif start > end:
+            raise HTTPException(status_code=400, detail="start is after end")
+        if start is not None:
+            _check_timeline_span(start, end, bucket)
+
+        table = RatingRollup.__tablename__
+        match = """poll_label = :pl AND entity_type = :etype
+                   AND entity_key = :key AND bucket = :bucket"""
+        query = f"""
+            SELECT bucket_start, value, median, mean, count
+              FROM {table}
+             WHERE {match} AND bucket_start <= :end
+        """
+        params = {
+            "pl": poll_label,
+            "etype": entity_type.value,
+            "key": entity_key,
+            "bucket": bucket.value,
+            "end": end,
+        }
+        if start is not None:
+            # also fetch the last bucket before the window, to carry it in
+            query = f"""
+                ({query} AND bucket_start >= :start)
+                UNION ALL
+                (SELECT bucket_start, value, median, mean, count
+                   FROM {table}
+                  WHERE {match} AND bucket_start < :start
+                  ORDER BY bucket_start DESC
+                  LIMIT 1)
+            """
+            params["start"] = start
+        with self._session() as session:
+            rows = session.exec(text(query), params=params).fetchall()
+        rows = sorted(rows, key=lambda r: r.bucket_start)
+        if not rows:
+            return []
+
+        step = _ROLLUP_STEP[bucket]
+        if start is None:
+            _check_timeline_span(rows[0].bucket_start, end, bucket)
+        cursor = max(start, rows[0].bucket_start) if start else rows[0].bucket_start
+        points = []
+        current = None
+        remaining = iter(rows)
+        upcoming = next(remaining, None)
+        while cursor <= end:
+            while upcoming is not None and upcoming.bucket_start <= cursor:
+                current = upcoming
+                upcoming = next(remaining, None)
+            points.append(
+                {
+                    "bucket_start": cursor,
+                    "value": current.value,
+                    "median": current.median,
+                    "mean": current.mean,
+                    "count": current.count,
+                }
+            )
+            cursor += step
+        return points
+
+    def refresh_rating_aggregates(self) -> None:
+        """
+        Recompute every aggregate from the rating log, e.g. after a poll's
+        aggregation method changed.
+        """
+        with self._session() as session:
+            labels = session.exec(
+                text(f"SELECT DISTINCT poll_label FROM {RatingEvent.__tablename__}")
+            ).all()
+            for (poll_label,) in labels:
+                stmt = text(
+                    f"""
+                    INSERT INTO {RatingAggregate.__tablename__}
+                           (poll_label, entity_type, entity_key, node_id, source_id,
+                            target_id, value, median, mean, count, updated_at)
+                    SELECT poll_label, entity_type,
+                           CASE WHEN node_id IS NOT NULL THEN node_id::text
+                                ELSE source_id || '-' || target_id END,
+                           node_id, source_id, target_id,
+                           {_aggregation_sql(poll_label)},
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY rating),
+                           avg(rating), count(*), now()
+                      FROM (
+                        SELECT DISTINCT ON (entity_type, node_id, source_id,
+                                            target_id, username)
+                               poll_label, entity_type, node_id, source_id,
+                               target_id, rating
+                          FROM {RatingEvent.__tablename__}
+                         WHERE poll_label = :pl
+                         ORDER BY entity_type, node_id, source_id, target_id,
+                                  username, timestamp DESC
+                      ) AS latest
+                     GROUP BY poll_label, entity_type, node_id, source_id, target_id
+                    ON CONFLICT (poll_label, entity_type, entity_key) DO UPDATE
+                       SET value = EXCLUDED.value,
+                           median = EXCLUDED.median,
+                           mean = EXCLUDED.mean,
+                           count = EXCLUDED.count,
+                           updated_at = EXCLUDED.updated_at;
+                    """
+                )
+                session.exec(stmt, params={"pl": poll_label})
+            self._commit(session)
+        _leaderboard_cache.clear()
+
+    @read_only
+    def get_top_rated(
+        self,
+        poll_label: str,
+        k: int = 10,
+        entity_type: EntityType = EntityType.node,
+        node_types: list[str] | None = None,
+        scope: str | None = None,
+        order: str = "desc",
+    ) -> list[dict]:
+        """
+        Return the k entities with the highest (or lowest) aggregate for a poll,
+        ties broken by vote count. Deleted entities are skipped.
+        """
+        cache_key = (
+            poll_label,
+            entity_type.value,
+            k,
+            tuple(sorted(node_types or ())),
+            scope,
+            order,
+        )
+        # a client that just rated reads the primary, past copies read from
+        # lagging replicas or cached by other workers before its rating
+        cached = None if pinned() else _leaderboard_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if entity_type == EntityType.node:
+            current_filter = "g.node_id = a.node_id"
+        else:
+            current_filter = "g.source_id = a.source_id AND g.target_id = a.target_id"
+        filters = ""
+        params: dict = {
+            "pl": poll_label,
+            "etype": entity_type.value,
+            "k": k,
+        }
+        if node_types:
+            filters += " AND cur.payload->>'node_type' = ANY(:node_types)"
+            params["node_types"] = list(node_types)
+        if scope:
+            filters += " AND cur.payload->>'scope' = :scope"
+            params["scope"] = scope
+        direction = "ASC" if order == "asc" else "DESC"
+
+        stmt = text(
+            f"""
+            SELECT a.entity_type, a.node_id, a.source_id, a.target_id,
+                   a.value, a.median, a.mean, a.count, cur.payload
+              FROM {RatingAggregate.__tablename__} AS a
+              JOIN LATERAL (
+                SELECT g.state, g.payload
+                  FROM {GraphHistoryEvent.__tablename__} AS g
+                 WHERE g.entity_type = a.entity_type
+                   AND {current_filter}
+                 ORDER BY g.timestamp DESC
+                 LIMIT 1
+              ) AS cur ON TRUE
+             WHERE a.poll_label = :pl
+               AND a.entity_type = :etype
+               AND a.value IS NOT NULL
+               AND cur.state != 'deleted'{filters}
+             ORDER BY a.value {direction}, a.count DESC
+             LIMIT :k;
+            """
+        )
+        with self._session() as session:
+            rows = session.exec(stmt, params=params).all()
+        out = [dict(row._mapping) for row in rows]
+        _leaderboard_cache.set(cache_key, out)
+        return out
+
+    @read_only
+    def get_rating_distributions(
+        self,
+        poll_label: str,
+        node_ids: list[NodeId] | None = None,
+        edges: list[tuple[int, int]] | None = None,
+    ) -> dict[tuple[EntityType, int | tuple[int, int]], dict]:
+        """
+        Compute, in one query over each user's latest rating, the vote count,
+        mean, population standard deviation, quartiles and per-value histogram
+        of many nodes and edges at once.
+        Returns a dict keyed by (EntityType.node, node_id) or
+        (EntityType.edge, (source_id, target_id)); unrated entities are absent.
+        """
+        entity_filters = []
+        params: dict = {"pl": poll_label}
+        if node_ids:
+            entity_filters.append("(entity_type = 'node' AND node_id = ANY(:nids))")
+            params["nids"] = list(node_ids)
+        if edges:
+            entity_filters.append(f"(entity_type = 'edge' AND {_PAIRS_FILTER})")
+            params.update(_pairs_params(edges))
+        if not entity_filters:
+            return {}
+
+        stmt = text(
+            f"""
+            WITH latest AS (
+                SELECT DISTINCT ON (entity_type, node_id, source_id, target_id,
+                                    username)
+                       entity_type, node_id, source_id, target_id, rating
+                  FROM {RatingEvent.__tablename__}
+                 WHERE poll_label = :pl
+                   AND ({" OR ".join(entity_filters)})
+                 ORDER BY entity_type, node_id, source_id, target_id,
+                          username, timestamp DESC
+            ),
+            histograms AS (
+                SELECT entity_type, node_id, source_id, target_id,
+                       json_object_agg(rating, votes) AS histogram
+                  FROM (
+                    SELECT entity_type, node_id, source_id, target_id,
+                           rating, count(*) AS votes
+                      FROM latest
+                     GROUP BY entity_type, node_id, source_id, target_id, rating
+                  ) AS per_value
+                 GROUP BY entity_type, node_id, source_id, target_id
+            ),
+            stats AS (
+                SELECT entity_type, node_id, source_id, target_id,
+                       count(*) AS count,
+                       avg(rating) AS mean,
+                       stddev_pop(rating) AS stddev,
+                       min(rating) AS min,
+                       max(rating) AS max,
+                       percentile_cont(ARRAY[0.25, 0.5, 0.75])
+                         WITHIN GROUP (ORDER BY rating) AS quartiles
+                  FROM latest
+                 GROUP BY entity_type, node_id, source_id, target_id
+            )
+            SELECT s.*, h.histogram
+              FROM stats AS s
+              JOIN histograms AS h
+                ON h.entity_type = s.entity_type
+               AND h.node_id IS NOT DISTINCT FROM s.node_id
+               AND h.source_id IS NOT DISTINCT FROM s.source_id
+               AND h.target_id IS NOT DISTINCT FROM s.target_id;
+            """
+        )
+        with self._session() as session:
+            rows = session.exec(stmt, params=params).all()
+
+        result: dict = {}
+        for r in rows:
+            q1, median, q3 = r.quartiles
+            entity_type = EntityType(r.entity_type)
+            if entity_type == EntityType.node:
+                key = (entity_type, r.node_id)
+            else:
+                key = (entity_type, (r.source_id, r.target_id))
+            result[key] = {
+                "count": r.count,
+                "mean": float(r.mean),
+                "stddev": float(r.stddev),
+                "min": r.min,
+                "max": r.max,
+                "q1": q1,
+                "median": median,
+                "q3": q3,
+                "iqr": q3 - q1,
+                "histogram": r.histogram,
+            }
+        return result
+
+    @read_only
     def get_node_rating(
         self, node_id: int, poll_label: str, username: str
     ) -> RatingEvent | None:
         """
         Retrieve the latest rating of a given node by a given user.
         """
-        with Session(self.engine) as session:
+        with self._session() as session:
             statement = (
                 select(RatingEvent)
                 .where(
@@ -191,6 +1001,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             rating = session.exec(statement).first()
             return rating
 
+    @read_only
     def get_node_ratings(self, node_id: int, poll_label: str) -> list[RatingEvent]:
         """
         Retrieve the most recent rating per user for a given node using PostgreSQL's DISTINCT ON.
@@ -211,10 +1022,11 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             "node_id": node_id,
             "poll_label": poll_label,
         }
-        with Session(self.engine) as session:
+        with self._session() as session:
             results = session.exec(query, params=params).fetchall()
             return [RatingEvent.model_validate(row) for row in results]
 
+    @read_only
     def get_nodes_ratings(
         self, node_ids: list[NodeId], poll_label: str
     ) -> dict[NodeId, list[RatingEvent]]:
@@ -241,7 +1053,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             "node_ids": node_ids,
             "poll_label": poll_label,
         }
-        with Session(self.engine) as session:
+        with self._session() as session:
             rows = session.exec(query, params=params).fetchall()
             result: dict[int, list[RatingEvent]] = {}
             for row in rows:
@@ -249,13 +1061,14 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
                 result.setdefault(rating.node_id, []).append(rating)
             return result
 
+    @read_only
     def get_edge_rating(
         self, source_id: int, target_id: int, poll_label: str, username: str
     ) -> RatingEvent | None:
         """
         Retrieve the latest rating of a given edge by a given user.
         """
-        with Session(self.engine) as session:
+        with self._session() as session:
             statement = (
                 select(RatingEvent)
                 .where(
@@ -270,12 +1083,56 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             rating = session.exec(statement).first()
             return rating
 
+    @read_only
+    def get_user_ratings(
+        self,
+        username: str,
+        node_ids: list[NodeId] | None = None,
+        edges: list[tuple[int, int]] | None = None,
+        poll_label: str | None = None,
+    ) -> list[RatingEvent]:
+        """
+        Retrieve the latest rating of a given user for each requested node and
+        edge (and each poll, unless poll_label is given) in one query.
+        """
+        entity_filters = []
+        params: dict = {"username": username}
+        if node_ids:
+            entity_filters.append("(entity_type = 'node' AND node_id = ANY(:nids))")
+            params["nids"] = list(node_ids)
+        if edges:
+            entity_filters.append(f"(entity_type = 'edge' AND {_PAIRS_FILTER})")
+            params.update(_pairs_params(edges))
+        if not entity_filters:
+            return []
+        poll_filter = ""
+        if poll_label is not None:
+            poll_filter = "AND poll_label = :pl"
+            params["pl"] = poll_label
+
+        query = text(
+            f"""
+            SELECT DISTINCT ON (entity_type, node_id, source_id, target_id,
+                                poll_label) *
+              FROM {RatingEvent.__tablename__}
+             WHERE username = :username
+               {poll_filter}
+               AND ({" OR ".join(entity_filters)})
+             ORDER BY entity_type, node_id, source_id, target_id, poll_label,
+                      timestamp DESC
+            """
+        )
+        with self._session() as session:
+            rows = session.exec(query, params=params).fetchall()
+            return [RatingEvent.model_validate(row) for row in rows]
+
+    @read_only
     def get_node_median_rating(self, node_id: int, poll_label: str) -> float | None:
         """
         Compute the median rating for a node + poll_label,
         considering only each user’s latest rating.
         """
-        with Session(self.engine) as session:
+        with self._session() as session:
             stmt = text(
                 f"""
             SELECT percentile_cont(0.5)
@@ -301,6 +1158,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             row = result.first()
             return row.median if row and row.median is not None else None
 
+    @read_only
     def get_edge_ratings(
         self, source_id: int, target_id: int, poll_label: str
     ) -> list[RatingEvent]:
@@ -324,10 +1182,11 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             "target_id": target_id,
             "poll_label": poll_label,
         }
-        with Session(self.engine) as session:
+        with self._session() as session:
             results = session.exec(query, params=params).fetchall()
             return [RatingEvent.model_validate(row) for row in results]
 
+    @read_only
     def get_edge_median_rating(
         self, source_id: int, target_id: int, poll_label: str
     ) -> float | None:
@@ -335,7 +1194,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
         Compute the median rating for an edge + poll_label,
         considering only each user’s latest rating.
         """
-        with Session(self.engine) as session:
+        with self._session() as session:
             stmt = text(
                 f"""
             SELECT percentile_cont(0.5)
@@ -362,6 +1221,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             ).first()
             return row.median if row and row.median is not None else None
 
+    @read_only
     def get_nodes_median_ratings(
         self, node_ids: list[NodeId], poll_label: str
     ) -> dict[NodeId, float | None]:
@@ -370,7 +1230,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
         """
         if not node_ids:
             return {}
-        with Session(self.engine) as session:
+        with self._session() as session:
             stmt = text(
                 f"""
               SELECT node_id,
@@ -382,7 +1242,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
                     FROM {RatingEvent.__tablename__}
                    WHERE entity_type = :etype
                      AND poll_label = :pl
-                     AND node_id IN :nids
+                     AND node_id = ANY(:nids)
                    ORDER BY node_id, username, timestamp DESC
                 ) AS latest
                GROUP BY node_id;
@@ -393,7 +1253,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
                 params={
                     "etype": EntityType.node.value,
                     "pl": poll_label,
-                    "nids": tuple(node_ids),
+                    "nids": list(node_ids),
                 },
             ).all()
             # map missing ids → None
@@ -402,6 +1262,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
                 result[r.node_id] = r.median
             return result
 
+    @read_only
     def get_edges_ratings(
         self,
         edges: list[tuple[int, int]],
@@ -444,7 +1305,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             "poll_label": poll_label,
         }
 
-        with Session(self.engine) as session:
+        with self._session() as session:
             rows = session.exec(query, params=params).fetchall()
 
         # Group them by (source_id, target_id)
@@ -456,6 +1317,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
 
         return results
 
+    @read_only
     def get_edges_median_ratings(
         self,
         edges: list[tuple[int, int]],
@@ -466,7 +1328,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
         """
         if not edges:
             return {}
-        with Session(self.engine) as session:
+        with self._session() as session:
             stmt = text(
                 f"""
               SELECT source_id, target_id,
@@ -478,7 +1340,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
                     FROM {RatingEvent.__tablename__}
                    WHERE entity_type = :etype
                      AND poll_label = :pl
-                     AND (source_id, target_id) IN :pairs
+                     AND {_PAIRS_FILTER}
                    ORDER BY source_id, target_id, username, timestamp DESC
                 ) AS latest
                GROUP BY source_id, target_id;
@@ -489,7 +1351,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
                 params={
                     "etype": EntityType.edge.value,
                     "pl": poll_label,
-                    "pairs": tuple(edges),
+                    **_pairs_params(edges),
                 },
             ).all()
             result = {(s, t): None for s, t in edges}
@@ -498,7 +1360,7 @@ class RatingHistoryPostgreSQLDB(RatingHistoryRelationalInterface):
             return result
 
 
-class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
+class GraphHistoryPostgreSQLDB(_UnitOfWorkMixin, GraphHistoryRelationalInterface):
     def __init__(self, database_url: str):
         super().__init__()
         self.engine = get_engine(database_url)
@@ -507,15 +1369,16 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
         )
 
     def log_event(self, event: GraphHistoryEvent) -> GraphHistoryEvent:
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(event)
-            session.commit()
+            self._commit(session)
             session.refresh(event)
             self.logger.info(f"Logged event: {event.event_id}")
             return event
 
+    @read_only
     def get_node_history(self, node_id: NodeId) -> List[GraphHistoryEvent]:
-        with Session(self.engine) as session:
+        with self._session() as session:
             statement = select(GraphHistoryEvent).where(
                 GraphHistoryEvent.node_id == node_id
             )
@@ -523,10 +1386,11 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             self.logger.info(f"Found {len(events)} events for node: {node_id}")
             return events
 
+    @read_only
     def get_edge_history(
         self, source_id: NodeId, target_id: NodeId
     ) -> List[GraphHistoryEvent]:
-        with Session(self.engine) as session:
+        with self._session() as session:
             statement = select(GraphHistoryEvent).where(
                 GraphHistoryEvent.source_id == source_id,
                 GraphHistoryEvent.target_id == target_id,
@@ -553,93 +1417,94 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
         return obj
 
     def _to_node(self, payload: dict) -> NodeBase:
+        """The node of a logged payload, trusted: it was validated on its way in."""
         data = dict(payload or {})
-        # ensure minimal defaults
-        # data.setdefault("node_type", "potentiality")  #TODO: check defaults
-        # data.setdefault("scope", "")
-        try:
-            nt = data["node_type"]
-        except KeyError as e:
+        if "node_type" not in data:
             logger.error(f'"node_type" not found in payload: {data}')
-            raise e
-        Dyn = NodeTypeModels.get(nt)
-        if Dyn:
-            # Dyn is a SQLModel subclass with only your config-allowed fields
-            logger.debug("blablablabla\n")
-            out = Dyn(**data)
-            logger.info(f"Using dynamic model for node type: {nt}, ending up in {out}")
-            return out
-        # fallback
-        return NodeBase.model_validate(data)
+            raise KeyError("node_type")
+        return construct_node(data)
 
     def _to_edge(self, obj) -> EdgeBase:
+        """The edge of a logged payload, trusted as in _to_node."""
         data = obj if isinstance(obj, dict) else obj.model_dump()
-        et = data.get("edge_type")
-        Dyn = EdgeTypeModels.get(et)
-        if Dyn:
-            return Dyn(**data)
-        return EdgeBase.model_validate(data)
+        return construct_edge(data)
 
-    def get_whole_graph(self) -> SubgraphBase:
-        """Reconstruct the current graph from the latest events."""
-        with Session(self.engine) as session:
+    # the events get_whole_graph builds from, when fetched beforehand
+    _prefetched_events: tuple[list, list] | None = None
+
+    @classmethod
+    def prefetched(cls, events: tuple[list, list]):
+        """
+        Return a repository with no session, building its graphs from
+        `events` as returned by `_graph_events`.
+        """
+        bound = cls.within(None)
+        bound._prefetched_events = events
+        return bound
+
+    def _graph_events(self) -> tuple[list, list]:
+        """The node events and the edge events of the whole graph."""
+        if self._prefetched_events is not None:
+            return self._prefetched_events
+        with self._session() as session:
             node_events = session.exec(
                 select(GraphHistoryEvent).where(
                     GraphHistoryEvent.entity_type == EntityType.node
                 )
             ).all()
-            self.logger.info(f"Fetched {len(node_events)} node events")
-            nodes_latest = {}
-            for event in node_events:
-                nid = event.node_id
-                if (
-                    nid not in nodes_latest
-                    or event.timestamp > nodes_latest[nid].timestamp
-                ):
-                    nodes_latest[nid] = event
-
-            nodes = []
-            for event in nodes_latest.values():
-                if event.state == EntityState.deleted:
-                    continue
-                if event.payload["node_type"] not in NodeTypeModels:
-                    # Handle orphaned nodes with types that no longer exist
-                    self.logger.warning(
-                        f"Node {event.node_id} has an unknown type: {event.payload['node_type']}"
-                    )
-                    continue
-                nodes.append(self._to_node(event.payload))
-
             edge_events = session.exec(
                 select(GraphHistoryEvent).where(
                     GraphHistoryEvent.entity_type == EntityType.edge
                 )
             ).all()
-            edges_latest = {}
-            for event in edge_events:
-                key = (event.source_id, event.target_id)
-                if (
-                    key not in edges_latest
-                    or event.timestamp > edges_latest[key].timestamp
-                ):
-                    edges_latest[key] = event
-            edges = []
-            for event in edges_latest.values():
-                if event.state == EntityState.deleted:
-                    continue
-                if event.payload["edge_type"] not in EdgeTypeModels:
-                    # Handle orphaned edges with types that no longer exist
-                    self.logger.warning(
-                        f"Edge {event.source_id} -> {event.target_id} has an unknown type: {event.payload['edge_type']}"
-                    )
-                    continue
-                edges += [self._to_edge(event.payload)]
+        return node_events, edge_events
 
-            self.logger.info(
-                f"Returning graph with {len(nodes)} nodes and {len(edges)} edges"
-            )
-            return DynamicSubgraph(nodes=nodes, edges=edges)
+    @read_only
+    def get_whole_graph(self) -> SubgraphBase:
+        """Reconstruct the current graph from the latest events."""
+        node_events, edge_events = self._graph_events()
+        self.logger.info(f"Fetched {len(node_events)} node events")
+        nodes_latest = {}
+        for event in node_events:
+            nid = event.node_id
+            if nid not in nodes_latest or event.timestamp > nodes_latest[nid].timestamp:
+                nodes_latest[nid] = event
+
+        nodes = []
+        for event in nodes_latest.values():
+            if event.state == EntityState.deleted:
+                continue
+            if event.payload["node_type"] not in NodeTypeModels:
+                # Handle orphaned nodes with types that no longer exist
+                self.logger.warning(
+                    f"Node {event.node_id} has an unknown type: {event.payload['node_type']}"
+                )
+                continue
+            nodes.append(self._to_node(event.payload))
+
+        edges_latest = {}
+        for event in edge_events:
+            key = (event.source_id, event.target_id)
+            if key not in edges_latest or event.timestamp > edges_latest[key].timestamp:
+                edges_latest[key] = event
+        edges = []
+        for event in edges_latest.values():
+            if event.state == EntityState.deleted:
+                continue
+            if event.payload["edge_type"] not in EdgeTypeModels:
+                # Handle orphaned edges with types that no longer exist
+                self.logger.warning(
+                    f"Edge {event.source_id} -> {event.target_id} has an unknown type: {event.payload['edge_type']}"
+                )
+                continue
+            edges += [self._to_edge(event.payload)]
 
+        self.logger.info(
+            f"Returning graph with {len(nodes)} nodes and {len(edges)} edges"
+        )
+        return DynamicSubgraph(nodes=nodes, edges=edges)
+
+    @read_only
     def list_tags(self, query: str | None = None, limit: int = 50) -> list[str]:
         table = GraphHistoryEvent.__tablename__
         base_sql = f"""
@@ -661,21 +1526,76 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
 
         stmt = text(base_sql).bindparams(**params)
 
-        with Session(self.engine) as session:
+        with self._session() as session:
             rows = session.exec(stmt).all()
         return [row.tag for row in rows]
 
+    @read_only
+    def get_element_statuses(
+        self,
+        node_ids: list[NodeId] | None = None,
+        edges: list[tuple[NodeId, NodeId]] | None = None,
+    ) -> dict[tuple[EntityType, NodeId | tuple[NodeId, NodeId]], str]:
+        """
+        Return the current status of several nodes and edges in one query,
+        keyed by (EntityType.node, node_id) or (EntityType.edge, (source, target)).
+        Missing and deleted elements are left out; elements without a status
+        are reported as 'live'.
+        """
+        entity_filters = []
+        params: dict = {}
+        if node_ids:
+            entity_filters.append("(entity_type = 'node' AND node_id = ANY(:nids))")
+            params["nids"] = list(node_ids)
+        if edges:
+            entity_filters.append(f"(entity_type = 'edge' AND {_PAIRS_FILTER})")
+            params.update(_pairs_params(edges))
+        if not entity_filters:
+            return {}
+
+        query = text(
+            f"""
+            SELECT DISTINCT ON (entity_type, node_id, source_id, target_id)
+                   entity_type, node_id, source_id, target_id, state,
+                   payload->>'status' AS status
+              FROM {GraphHistoryEvent.__tablename__}
+             WHERE {" OR ".join(entity_filters)}
+             ORDER BY entity_type, node_id, source_id, target_id, timestamp DESC
+            """
+        )
+        with self._session() as session:
+            rows = session.exec(query, params=params).fetchall()
+
+        out = {}
+        for row in rows:
+            if EntityState(row.state) == EntityState.deleted:
+                continue
+            if EntityType(row.entity_type) == EntityType.node:
+                key = (EntityType.node, row.node_id)
+            else:
+                key = (EntityType.edge, (row.source_id, row.target_id))
+            out[key] = row.status or "live"
+        return out
+
+    @read_only
     def get_graph_summary(self) -> dict:
         graph = self.get_whole_graph()
         return {"nodes": len(graph.nodes), "edges": len(graph.edges)}
 
+    @read_only
+    def get_generation(self) -> int | None:
+        with self._session() as session:
+            return session.exec(
+                text(f"SELECT generation FROM {GraphGeneration.__tablename__}")
+            ).scalar()
+
     def reset_whole_graph(self, username: str = "system") -> None:
         """Reset the graph by clearing all history events."""
         from sqlalchemy import delete
 
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.exec(delete(GraphHistoryEvent))
-            session.commit()
+            self._commit(session)
 
     def update_graph(
         self, subgraph: SubgraphBase, username: str = "system"
@@ -727,9 +1647,13 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
 
         return DynamicSubgraph(nodes=nodes_out, edges=edges_out)
 
-    def get_induced_subgraph(self, node_id: NodeId, levels: int) -> SubgraphBase:
+    @read_only
+    def get_induced_subgraph(
+        self, node_id: NodeId, levels: int, max_degree: int | None = None
+    ) -> SubgraphBase:
         """
         Reconstruct an induced subgraph starting from node_id by performing a BFS.
+        With `max_degree`, each hop follows at most that many neighbours per node.
         """
         whole = self.get_whole_graph()
         node_index = {node.node_id: node for node in whole.nodes}
@@ -752,7 +1676,10 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             visited.add(current)
             if current in node_index:
                 induced_nodes[current] = node_index[current]
-            for neighbor in adjacency.get(current, []):
+            neighbors = adjacency.get(current, ())
+            if max_degree is not None:
+                neighbors = sorted(neighbors)[:max_degree]
+            for neighbor in neighbors:
                 if neighbor not in visited:
                     queue.append((neighbor, lvl + 1))
 
@@ -763,6 +1690,7 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
         ]
         return DynamicSubgraph(nodes=list(induced_nodes.values()), edges=induced_edges)
 
+    @read_only
     def search_nodes(
         self,
         node_type: list[str] | str = Query(None),
@@ -860,6 +1788,7 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
         )
         return results
 
+    @read_only
     def get_search_subgraph(
         self,
         node_type: list[str] | str | None = None,
@@ -869,11 +1798,13 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
         tags: list[str] | None = None,
         description: str | None = None,
         levels: int = 1,
+        max_elements: int | None = None,
     ) -> SubgraphBase:
         """
         Retrieve nodes matching search criteria along with their connections
         up to 'levels' depth. This creates a subgraph showing how search results
-        relate to each other.
+        relate to each other. At most `max_elements` nodes and edges are
+        returned, nodes in BFS order first.
 
         Returns:
             A subgraph containing:
@@ -936,12 +1867,17 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
                         visited.add(neighbor_id)
                         queue.append((neighbor_id, current_level + 1))
 
+        if max_elements is not None:
+            included_nodes = dict(list(included_nodes.items())[:max_elements])
+
         # Get all edges between included nodes
         included_edges = [
             edge
             for edge in whole_graph.edges
             if edge.source in included_nodes and edge.target in included_nodes
         ]
+        if max_elements is not None:
+            included_edges = included_edges[: max_elements - len(included_nodes)]
 
         self.logger.info(
             f"Search subgraph: {len(search_results)} search results expanded to "
@@ -952,6 +1888,7 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             nodes=list(included_nodes.values()), edges=included_edges
         )
 
+    @read_only
     def get_random_node(self, node_type: str = None) -> NodeBase:
         nodes = self.get_whole_graph().nodes
         if node_type is not None:
@@ -964,8 +1901,9 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             )
         return random.choice(nodes)
 
+    @read_only
     def get_node(self, node_id: NodeId) -> NodeBase:
-        with Session(self.engine) as session:
+        with self._session() as session:
             stmt = (
                 select(GraphHistoryEvent)
                 .where(
@@ -980,6 +1918,24 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
                 raise HTTPException(status_code=404, detail="Node not found")
             return self._to_node(event.payload)
 
+    def _ensure_scope(self, scope_name: str | None) -> None:
+        """
+        Create the node's scope if missing, in a savepoint so that a failure
+        (e.g. a concurrent insert of the same name) is logged without
+        aborting the unit of work this repository may be bound to.
+        """
+        if not scope_name:
+            return
+        from backend.api.scopes import get_or_create_scope
+
+        try:
+            with self._session() as session:
+                with session.begin_nested():
+                    get_or_create_scope(scope_name, session)
+                self._commit(session)
+        except Exception as e:
+            self.logger.error(f"Failed to ensure scope exists: {e}")
+
     def create_node(self, node: NodeBase, username: str = "system") -> NodeBase:
         """
         Create a node by logging a creation event.
@@ -989,19 +1945,7 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
         if not node_dict.get("node_id"):
             node_dict["node_id"] = random.randint(1, 10**6)
             # Ensure scope exists in relational scopes table when provided
-            scope_name = node_dict.get("scope")
-            if scope_name:
-                try:
-                    from backend.api.scopes import get_or_create_scope
-
-                    engine = get_engine(settings.POSTGRES_DB_URL)
-                    from sqlmodel import Session as _Session
-
-                    with _Session(engine) as session:
-                        get_or_create_scope(scope_name, session)
-                        session.commit()
-                except Exception as e:
-                    self.logger.error(f"Failed to ensure scope exists: {e}")
+            self._ensure_scope(node_dict.get("scope"))
         event = GraphHistoryEvent(
             state=EntityState.created,
             entity_type=EntityType.node,
@@ -1009,10 +1953,10 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             payload=node_dict,
             username=username,
         )
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(event)
             session.flush()  # ensure the event is handed over to the DB
-            session.commit()
+            self._commit(session)
             session.refresh(event)
             self.logger.info(f"Created node event: {event}")
         return self._to_node(event.payload)
@@ -1030,9 +1974,9 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             payload={},  # empty payload for deletion
             username=username,
         )
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(event)
-            session.commit()
+            self._commit(session)
 
     def update_node(self, node: NodeBase, username: str = "system") -> NodeBase:
         """
@@ -1046,19 +1990,7 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
         # Merge (new_data overrides current_data)
         merged = {**current_data, **new_data}
         # Ensure scope exists in relational scopes table when provided in merged payload
-        scope_name = merged.get("scope")
-        if scope_name:
-            try:
-                from backend.api.scopes import get_or_create_scope
-
-                engine = get_engine(settings.POSTGRES_DB_URL)
-                from sqlmodel import Session as _Session
-
-                with _Session(engine) as session:
-                    get_or_create_scope(scope_name, session)
-                    session.commit()
-            except Exception as e:
-                self.logger.error(f"Failed to ensure scope exists on update: {e}")
+        self._ensure_scope(merged.get("scope"))
         event = GraphHistoryEvent(
             state=EntityState.updated,
             entity_type=EntityType.node,
@@ -1066,14 +1998,15 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             payload=merged,
             username=username,
         )
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(event)
-            session.commit()
+            self._commit(session)
             session.refresh(event)
         return self._to_node(event.payload)
 
+    @read_only
     def get_edge_list(self) -> list[EdgeBase]:
-        with Session(self.engine) as session:
+        with self._session() as session:
             stmt = select(GraphHistoryEvent).where(
                 GraphHistoryEvent.entity_type == EntityType.edge,
                 GraphHistoryEvent.state != EntityState.deleted,
@@ -1089,8 +2022,9 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
                     edge_latest[key] = event
             return [self._to_edge(event.payload) for event in edge_latest.values()]
 
+    @read_only
     def get_edge(self, source_id: NodeId, target_id: NodeId) -> EdgeBase:
-        with Session(self.engine) as session:
+        with self._session() as session:
             stmt = (
                 select(GraphHistoryEvent)
                 .where(
@@ -1105,6 +2039,7 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
                 raise HTTPException(status_code=404, detail="Edge not found")
             return self._to_edge(event.payload)
 
+    @read_only
     def find_edges(self, **filters) -> list[EdgeBase]:
         """Find edges matching given filters."""
         edges = self.get_edge_list()
@@ -1141,9 +2076,9 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             payload=edge_dict,
             username=username,
         )
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(event)
-            session.commit()
+            self._commit(session)
             session.refresh(event)
         return self._to_edge(event.payload)
 
@@ -1163,9 +2098,9 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             payload={},
             username=username,
         )
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(event)
-            session.commit()
+            self._commit(session)
 
     def update_edge(self, edge: EdgeBase, username: str = "system") -> EdgeBase:
         """
@@ -1182,8 +2117,8 @@ class GraphHistoryPostgreSQLDB(GraphHistoryRelationalInterface):
             payload=edge_dict,
             username=username,
         )
-        with Session(self.engine) as session:
+        with self._session() as session:
             session.add(event)
-            session.commit()
+            self._commit(session)
             session.refresh(event)
         return self._to_edge(event.payload)
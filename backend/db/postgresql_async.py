@@ -0,0 +1,238 @@
+"""
+asyncpg flavour of the PostgreSQL repositories, selected with DB_ASYNC.
+
+Each async repository runs the query code of its sync counterpart through
+`AsyncSession.run_sync`: SQLAlchemy drives that code in a greenlet which hands
+control back to the event loop at every round trip to Postgres, so requests
+wait on the database without holding a threadpool worker, and both flavours
+share one implementation of every query.
+
+That code runs on the event-loop thread, though. The reads that build models
+of the whole graph (whole graph, subgraphs, searches) are CPU-bound, so they
+only fetch the graph events on the loop, then build in the threadpool, off
+it, as the sync flavour does.
+"""
+
+import copy
+import datetime
+from functools import wraps
+from itertools import chain
+
+from sqlalchemy import DateTime, event, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import SQLModel, Session
+from starlette.concurrency import run_in_threadpool
+
+from backend.db.base import (
+    GraphHistoryRelationalInterface,
+    RatingHistoryRelationalInterface,
+    UserDatabaseInterface,
+)
+from backend.db.config import get_async_engine
+from backend.db.routing import replica_url, replicas
+from backend.db.postgresql import (
+    GraphHistoryPostgreSQLDB,
+    RatingHistoryPostgreSQLDB,
+    UserPostgreSQLDB,
+    _utc_naive,
+)
+from backend.models.fixed import UserCreate, UserRead
+from backend.utils.security import hash_password_async
+
+_sessionmakers = {}
+
+
+class _AsyncpgSession(Session):
+    """Sync face of the async sessions, see `_naive_timestamps`."""
+
+
+@event.listens_for(_AsyncpgSession, "before_flush")
+def _naive_timestamps(session, flush_context, instances):
+    """
+    psycopg2 lets the server convert aware datetimes into the models' columns
+    without time zone; asyncpg rejects them, so convert them to UTC here.
+    """
+    for obj in chain(session.new, session.dirty):
+        for column in inspect(obj).mapper.columns:
+            if isinstance(column.type, DateTime) and not column.type.timezone:
+                value = getattr(obj, column.key, None)
+                if isinstance(value, datetime.datetime) and value.tzinfo:
+                    setattr(obj, column.key, _utc_naive(value))
+
+
+def get_async_sessionmaker(
+    database_url: str, create_tables: bool = True
+) -> async_sessionmaker:
+    """Return the process-wide factory of async sessions for `database_url`."""
+    factory = _sessionmakers.get(database_url)
+    if factory is None:
+        factory = _sessionmakers[database_url] = async_sessionmaker(
+            get_async_engine(database_url, create_tables=create_tables),
+            sync_session_class=_AsyncpgSession,
+            expire_on_commit=False,
+        )
+    return factory
+
+
+def _delegate(method, write: bool = False):
+    """Async counterpart of the sync repository `method`."""
+    replica_safe = getattr(method, "_read_only", False)
+
+    @wraps(method)
+    async def run(self, *args, **kwargs):
+        return await self._run(
+            lambda repo: method(repo, *args, **kwargs), write, replica_safe
+        )
+
+    return run
+
+
+def _offload(method):
+    """
+    Async counterpart of the sync graph read `method`, building its models
+    from the graph events in the threadpool rather than on the event loop.
+    """
+
+    @wraps(method)
+    async def run(self, *args, **kwargs):
+        events = await self._run(lambda repo: repo._graph_events(), False, True)
+        repo = self._sync_class.prefetched(events)
+        return await run_in_threadpool(method, repo, *args, **kwargs)
+
+    return run
+
+
+class _AsyncRepositoryMixin:
+    """
+    Runs the methods of `_sync_class` within an async session: a fresh one,
+    committed after writes, or the caller's one bound with `with_session`.
+    """
+
+    _sync_class: type
+    _bound_session: AsyncSession | None = None
+
+    def __init__(self, database_url: str):
+        super().__init__()
+        self.engine = get_async_engine(database_url)
+        self.SessionLocal = get_async_sessionmaker(database_url)
+
+    def with_session(self, session: AsyncSession):
+        """Return a copy of this repository working within `session`."""
+        bound = copy.copy(self)
+        bound._bound_session = session
+        return bound
+
+    async def _run(self, call, write: bool = False, replica_safe: bool = False):
+        def in_session(session: Session):
+            return call(self._sync_class.within(session))
+
+        if self._bound_session is not None:
+            return await self._bound_session.run_sync(in_session)
+        url = replica_url(read_only=replica_safe)
+        if url is None:
+            factory = self.SessionLocal
+        else:
+            factory = get_async_sessionmaker(url, create_tables=False)
+        try:
+            async with factory() as session:
+                result = await session.run_sync(in_session)
+                if write:
+                    await session.commit()
+                return result
+        except (OperationalError, OSError):
+            if url is not None:
+                replicas().mark_down(url)
+            raise
+
+    async def _reset_tables(self) -> None:
+        async with self.engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+
+class AsyncUserPostgreSQLDB(_AsyncRepositoryMixin, UserDatabaseInterface):
+    _sync_class = UserPostgreSQLDB
+
+    get_user = _delegate(UserPostgreSQLDB.get_user)
+    update_user = _delegate(UserPostgreSQLDB.update_user, write=True)
+    update_preferences = _delegate(UserPostgreSQLDB.update_preferences, write=True)
+    list_users = _delegate(UserPostgreSQLDB.list_users)
+
+    async def create_user(self, user: UserCreate) -> UserRead:
+        hashed_password = await hash_password_async(user.password)
+        return await self._run(
+            lambda repo: repo._insert_user(user, hashed_password), write=True
+        )
+
+    async def reset_user_table(self):
+        await self._reset_tables()
+
+
+class AsyncRatingHistoryPostgreSQLDB(
+    _AsyncRepositoryMixin, RatingHistoryRelationalInterface
+):
+    _sync_class = RatingHistoryPostgreSQLDB
+
+    log_rating = _delegate(RatingHistoryPostgreSQLDB.log_rating, write=True)
+    log_ratings = _delegate(RatingHistoryPostgreSQLDB.log_ratings, write=True)
+    refresh_rating_aggregates = _delegate(
+        RatingHistoryPostgreSQLDB.refresh_rating_aggregates, write=True
+    )
+    get_rating_timeline = _delegate(RatingHistoryPostgreSQLDB.get_rating_timeline)
+    get_top_rated = _delegate(RatingHistoryPostgreSQLDB.get_top_rated)
+    get_rating_distributions = _delegate(
+        RatingHistoryPostgreSQLDB.get_rating_distributions
+    )
+    get_node_rating = _delegate(RatingHistoryPostgreSQLDB.get_node_rating)
+    get_node_ratings = _delegate(RatingHistoryPostgreSQLDB.get_node_ratings)
+    get_nodes_ratings = _delegate(RatingHistoryPostgreSQLDB.get_nodes_ratings)
+    get_edge_rating = _delegate(RatingHistoryPostgreSQLDB.get_edge_rating)
+    get_user_ratings = _delegate(RatingHistoryPostgreSQLDB.get_user_ratings)
+    get_node_median_rating = _delegate(RatingHistoryPostgreSQLDB.get_node_median_rating)
+    get_edge_ratings = _delegate(RatingHistoryPostgreSQLDB.get_edge_ratings)
+    get_edge_median_rating = _delegate(RatingHistoryPostgreSQLDB.get_edge_median_rating)
+    get_nodes_median_ratings = _delegate(
+        RatingHistoryPostgreSQLDB.get_nodes_median_ratings
+    )
+    get_edges_ratings = _delegate(RatingHistoryPostgreSQLDB.get_edges_ratings)
+    get_edges_median_ratings = _delegate(
+        RatingHistoryPostgreSQLDB.get_edges_median_ratings
+    )
+
+    async def reset_table(self):
+        await self._reset_tables()
+
+
+class AsyncGraphHistoryPostgreSQLDB(
+    _AsyncRepositoryMixin, GraphHistoryRelationalInterface
+):
+    _sync_class = GraphHistoryPostgreSQLDB
+
+    log_event = _delegate(GraphHistoryPostgreSQLDB.log_event, write=True)
+    get_node_history = _delegate(GraphHistoryPostgreSQLDB.get_node_history)
+    get_edge_history = _delegate(GraphHistoryPostgreSQLDB.get_edge_history)
+    revert_to_event = _delegate(GraphHistoryPostgreSQLDB.revert_to_event, write=True)
+    get_whole_graph = _offload(GraphHistoryPostgreSQLDB.get_whole_graph)
+    list_tags = _delegate(GraphHistoryPostgreSQLDB.list_tags)
+    get_element_statuses = _delegate(GraphHistoryPostgreSQLDB.get_element_statuses)
+    get_graph_summary = _offload(GraphHistoryPostgreSQLDB.get_graph_summary)
+    get_generation = _delegate(GraphHistoryPostgreSQLDB.get_generation)
+    reset_whole_graph = _delegate(
+        GraphHistoryPostgreSQLDB.reset_whole_graph, write=True
+    )
+    update_graph = _delegate(GraphHistoryPostgreSQLDB.update_graph, write=True)
+    get_induced_subgraph = _offload(GraphHistoryPostgreSQLDB.get_induced_subgraph)
+    search_nodes = _offload(GraphHistoryPostgreSQLDB.search_nodes)
+    get_search_subgraph = _offload(GraphHistoryPostgreSQLDB.get_search_subgraph)
+    get_random_node = _offload(GraphHistoryPostgreSQLDB.get_random_node)
+    get_node = _delegate(GraphHistoryPostgreSQLDB.get_node)
+    create_node = _delegate(GraphHistoryPostgreSQLDB.create_node, write=True)
+    delete_node = _delegate(GraphHistoryPostgreSQLDB.delete_node, write=True)
+    update_node = _delegate(GraphHistoryPostgreSQLDB.update_node, write=True)
+    get_edge_list = _delegate(GraphHistoryPostgreSQLDB.get_edge_list)
+    get_edge = _delegate(GraphHistoryPostgreSQLDB.get_edge)
+    find_edges = _delegate(GraphHistoryPostgreSQLDB.find_edges)
+    create_edge = _delegate(GraphHistoryPostgreSQLDB.create_edge, write=True)
+    delete_edge = _delegate(GraphHistoryPostgreSQLDB.delete_edge, write=True)
+    update_edge = _delegate(GraphHistoryPostgreSQLDB.update_edge, write=True)
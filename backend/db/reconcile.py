@@ -0,0 +1,308 @@
+"""
+Reconciliation of JanusGraph with the graph history in PostgreSQL.
+
+    python -m backend.db.reconcile [--kind node|edge] [--bucket-width N] [--repair]
+
+Both stores are summarised per bucket of IDs (node ID, or edge source ID): a
+bucket holds the number of elements in it and the XOR of their digests, taken
+over a canonical form of their state that both stores can produce. Only the
+buckets whose summaries differ are read back, from both stores, and compared
+element by element. A run therefore reads each store's projected state once,
+and then the mismatching buckets only.
+
+PostgreSQL is the source of truth. With --repair, the fixes are added to the
+graph outbox (see db/outbox.py) and dispatched: differing nodes and differing
+or missing edges are upserted, and elements only found in JanusGraph deleted.
+A node missing from JanusGraph is only reported, as it cannot be recreated
+under its ID, which JanusGraph allocates. Pending outbox calls are dispatched
+before comparing, but writes made during a run may still show up as
+differences; rerun to confirm them.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Protocol
+
+from gremlin_python.process.graph_traversal import __
+from gremlin_python.process.traversal import Direction, P, T
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from backend.config import EDGE_TYPE_PROPS, NODE_TYPE_PROPS
+from backend.db.config import get_engine
+from backend.db.janusgraph import JanusGraphDB
+from backend.db.outbox import OutboxDispatcher, add_to_outbox
+from backend.db.postgresql import GraphHistoryPostgreSQLDB
+from backend.models.fixed import EntityState, GraphHistoryEvent
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+Key = int | tuple[int, int]
+Range = tuple[int, int]  # [lo, hi) of node IDs, or of edge source IDs
+
+KINDS = ("node", "edge")
+
+
+def canonical(type_name: str, props: dict, props_map: dict[str, set[str]]) -> dict:
+    """
+    The state of an element as both stores can tell it: its type and its
+    configured properties, unset ones left out and lists joined with ";" as
+    in JanusGraph.
+    """
+    state = {"type": type_name}
+    for prop in sorted(props_map.get(type_name, ())):
+        value = props.get(prop)
+        if isinstance(value, (list, tuple)):
+            value = ";".join(str(v) for v in value)
+        if value not in (None, ""):
+            state[prop] = value
+    return state
+
+
+def digest(key: Key, state: dict) -> int:
+    data = json.dumps([key, state], sort_keys=True, default=str).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def _bucket(key: Key, width: int) -> int:
+    return (key if isinstance(key, int) else key[0]) // width
+
+
+def summarise(states: Iterable[tuple[Key, dict]], width: int) -> dict[int, tuple]:
+    """Map each bucket to the count and XOR of the digests of its elements."""
+    buckets: dict[int, tuple[int, int]] = {}
+    for key, state in states:
+        bucket = _bucket(key, width)
+        count, acc = buckets.get(bucket, (0, 0))
+        buckets[bucket] = (count + 1, acc ^ digest(key, state))
+    return buckets
+
+
+def _ranges(buckets: list[int], width: int) -> list[Range]:
+    """The ID ranges covering sorted `buckets`, adjacent ones merged."""
+    ranges: list[Range] = []
+    for bucket in buckets:
+        lo, hi = bucket * width, (bucket + 1) * width
+        if ranges and ranges[-1][1] == lo:
+            ranges[-1] = (ranges[-1][0], hi)
+        else:
+            ranges.append((lo, hi))
+    return ranges
+
+
+class Store(Protocol):
+    def states(
+        self, kind: str, ranges: list[Range] | None = None
+    ) -> Iterator[tuple[Key, dict]]:
+        """Canonical states of the nodes or edges, optionally within `ranges`."""
+
+
+@dataclass
+class Diff:
+    kind: str
+    key: Key
+    expected: dict | None  # in PostgreSQL
+    actual: dict | None  # in JanusGraph
+
+    def __str__(self) -> str:
+        if self.actual is None:
+            return f"{self.kind} {self.key}: missing from JanusGraph"
+        if self.expected is None:
+            return f"{self.kind} {self.key}: only in JanusGraph"
+        fields = sorted(
+            f
+            for f in self.expected.keys() | self.actual.keys()
+            if self.expected.get(f) != self.actual.get(f)
+        )
+        return f"{self.kind} {self.key}: differs on {', '.join(fields)}"
+
+
+def compare(source: Store, replica: Store, kind: str, width: int) -> list[Diff]:
+    """Differences between the `kind` elements of two stores, see module doc."""
+    expected = summarise(source.states(kind), width)
+    actual = summarise(replica.states(kind), width)
+    buckets = sorted(
+        b for b in expected.keys() | actual.keys() if expected.get(b) != actual.get(b)
+    )
+    if not buckets:
+        return []
+    logger.info(f"{len(buckets)} of the {kind} buckets differ, comparing them")
+    ranges = _ranges(buckets, width)
+    expected_states = dict(source.states(kind, ranges))
+    actual_states = dict(replica.states(kind, ranges))
+    return [
+        Diff(kind, key, expected_states.get(key), actual_states.get(key))
+        for key in sorted(expected_states.keys() | actual_states.keys())
+        if expected_states.get(key) != actual_states.get(key)
+    ]
+
+
+class PostgreSQLStore:
+    """Latest states from the graph history."""
+
+    _LATEST = {
+        "node": """
+            SELECT DISTINCT ON (node_id) node_id, state, payload
+              FROM {table}
+             WHERE entity_type = 'node' {where}
+             ORDER BY node_id, timestamp DESC
+            """,
+        "edge": """
+            SELECT DISTINCT ON (source_id, target_id)
+                   source_id, target_id, state, payload
+              FROM {table}
+             WHERE entity_type = 'edge' {where}
+             ORDER BY source_id, target_id, timestamp DESC
+            """,
+    }
+
+    def __init__(self, engine: Engine, batch_size: int = 1000):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def states(self, kind, ranges=None):
+        column = "node_id" if kind == "node" else "source_id"
+        where, params = "", {}
+        if ranges is not None:
+            where = (
+                "AND EXISTS (SELECT 1 FROM unnest(CAST(:los AS BIGINT[]), "
+                "CAST(:his AS BIGINT[])) AS r(lo, hi) "
+                f"WHERE {column} >= r.lo AND {column} < r.hi)"
+            )
+            params = {"los": [lo for lo, _ in ranges], "his": [hi for _, hi in ranges]}
+        stmt = text(
+            self._LATEST[kind].format(
+                table=GraphHistoryEvent.__tablename__, where=where
+            )
+        ).execution_options(stream_results=True, yield_per=self.batch_size)
+        with Session(self.engine) as session:
+            for row in session.exec(stmt, params=params):
+                if row.state == EntityState.deleted.name or not row.payload:
+                    continue
+                if kind == "node":
+                    key = row.node_id
+                    type_name, props_map = row.payload.get("node_type"), NODE_TYPE_PROPS
+                else:
+                    key = (row.source_id, row.target_id)
+                    type_name, props_map = row.payload.get("edge_type"), EDGE_TYPE_PROPS
+                yield key, canonical(type_name, row.payload, props_map)
+
+
+class JanusGraphStore:
+    """
+    Current states in JanusGraph, projected with elementMap(). Results of a
+    traversal are received whole, so a pass is paged: the IDs of the nodes
+    (within the ranges, if any) are listed in one scan, then the nodes, or
+    the edges out of them, read by pages of `batch_size` IDs, each page a
+    lookup by ID. A pass thus scans the nodes once, holding their IDs in
+    memory, and then costs a round trip per page, each of a cost set by the
+    page, not by the size of the graph.
+    """
+
+    def __init__(self, graph: JanusGraphDB, batch_size: int = 1000):
+        self.graph = graph
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _node_ids(g, ranges: list[Range] | None) -> list:
+        nodes = g.V()
+        if ranges is not None:
+            nodes = nodes.or_(*(__.has_id(P.between(lo, hi)) for lo, hi in ranges))
+        return nodes.id_().to_list()
+
+    def states(self, kind, ranges=None):
+        with self.graph.connection() as g:
+            ids = self._node_ids(g, ranges)
+            for start in range(0, len(ids), self.batch_size):
+                page = g.V(*ids[start : start + self.batch_size])
+                if kind == "edge":
+                    page = page.out_e()
+                for element in page.element_map():
+                    yield self._state(kind, element)
+
+    @staticmethod
+    def _state(kind: str, element: dict) -> tuple[Key, dict]:
+        if kind == "node":
+            key = element[T.id]
+            # node types were moved from labels to a property
+            type_name = element.get("node_type", element[T.label])
+            props_map = NODE_TYPE_PROPS
+        else:
+            key = (element[Direction.OUT][T.id], element[Direction.IN][T.id])
+            type_name, props_map = element[T.label], EDGE_TYPE_PROPS
+        return key, canonical(type_name, element, props_map)
+
+
+def repair_calls(
+    diffs: list[Diff], history: GraphHistoryPostgreSQLDB
+) -> Iterator[tuple[str, dict]]:
+    """The outbox calls bringing JanusGraph in line with `diffs`."""
+    for diff in diffs:
+        if diff.kind == "node":
+            if diff.expected is None:
+                yield "delete_node", {"node_id": diff.key}
+            elif diff.actual is None:
+                logger.warning(f"Cannot recreate node {diff.key} in JanusGraph")
+            else:
+                yield "update_node", {"node": history.get_node(diff.key)}
+        else:
+            source_id, target_id = diff.key
+            if diff.expected is None:
+                yield "delete_edge", {
+                    "source_id": source_id,
+                    "target_id": target_id,
+                    "edge_type": diff.actual["type"],
+                }
+            else:
+                yield "update_edge", {"edge": history.get_edge(source_id, target_id)}
+
+
+def _drain(dispatcher: OutboxDispatcher) -> None:
+    while dispatcher.dispatch():
+        pass
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--kind", choices=KINDS, action="append")
+    parser.add_argument("--bucket-width", type=int, default=1024)
+    parser.add_argument("--repair", action="store_true")
+    args = parser.parse_args(argv)
+
+    engine = get_engine(settings.POSTGRES_DB_URL)
+    graph = JanusGraphDB(settings.JANUSGRAPH_HOST, settings.TRAVERSAL_SOURCE)
+    dispatcher = OutboxDispatcher(engine, graph)
+    try:
+        _drain(dispatcher)
+        diffs = []
+        for kind in args.kind or KINDS:
+            diffs += compare(
+                PostgreSQLStore(engine), JanusGraphStore(graph), kind, args.bucket_width
+            )
+        for diff in diffs:
+            print(diff)
+        print(f"{len(diffs)} differences")
+        if args.repair and diffs:
+            history = GraphHistoryPostgreSQLDB(settings.POSTGRES_DB_URL)
+            with Session(engine) as session:
+                queued = 0
+                for operation, payload in repair_calls(diffs, history):
+                    add_to_outbox(operation, payload, session)
+                    queued += 1
+                session.commit()
+            _drain(dispatcher)
+            print(f"Queued and dispatched {queued} repairs")
+        elif diffs:
+            sys.exit(1)
+    finally:
+        graph.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Maintenance of the time-bucketed rating rollups.
+
+    python -m backend.db.rollups backfill [--poll LABEL]
+    python -m backend.db.rollups prune
+
+`backfill` rebuilds the rollups from the rating log, e.g. after deploying them
+on an existing database; `prune` drops hourly rollups past their retention and
+is meant to run daily.
+"""
+
+import argparse
+import logging
+
+from backend.db.postgresql import RatingHistoryPostgreSQLDB
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="rebuild rollups from events")
+    backfill.add_argument("--poll", help="only rebuild this poll's rollups")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    commands.add_parser("prune", help="drop expired hourly rollups")
+    args = parser.parse_args(argv)
+
+    db = RatingHistoryPostgreSQLDB(settings.POSTGRES_DB_URL)
+    if args.command == "backfill":
+        written = db.backfill_rating_rollups(args.poll, batch_size=args.batch_size)
+        print(f"Wrote {written} rollups")
+    pruned = db.prune_rating_rollups()
+    print(f"Pruned {pruned} hourly rollups")
+
+
+if __name__ == "__main__":
+    main()
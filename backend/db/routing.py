@@ -0,0 +1,266 @@
+"""
+Read-replica routing.
+
+Repository methods marked `read_only` open their sessions on a healthy replica
+from POSTGRES_REPLICA_URLS, taken round-robin; every other method, and every
+read nested in one, uses the primary. Replicas are checked in the background
+every DB_REPLICA_CHECK_SECONDS, and dropped while unreachable or lagging by
+more than DB_REPLICA_MAX_LAG_SECONDS.
+
+A client that has just written is pinned to the primary for
+READ_YOUR_WRITES_SECONDS so it reads its own writes: write responses carry a
+short-lived token, as a cookie and a header, which the client sends back.
+
+Within a request (see `one_replica`), every read goes to the replica the first
+one went to, so that each sees the history at least as recent as those
+before it: e.g. a graph response is never older than the generation it is
+tagged with. The primary, always ahead, stands in for a replica going down.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable
+
+from fastapi import Request
+from sqlalchemy import text
+
+from backend.db.config import get_engine
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+READ_PRIMARY_COOKIE = "read_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+PRIMARY = "primary"
+REPLICA = "replica"
+
+# where the outermost repository call in progress sends its sessions
+_route: ContextVar[str | None] = ContextVar("db_route", default=None)
+# whether the current request must read from the primary
+_pinned: ContextVar[bool] = ContextVar("db_pinned", default=False)
+# the replica the reads of the current request stick to, once the first picked
+# it (None for the primary); a list, shared by the tasks and threads it spawns
+_replica: ContextVar[list | None] = ContextVar("db_replica", default=None)
+
+_LAG_SQL = text(
+    """
+    SELECT CASE
+             WHEN NOT pg_is_in_recovery() THEN NULL
+             WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+           END
+    """
+)
+
+
+def read_only(method: Callable) -> Callable:
+    """Mark a repository method as safe to serve from a replica."""
+    method._read_only = True
+    return method
+
+
+def routed(method: Callable) -> Callable:
+    """Route the sessions opened by `method`, unless a caller already does."""
+    route = REPLICA if getattr(method, "_read_only", False) else PRIMARY
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        if _route.get() is not None:
+            return method(*args, **kwargs)
+        token = _route.set(route)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _route.reset(token)
+
+    return wrapper
+
+
+def probe_lag(url: str) -> float | None:
+    """Seconds `url` lags behind its primary, or None if it is not a replica."""
+    with get_engine(url, create_tables=False).connect() as conn:
+        lag = conn.execute(_LAG_SQL).scalar()
+    return None if lag is None else float(lag)
+
+
+class ReplicaSet:
+    """Round-robin over the replicas that passed their last health check."""
+
+    def __init__(
+        self,
+        urls: list[str],
+        probe: Callable[[str], float | None] = probe_lag,
+        max_lag: float = 10,
+    ):
+        self.urls = list(urls)
+        self.probe = probe
+        self.max_lag = max_lag
+        # replicas are only used once they have passed a check
+        self._healthy: list[str] = []
+        self._cycle = itertools.cycle(())
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _set_healthy(self, healthy: list[str]) -> None:
+        with self._lock:
+            if healthy != self._healthy:
+                logger.info(f"Healthy read replicas: {len(healthy)}/{len(self.urls)}")
+                self._healthy = healthy
+                self._cycle = itertools.cycle(healthy)
+
+    def check(self) -> None:
+        """Probe every replica once."""
+        healthy = []
+        for url in self.urls:
+            try:
+                lag = self.probe(url)
+            except Exception as e:
+                logger.warning(f"Read replica unreachable: {e}")
+                continue
+            if lag is None:
+                logger.warning("Read replica is not in recovery, ignoring it")
+            elif lag > self.max_lag:
+                logger.warning(f"Read replica lags by {lag:.1f}s, skipping it")
+            else:
+                healthy.append(url)
+        self._set_healthy(healthy)
+
+    def mark_down(self, url: str) -> None:
+        """Stop using `url` until it passes the next check."""
+        with self._lock:
+            healthy = [u for u in self._healthy if u != url]
+        self._set_healthy(healthy)
+
+    def pick(self) -> str | None:
+        with self._lock:
+            return next(self._cycle, None)
+
+    def is_healthy(self, url: str) -> bool:
+        with self._lock:
+            return url in self._healthy
+
+    def start(self, interval: float) -> None:
+        def loop():
+            while not self._stop.is_set():
+                self.check()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="replica-check", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_replicas: ReplicaSet | None = None
+_replicas_lock = threading.Lock()
+
+
+def replicas() -> ReplicaSet | None:
+    """The replica set of this worker, checked in the background; None if unset."""
+    global _replicas
+    if _replicas is None and settings.POSTGRES_REPLICA_URLS:
+        with _replicas_lock:
+            if _replicas is None:
+                replica_set = ReplicaSet(
+                    settings.POSTGRES_REPLICA_URLS,
+                    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+                )
+                replica_set.start(settings.DB_REPLICA_CHECK_SECONDS)
+                _replicas = replica_set
+    return _replicas
+
+
+def close_replicas() -> None:
+    global _replicas
+    if _replicas is not None:
+        _replicas.stop()
+        _replicas = None
+
+
+def replica_url(read_only: bool | None = None) -> str | None:
+    """
+    The replica the session about to be opened should use, if any. By default
+    the session is read-only when the outermost repository call is.
+    """
+    if read_only is None:
+        read_only = _route.get() == REPLICA
+    if not read_only or _pinned.get():
+        return None
+    replica_set = replicas()
+    if replica_set is None:
+        return None
+    stuck = _replica.get()
+    if stuck is None:
+        return replica_set.pick()
+    if not stuck:
+        stuck.append(replica_set.pick())
+    elif stuck[0] is not None and not replica_set.is_healthy(stuck[0]):
+        stuck[0] = None  # never back from the primary to a replica
+    return stuck[0]
+
+
+@contextmanager
+def one_replica():
+    """Send the replica reads within, those of a request, to a single replica."""
+    if _replica.get() is not None:
+        yield
+        return
+    token = _replica.set([])
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def pinned() -> bool:
+    """Whether the current request must read its own writes, from the primary."""
+    return _pinned.get()
+
+
+def _pinned_until(value: str | None) -> bool:
+    """Whether a read-your-writes token is still valid; it holds its expiry."""
+    try:
+        until = float(value)
+    except (TypeError, ValueError):
+        return False
+    now = time.time()
+    # tokens further in the future than one window were not issued by us
+    return now < until <= now + settings.READ_YOUR_WRITES_SECONDS
+
+
+async def read_your_writes(request: Request, call_next):
+    """
+    Middleware pinning a request to the primary when it writes or when its
+    client wrote recently, else to one replica, and issuing after writes the
+    token pinning the next ones.
+    """
+    writes = request.method not in SAFE_METHODS
+    token = request.headers.get(READ_PRIMARY_HEADER) or request.cookies.get(
+        READ_PRIMARY_COOKIE
+    )
+    pinned = _pinned.set(writes or _pinned_until(token))
+    try:
+        with one_replica():
+            response = await call_next(request)
+    finally:
+        _pinned.reset(pinned)
+    if writes and response.status_code < 400 and settings.POSTGRES_REPLICA_URLS:
+        until = f"{time.time() + settings.READ_YOUR_WRITES_SECONDS:.3f}"
+        response.headers[READ_PRIMARY_HEADER] = until
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            until,
+            max_age=settings.READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+    return response
@@ -0,0 +1,124 @@
+"""
+Binary snapshots of the in-memory graph, shared by the workers of a host.
+
+With MEMORY_GRAPH_SNAPSHOT_DIR, the arrays of the in-memory graph (see
+db/memory.py) are written to a file per generation, which every worker maps
+read-only: the pages are those of the page cache, held once whatever the
+number of workers, and a new worker maps the latest snapshot rather than
+replaying the history.
+
+A file holds the magic bytes, the length of a JSON header, the header, then
+the arrays, each 8-byte aligned, as the header lists them: name, typecode,
+offset and length. `current` holds the latest generation; it is replaced
+atomically once its snapshot is written, and workers swap to a snapshot as
+they see its generation there. One worker at a time, holding `lock`,
+refreshes the graph from the history and writes the next generation.
+"""
+
+import fcntl
+import json
+import mmap
+import os
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+MAGIC = b"CGGRAPH1"
+_ALIGN = 8
+# previous generations kept, for workers still swapping from them
+_KEEP = 2
+
+
+def _pad(size: int) -> int:
+    return -size % _ALIGN
+
+
+def write(path: Path, sections: dict, meta: dict) -> None:
+    """Write the arrays of `sections`, and `meta`, to `path` atomically."""
+    views = {name: memoryview(section) for name, section in sections.items()}
+    table, offset = {}, 0
+    for name, view in views.items():
+        table[name] = [view.format, offset, len(view)]
+        offset += view.nbytes + _pad(view.nbytes)
+    header = json.dumps({"meta": meta, "sections": table}).encode()
+    start = len(MAGIC) + 4 + len(header)
+    start += _pad(start)
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(4, "little"))
+        f.write(header)
+        f.write(bytes(start - f.tell()))
+        for view in views.values():
+            f.write(view)
+            f.write(bytes(_pad(view.nbytes)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read(path: Path) -> tuple[dict, dict]:
+    """Map the snapshot at `path`; return its arrays, as memoryviews, and meta."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"Not a graph snapshot: {path}")
+    size = int.from_bytes(buffer[len(MAGIC) : len(MAGIC) + 4], "little")
+    header = json.loads(buffer[len(MAGIC) + 4 : len(MAGIC) + 4 + size])
+    start = len(MAGIC) + 4 + size
+    start += _pad(start)
+    view = memoryview(buffer)
+    sections = {}
+    for name, (typecode, offset, length) in header["sections"].items():
+        itemsize = array(typecode).itemsize
+        section = view[start + offset : start + offset + length * itemsize]
+        sections[name] = section if typecode == "B" else section.cast(typecode)
+    return sections, header["meta"]
+
+
+class SnapshotStore:
+    """The snapshots of a directory, by generation."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, generation: int) -> Path:
+        return self.directory / f"graph-{generation}.snapshot"
+
+    def generation(self) -> int:
+        """The latest generation, 0 if none was written."""
+        try:
+            return int((self.directory / "current").read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def read(self, generation: int) -> tuple[dict, dict]:
+        return read(self.path(generation))
+
+    def write(self, sections: dict, meta: dict) -> int:
+        """Write the next generation, publish it, and return it."""
+        generation = self.generation() + 1
+        write(self.path(generation), sections, {**meta, "generation": generation})
+        tmp = self.directory / "current.tmp"
+        tmp.write_text(str(generation))
+        os.replace(tmp, self.directory / "current")
+        for old in self.directory.glob("graph-*.snapshot"):
+            if int(old.stem.split("-")[1]) <= generation - _KEEP:
+                old.unlink(missing_ok=True)  # mapped files stay readable
+        return generation
+
+    @contextmanager
+    def lock(self):
+        """Yield whether this process holds the writer lock, without waiting."""
+        with open(self.directory / "lock", "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
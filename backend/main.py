@@ -4,7 +4,7 @@ import json
 import random
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.version import __version__
@@ -17,6 +17,8 @@ from backend.api.graph import router as graph_router
 from backend.api.schema import router as schema_router
 from backend.api.scopes import router as scopes_router
 from backend.api.tags import router as tags_router
+from backend.api.polls import router as polls_router
+from backend.api.ratings import router as ratings_router
 from backend.config import (
     PLATFORM_DESCRIPTION,
     PLATFORM_NAME,
@@ -32,8 +34,17 @@ from backend.config import (
 )
 from backend.utils.permissions import get_permission_summary
 from backend.models.fixed import UserRead
-from backend.db.postgresql import UserPostgreSQLDB
+from backend.db.connections import (
+    init_services,
+    close_services,
+    close_async_services,
+    get_user_db,
+    run_db,
+)
+from backend.db.routing import READ_PRIMARY_HEADER, read_your_writes
 from backend.utils.security import hash_password
+from backend.utils.metrics import metrics
+from backend.utils.responses import ModelResponse, etag, not_modified
 from backend.models.fixed import UserCreate
 
 logger = logging.getLogger(__name__)
@@ -42,14 +53,18 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- startup ---
+    # create the shared repositories and their connection pools
+    init_services()
+
     # seed the initial admin if needed
     admin_user = settings.INITIAL_ADMIN_USER
     admin_pw = settings.INITIAL_ADMIN_PASSWORD
     if admin_user and admin_pw:
-        db = UserPostgreSQLDB(settings.POSTGRES_DB_URL)
-        if not db.get_user(admin_user):
+        db = get_user_db()
+        if not await run_db(db.get_user, admin_user):
             logger.info(f"Creating initial super admin user: {admin_user}")
-            db.create_user(
+            await run_db(
+                db.create_user,
                 UserCreate(
                     username=admin_user,
                     password=admin_pw,
@@ -58,20 +73,19 @@ async def lifespan(app: FastAPI):
                     is_super_admin=True,  # First user gets super admin privileges
                     security_question=None,
                     security_answer=None,
-                )
+                ),
             )
             logger.info(f"Initial super admin user created successfully: {admin_user}")
         else:
             logger.info(f"Initial admin user already exists: {admin_user}")
 
     # Initialize schema in database
-    from backend.db.connections import get_graph_history_db
+    from backend.db.config import get_engine
     from backend.schema_manager import SchemaManager
     from sqlmodel import Session
 
     try:
-        graph_db = get_graph_history_db()
-        with Session(graph_db.engine) as session:
+        with Session(get_engine(settings.POSTGRES_DB_URL)) as session:
             manager = SchemaManager(session)
             manager.ensure_schema_in_db("system")
             logger.info("Schema initialized in database")
@@ -80,6 +94,10 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    # --- shutdown ---
+    close_services()
+    await close_async_services()
+
 
 app = FastAPI(title="CommonGraph API", version=__version__, lifespan=lifespan)
 
@@ -89,7 +107,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[READ_PRIMARY_HEADER],
 )
+# pins clients to the primary database right after their writes
+app.middleware("http")(read_your_writes)
 
 app.include_router(auth_router)
 app.include_router(users_router)
@@ -99,6 +120,8 @@ app.include_router(graph_router)
 app.include_router(schema_router)
 app.include_router(scopes_router)
 app.include_router(tags_router)
+app.include_router(polls_router)
+app.include_router(ratings_router)
 
 
 @app.get("/")
@@ -106,11 +129,25 @@ async def root():
     return {"message": "CommonGraph API", "version": __version__}
 
 
+@app.get("/metrics")
+def get_metrics(current_user: UserRead = Depends(get_current_user)):
+    """Admin-only: this worker's counters, gauges and timings."""
+    if not current_user.is_admin and not current_user.is_super_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return metrics.snapshot()
+
+
 @app.get("/config")
-def get_config(current_user: UserRead = Depends(get_current_user)):
+def get_config(request: Request, current_user: UserRead = Depends(get_current_user)):
     # Here we combine both properties and styles for each type.
     from backend.config import get_current_config_version, get_current_config_hash
 
+    schema_hash = get_current_config_hash()
+    permissions = get_permission_summary(current_user)
+    tag = etag(schema_hash, permissions)
+    if (response := not_modified(request, tag)) is not None:
+        return response
+
     node_types = {
         nt: {
             "properties": list(props),
@@ -130,16 +167,17 @@ def get_config(current_user: UserRead = Depends(get_current_user)):
     }
     from backend.config import ALLOW_SIGNUP, SIGNUP_REQUIRES_TOKEN
 
-    return {
+    config = {
         "platform_name": PLATFORM_NAME,
         "platform_tagline": PLATFORM_TAGLINE,
         "platform_description": PLATFORM_DESCRIPTION,
         "node_types": node_types,
         "edge_types": edge_types,
         "schema_version": get_current_config_version(),
-        "schema_hash": get_current_config_hash(),
-        "permissions": get_permission_summary(current_user),
+        "schema_hash": schema_hash,
+        "permissions": permissions,
         "allow_signup": ALLOW_SIGNUP,
         "signup_requires_token": SIGNUP_REQUIRES_TOKEN,
         "license": LICENSE,
     }
+    return ModelResponse(config, request, tag)
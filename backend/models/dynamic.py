@@ -1,8 +1,9 @@
 import datetime
 import logging
-from typing import Any, Dict, Type, Union
+from enum import Enum
+from typing import Annotated, Any, Dict, Literal, Type, Union, get_args
 
-from pydantic import create_model, Field
+from pydantic import create_model, Field, TypeAdapter
 from sqlmodel import SQLModel
 
 from backend.models.base import NodeBase, EdgeBase, SubgraphBase, GraphExportBase
@@ -23,7 +24,8 @@ def _make_dynamic(
         for f, md in base.model_fields.items():
             anno = md.annotation
             if f in ["node_type", "edge_type"]:
-                fields[f] = (anno, type_name)
+                # a literal, for unions of these models to be tagged by it
+                fields[f] = (Literal[type_name], type_name)
             elif f in allowed:
                 raise ValueError(f"{f} is reserved and cannot be dynamically set.")
             else:
@@ -60,8 +62,64 @@ logger.debug(f"Dynamic node models: {NodeTypeModels}")
 logger.debug(f"Dynamic edge models: {EdgeTypeModels}")
 
 
-DynamicNode = Union[tuple(NodeTypeModels.values())]
-DynamicEdge = Union[tuple(EdgeTypeModels.values())]
+def _tagged_union(models: Dict[str, Type[SQLModel]], tag: str) -> Any:
+    """
+    The union of `models`, validated as the model named by the `tag` field
+    of the value rather than by trying each model in turn.
+    """
+    members = tuple(models.values())
+    if len(members) == 1:
+        return members[0]
+    return Annotated[Union[members], Field(discriminator=tag)]
+
+
+DynamicNode = _tagged_union(NodeTypeModels, "node_type")
+DynamicEdge = _tagged_union(EdgeTypeModels, "edge_type")
+
+# built once: a TypeAdapter compiles its validator when created
+DynamicNodeAdapter = TypeAdapter(DynamicNode)
+DynamicEdgeAdapter = TypeAdapter(DynamicEdge)
+
+
+def _enum_fields(Model: Type[SQLModel]) -> Dict[str, Type[Enum]]:
+    return {
+        name: arg
+        for name, info in Model.model_fields.items()
+        for arg in (info.annotation, *get_args(info.annotation))
+        if isinstance(arg, type) and issubclass(arg, Enum)
+    }
+
+
+_ENUM_FIELDS = {
+    Model: _enum_fields(Model)
+    for Model in (*NodeTypeModels.values(), *EdgeTypeModels.values())
+}
+
+
+def _construct(models: Dict[str, Type[SQLModel]], base, payload: dict, tag: str):
+    Model = models.get(payload.get(tag))
+    if Model is None:  # a type no longer configured
+        return base.model_validate(payload)
+    enums = _ENUM_FIELDS[Model]
+    data = {}
+    for name, value in payload.items():
+        if name in Model.model_fields:
+            enum = enums.get(name)
+            data[name] = value if enum is None or value is None else enum(value)
+    return Model.model_construct(**data)
+
+
+def construct_node(payload: dict) -> NodeBase:
+    """
+    The node of a payload the backend stored itself, hence validated already,
+    built without validating it again. Only enums are converted back.
+    """
+    return _construct(NodeTypeModels, NodeBase, payload, "node_type")
+
+
+def construct_edge(payload: dict) -> EdgeBase:
+    """The edge of a payload the backend stored itself, as construct_node."""
+    return _construct(EdgeTypeModels, EdgeBase, payload, "edge_type")
 
 
 class DynamicSubgraph(SubgraphBase):
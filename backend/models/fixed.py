@@ -3,7 +3,7 @@ from typing import Annotated, Any, Dict
 from enum import Enum
 
 from pydantic import model_validator
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, BigInteger, Column, Index, event, text
 from sqlmodel import Field, SQLModel
 
 from backend.config import SIGNUP_REQUIRES_ADMIN_APPROVAL
@@ -52,6 +52,10 @@ class User(SQLModel, table=True):
         default=False,
         description="Super admin user with permanent admin rights that cannot be revoked",
     )
+    token_version: int = Field(
+        default=0,
+        description="Bumped on role changes; access tokens of older versions are refused",
+    )
 
 
 class UserRead(SQLModel):
@@ -92,6 +96,11 @@ class EntityType(str, Enum):
 
 
 class GraphHistoryEvent(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ix_graphhistoryevent_node_timestamp", "entity_type", "node_id", "timestamp"
+        ),
+    )
     event_id: int | None = Field(default=None, primary_key=True)
     timestamp: datetime.datetime = Field(
         default_factory=lambda: datetime.datetime.now(datetime.timezone.utc),
@@ -206,7 +215,19 @@ class SignupTokenCreate(SQLModel):
 class RatingEvent(SQLModel, table=True):
     """RatingEvent model"""
 
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index(
+            "ix_ratingevent_user_entity",
+            "username",
+            "entity_type",
+            "node_id",
+            "source_id",
+            "target_id",
+            "poll_label",
+            "timestamp",
+        ),
+        {"extend_existing": True},
+    )
     event_id: int | None = Field(default=None, primary_key=True)
     entity_type: EntityType = Field(..., description="Type of entity (node or edge)")
     node_id: NodeId | None = Field(..., description="ID of the node")
@@ -235,3 +256,166 @@ class RatingEvent(SQLModel, table=True):
                 "For entity_type 'edge', both source_id and target_id must be provided."
             )
         return values
+
+
+class RatingAggregate(SQLModel, table=True):
+    """
+    Aggregate over each user's latest rating for one entity and poll.
+    Maintained on every logged rating so that rankings never scan raw events.
+    """
+
+    __table_args__ = (
+        Index("ix_ratingaggregate_rank", "poll_label", "entity_type", "value", "count"),
+        {"extend_existing": True},
+    )
+    poll_label: str = Field(primary_key=True, description="Label of the poll")
+    entity_type: EntityType = Field(
+        primary_key=True, description="Type of entity (node or edge)"
+    )
+    entity_key: str = Field(
+        primary_key=True, description="Node ID, or 'source-target' for edges"
+    )
+    node_id: NodeId | None = Field(None, description="ID of the node")
+    source_id: NodeId | None = Field(None, description="Edge's source node ID")
+    target_id: NodeId | None = Field(None, description="Edge's target node ID")
+    value: float | None = Field(
+        None, description="Aggregate following the poll's configured aggregation"
+    )
+    median: float | None = Field(None, description="Median of the latest ratings")
+    mean: float | None = Field(None, description="Mean of the latest ratings")
+    count: int = Field(0, description="Number of users with a rating")
+    updated_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc),
+        description="When this aggregate was last recomputed",
+    )
+
+
+class RollupBucket(str, Enum):
+    hour = "hour"
+    day = "day"
+
+
+class RatingRollup(SQLModel, table=True):
+    """
+    Aggregate over each user's latest rating for one entity and poll as of the
+    end of a time bucket. Only buckets in which a rating was logged are stored;
+    the value of any other bucket is that of the closest earlier one.
+    """
+
+    __table_args__ = {"extend_existing": True}
+    poll_label: str = Field(primary_key=True, description="Label of the poll")
+    entity_type: EntityType = Field(
+        primary_key=True, description="Type of entity (node or edge)"
+    )
+    entity_key: str = Field(
+        primary_key=True, description="Node ID, or 'source-target' for edges"
+    )
+    bucket: RollupBucket = Field(primary_key=True, description="Bucket granularity")
+    bucket_start: datetime.datetime = Field(
+        primary_key=True, description="Start of the bucket (UTC)"
+    )
+    node_id: NodeId | None = Field(None, description="ID of the node")
+    source_id: NodeId | None = Field(None, description="Edge's source node ID")
+    target_id: NodeId | None = Field(None, description="Edge's target node ID")
+    value: float | None = Field(
+        None, description="Aggregate following the poll's configured aggregation"
+    )
+    median: float | None = Field(None, description="Median of the latest ratings")
+    mean: float | None = Field(None, description="Mean of the latest ratings")
+    count: int = Field(0, description="Number of users with a rating")
+
+
+class GraphOutbox(SQLModel, table=True):
+    """
+    A change to apply to the graph database, written in the same transaction
+    as the history events it mirrors and dispatched in order, see db/outbox.py.
+    """
+
+    __table_args__ = (
+        Index(
+            "ix_graphoutbox_pending",
+            "outbox_id",
+            postgresql_where=text("dispatched_at IS NULL AND failed_at IS NULL"),
+        ),
+        Index("ix_graphoutbox_dispatched_at", "dispatched_at"),
+        {"extend_existing": True},
+    )
+    outbox_id: int | None = Field(default=None, primary_key=True)
+    operation: str = Field(..., description="GraphDatabaseInterface method to call")
+    payload: dict = Field(
+        default_factory=dict,
+        sa_column=Column(JSON),
+        description="Arguments of the call",
+    )
+    created_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc),
+        description="When the change was committed",
+    )
+    attempts: int = Field(0, description="Number of failed attempts so far")
+    next_attempt_at: datetime.datetime | None = Field(
+        None, description="Not retried before this, after a failed attempt"
+    )
+    last_error: str | None = Field(None, description="Error of the last attempt")
+    dispatched_at: datetime.datetime | None = Field(
+        None, description="When the change was applied to the graph database"
+    )
+    failed_at: datetime.datetime | None = Field(
+        None, description="When the change was given up on"
+    )
+
+
+class GraphGeneration(SQLModel, table=True):
+    """
+    The generation of the graph: a counter of the transactions which wrote
+    graph history events, bumped once by each as it commits, by a deferred
+    trigger. Each holds the row from its bump until its commit, so that
+    generations follow the order of commits, unlike event IDs, which are
+    allocated before. Writers thus only queue for the row while committing,
+    not from their first event on, at the cost of a trigger call per event
+    written, queued until commit.
+    """
+
+    id: int = Field(1, primary_key=True)
+    generation: int = Field(0, description="Transactions which wrote the history")
+    xact: int | None = Field(
+        None,
+        sa_column=Column(BigInteger),
+        description="Transaction which last bumped the generation",
+    )
+
+
+GRAPH_GENERATION_TRIGGER = (
+    """
+    CREATE OR REPLACE FUNCTION bump_graph_generation() RETURNS trigger AS $$
+    BEGIN
+        UPDATE graphgeneration
+           SET generation = generation + 1, xact = txid_current()
+         WHERE xact IS DISTINCT FROM txid_current();
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # constraint triggers cannot be replaced, nor fire on TRUNCATE
+    "DROP TRIGGER IF EXISTS graphhistoryevent_generation ON graphhistoryevent",
+    """
+    CREATE CONSTRAINT TRIGGER graphhistoryevent_generation
+        AFTER INSERT OR UPDATE OR DELETE ON graphhistoryevent
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION bump_graph_generation()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER graphhistoryevent_generation_truncate
+        AFTER TRUNCATE ON graphhistoryevent
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_graph_generation()
+    """,
+    "INSERT INTO graphgeneration (id, generation) VALUES (1, 0) ON CONFLICT DO NOTHING",
+)
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _create_generation_trigger(metadata, connection, tables=(), **kwargs):
+    """Install the triggers along with the tables they join, when created."""
+    names = {GraphHistoryEvent.__tablename__, GraphGeneration.__tablename__}
+    if connection.dialect.name == "postgresql" and names & {t.name for t in tables}:
+        for statement in GRAPH_GENERATION_TRIGGER:
+            connection.exec_driver_sql(statement)
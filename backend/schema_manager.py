@@ -15,6 +15,7 @@ from backend.config import (
     get_current_config_hash,
     get_current_config_version,
 )
+from backend.db.janusgraph_schema import bootstrap_in_background
 
 
 class SchemaManager:
@@ -103,6 +104,8 @@ class SchemaManager:
             self.session.add(migration)
 
         self.session.commit()
+        # create the JanusGraph keys and index keys of new properties
+        bootstrap_in_background(changes)
         return new_schema
 
     def get_schema_history(self) -> List[GraphSchema]:
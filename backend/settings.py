@@ -14,6 +14,61 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS_RAW: str = ""
     INITIAL_ADMIN_USER: str
     INITIAL_ADMIN_PASSWORD: str
+    # SQLAlchemy connection pool, per engine and worker process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    # serve the repositories through asyncpg on the event loop instead of
+    # psycopg2 in the threadpool
+    DB_ASYNC: bool = False
+    # comma-separated read replicas of POSTGRES_DB_URL: read-only repository
+    # methods are spread over those healthy and at most
+    # DB_REPLICA_MAX_LAG_SECONDS behind, as of the last check
+    POSTGRES_REPLICA_URLS_RAW: str = ""
+    DB_REPLICA_CHECK_SECONDS: int = 5
+    DB_REPLICA_MAX_LAG_SECONDS: float = 10
+    # after a write, the client's reads stay on the primary this long
+    READ_YOUR_WRITES_SECONDS: int = 15
+    JANUSGRAPH_POOL_SIZE: int = 4
+    # writes reach JanusGraph through an outbox table, dispatched in order by
+    # a background thread, see db/outbox.py
+    GRAPH_OUTBOX_BATCH_SIZE: int = 100
+    GRAPH_OUTBOX_POLL_SECONDS: float = 1
+    GRAPH_OUTBOX_MAX_ATTEMPTS: int = 10
+    GRAPH_OUTBOX_RETENTION_DAYS: int = 7
+    # write endpoints wait up to this long for their change to reach
+    # JanusGraph, so that reads served from there see it; 0 to not wait
+    GRAPH_OUTBOX_WAIT_SECONDS: float = 0
+    # without JanusGraph, serve graph reads from a copy of the graph held by
+    # each worker, refreshed from the history this often, see db/memory.py
+    IN_MEMORY_GRAPH_DB: bool = False
+    MEMORY_GRAPH_REFRESH_SECONDS: float = 1
+    # directory where the workers of a host share the in-memory graph as
+    # mmap-ed snapshots, see db/snapshot.py; empty for a copy per worker
+    MEMORY_GRAPH_SNAPSHOT_DIR: str = ""
+    # graph responses at least this large are sent gzip- or brotli-encoded
+    # to clients accepting it
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    # graph reads cached by the latest history event, per worker within at
+    # most GRAPH_CACHE_MAX_BYTES (0 for none) and in the redis at
+    # GRAPH_CACHE_URL if set, see db/cache.py
+    GRAPH_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    GRAPH_CACHE_MAX_ENTRIES: int = 1024
+    GRAPH_CACHE_TTL_SECONDS: float = 60
+    GRAPH_CACHE_URL: str = ""
+    # most nodes and edges /nodes/subgraph returns, search results first
+    SEARCH_SUBGRAPH_MAX_ELEMENTS: int = 5000
+    # hourly rating rollups are kept this many days; daily ones forever
+    RATING_ROLLUP_HOURLY_RETENTION_DAYS: int = 7
+    # per-worker cache of authenticated users; role changes made on another
+    # worker are seen after at most USER_CACHE_TTL_SECONDS
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL_SECONDS: int = 30
+    # bcrypt work factor, and the pool password hashing is confined to
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 16
 
     @property
     def ALLOWED_ORIGINS(self) -> List[str]:
@@ -25,6 +80,14 @@ class Settings(BaseSettings):
             if origin.strip()
         ]
 
+    @property
+    def POSTGRES_REPLICA_URLS(self) -> List[str]:
+        return [
+            url.strip()
+            for url in self.POSTGRES_REPLICA_URLS_RAW.split(",")
+            if url.strip()
+        ]
+
     # Pydantic v2 configuration using model_config
     model_config = SettingsConfigDict(
         # Allow extra fields from .env that aren't defined in Settings
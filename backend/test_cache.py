@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+from pydantic_core import to_json
+
+from backend.config import valid_node_types
+from backend.db import routing
+from backend.db.cache import CachedGraphHistoryDB
+from backend.db.routing import ReplicaSet, read_only, replica_url, routed
+from backend.models.dynamic import DynamicSubgraph, construct_node
+from backend.utils.cache import LRUCache, SharedCache
+from backend.utils.metrics import metrics
+
+NODE_TYPE = sorted(valid_node_types())[0]
+
+
+class FakeHistory:
+    """Counts the subgraphs it builds, of the graph of `generation`."""
+
+    def __init__(self):
+        self.generation = 1
+        self.calls = 0
+
+    def get_generation(self):
+        return self.generation
+
+    def get_induced_subgraph(self, node_id, levels=2):
+        self.calls += 1
+        node = construct_node(
+            {"node_id": node_id, "node_type": NODE_TYPE, "title": "x" * levels}
+        )
+        return DynamicSubgraph(nodes=[node], edges=[])
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: []
+
+
+class AsyncFakeHistory(FakeHistory):
+    async def get_generation(self):
+        return self.generation
+
+    async def get_induced_subgraph(self, node_id, levels=2):
+        return FakeHistory.get_induced_subgraph(self, node_id, levels)
+
+
+class FakeRedis(dict):
+    """Local stand-in for a redis client."""
+
+    def set(self, key, value, ex=None):
+        self[key] = value
+
+
+def counter(name: str) -> float:
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+def test_reads_are_cached_until_the_next_write():
+    history = FakeHistory()
+    db = CachedGraphHistoryDB(history, LRUCache(max_bytes=1 << 20))
+    hits, misses = counter("graph_cache.hits"), counter("graph_cache.misses")
+
+    first = db.get_induced_subgraph(1, levels=2)
+    assert db.get_induced_subgraph(1, levels=2) == first
+    assert db.get_induced_subgraph(1, levels=2) is not first  # a fresh copy
+    db.get_induced_subgraph(1, levels=3)
+    assert history.calls == 2
+    history.generation = 2
+    db.get_induced_subgraph(1, levels=2)
+    assert history.calls == 3
+
+    assert counter("graph_cache.hits") - hits == 2
+    assert counter("graph_cache.misses") - misses == 3
+    assert metrics.snapshot()["gauges"]["graph_cache.bytes"] == db.local.nbytes
+
+
+def test_memory_cap_evicts_least_recently_used():
+    history = FakeHistory()
+    size = len(to_json(history.get_induced_subgraph(1)))
+    cache = LRUCache(max_bytes=2 * size + size // 2)
+    db = CachedGraphHistoryDB(history, cache)
+    for node_id in (1, 2, 1, 3):
+        db.get_induced_subgraph(node_id)
+    assert len(cache) == 2 and cache.nbytes <= cache.max_bytes
+    history.calls = 0
+    db.get_induced_subgraph(1)
+    db.get_induced_subgraph(2)  # evicted by 3
+    assert history.calls == 1
+
+
+def test_shared_cache_serves_other_workers():
+    redis = FakeRedis()
+    history = AsyncFakeHistory()
+    workers = [
+        CachedGraphHistoryDB(history, LRUCache(max_bytes=1 << 20), SharedCache(redis))
+        for _ in range(2)
+    ]
+    first = asyncio.run(workers[0].get_induced_subgraph(7))
+    assert asyncio.run(workers[1].get_induced_subgraph(7)) == first
+    assert history.calls == 1 and len(redis) == 1
+    (value,) = redis.values()
+    assert json.loads(value)["nodes"][0]["node_id"] == 7  # JSON, not a pickle
+
+
+class LaggingHistory(FakeHistory):
+    """A history whose replicas are at different generations."""
+
+    generations = {None: 3, "r1": 3, "r2": 2}
+
+    @routed
+    @read_only
+    def get_generation(self):
+        return self.generations[replica_url()]
+
+    @routed
+    @read_only
+    def get_induced_subgraph(self, node_id, levels=2):
+        return FakeHistory.get_induced_subgraph(
+            self, node_id, self.generations[replica_url()]
+        )
+
+
+def test_entries_are_read_from_the_replica_of_their_generation(monkeypatch):
+    replica_set = ReplicaSet(["r1", "r2"], probe=lambda url: 0)
+    replica_set.check()
+    monkeypatch.setattr(routing, "_replicas", replica_set)
+    redis = FakeRedis()
+    db = CachedGraphHistoryDB(
+        LaggingHistory(), LRUCache(max_bytes=1 << 20), SharedCache(redis)
+    )
+    for _ in range(4):  # round robin would alternate replicas
+        db.get_induced_subgraph(1)
+    for key, value in redis.items():
+        generation = int(key.split(":")[1])
+        assert json.loads(value)["nodes"][0]["title"] == "x" * generation
@@ -0,0 +1,141 @@
+import os
+
+import pytest
+from gremlin_python.process.traversal import Direction, T
+
+from backend.config import valid_edge_types, valid_node_types
+from backend.db.janusgraph import (
+    JanusGraphDB,
+    convert_edge_map,
+    convert_vertex_map,
+    convert_vertex_maps,
+)
+from backend.properties import NodeStatus
+
+NODE_TYPE = sorted(valid_node_types())[0]
+EDGE_TYPE = sorted(valid_edge_types())[0]
+
+needs_gremlin = pytest.mark.skipif(
+    not os.getenv("GREMLIN_TEST_HOST"),
+    reason="needs a local Gremlin server, e.g. that of docker-compose",
+)
+
+
+def test_element_maps_convert_to_typed_models():
+    node = convert_vertex_map(
+        {
+            T.id: 4,
+            T.label: "vertex",
+            "node_type": NODE_TYPE,
+            "title": "a",
+            "tags": "x;y",
+        }
+    )
+    assert (node.node_id, node.node_type, node.title) == (4, NODE_TYPE, "a")
+    assert node.tags == ["x", "y"]
+
+    edge = convert_edge_map(
+        {
+            T.id: "e1",
+            T.label: EDGE_TYPE,
+            Direction.OUT: {T.id: 4, T.label: "vertex"},
+            Direction.IN: {T.id: 8, T.label: "vertex"},
+        }
+    )
+    assert (edge.source, edge.target, edge.edge_type) == (4, 8, EDGE_TYPE)
+
+
+def test_trusted_conversion_matches_validated_one():
+    maps = [
+        {T.id: 1, T.label: "vertex", "node_type": NODE_TYPE, "title": "a"},
+        {T.id: 2, T.label: NODE_TYPE, "status": "live", "tags": "x", "stale": "?"},
+    ]
+    trusted = convert_vertex_maps(maps)
+    assert trusted == convert_vertex_maps(maps, trusted=False)
+    assert trusted[1].node_type == NODE_TYPE and trusted[1].tags == ["x"]
+    if "status" in type(trusted[1]).model_fields:
+        assert trusted[1].status is NodeStatus.live
+
+
+@pytest.fixture
+def graph():
+    graph = JanusGraphDB(os.environ["GREMLIN_TEST_HOST"], "g")
+    with graph.connection() as g:
+        g.V().drop().iterate()
+    yield graph
+    graph.close()
+
+
+@needs_gremlin
+def test_induced_subgraph_in_one_traversal(graph):
+    from gremlin_python.process.graph_traversal import __
+
+    with graph.connection() as g:
+        hub, *leaves = [
+            g.add_v().property("node_type", NODE_TYPE).next().id for _ in range(5)
+        ]
+        for leaf in leaves:
+            g.V(hub).add_e(EDGE_TYPE).to(__.V(leaf)).iterate()
+        far = g.add_v().property("node_type", NODE_TYPE).next().id
+        g.V(leaves[0]).add_e(EDGE_TYPE).to(__.V(far)).iterate()
+
+    one_hop = graph.get_induced_subgraph(hub, 1)
+    assert {n.node_id for n in one_hop.nodes} == {hub, *leaves}
+    assert {(e.source, e.target) for e in one_hop.edges} == {
+        (hub, leaf) for leaf in leaves
+    }
+    assert len(graph.get_induced_subgraph(hub, 2).nodes) == 6
+
+    capped = graph.get_induced_subgraph(hub, 1, max_degree=2)
+    assert len(capped.nodes) == 3 and len(capped.edges) == 2
+
+
+@needs_gremlin
+def test_search_subgraph_is_expanded_server_side_and_capped(graph):
+    from gremlin_python.process.graph_traversal import __
+
+    with graph.connection() as g:
+        hit, near, far = [
+            g.add_v()
+            .property("node_type", NODE_TYPE)
+            .property("title", title)
+            .next()
+            .id
+            for title in ("needle", "hay", "hay")
+        ]
+        g.V(hit).add_e(EDGE_TYPE).to(__.V(near)).iterate()
+        g.V(near).add_e(EDGE_TYPE).to(__.V(far)).iterate()
+
+    found = graph.get_search_subgraph(title="needle", levels=0)
+    assert [n.node_id for n in found.nodes] == [hit] and found.edges == []
+    found = graph.get_search_subgraph(title="needle", levels=1)
+    assert {n.node_id for n in found.nodes} == {hit, near}
+    assert [(e.source, e.target) for e in found.edges] == [(hit, near)]
+    assert len(graph.get_search_subgraph(title="needle", levels=2).nodes) == 3
+
+    capped = graph.get_search_subgraph(title="needle", levels=2, max_elements=3)
+    assert len(capped.nodes) == 3 and capped.edges == []
+
+
+def test_schema_bindings_follow_configuration():
+    from backend.db.janusgraph_schema import schema_bindings
+
+    bindings = schema_bindings()
+    assert "node_type" in bindings["keys"]
+    assert bindings["labels"] == sorted(valid_edge_types())
+    assert bindings["composite"]["by_node_type"] == ["node_type"]
+    assert "title" in bindings["mixed"]["node_text"]
+
+
+@pytest.mark.skipif(
+    not os.getenv("JANUSGRAPH_TEST_HOST"),
+    reason="needs a JanusGraph server, e.g. that of docker-compose.janusgraph.yaml",
+)
+def test_schema_bootstrap_is_idempotent(monkeypatch):
+    from backend.db import janusgraph_schema
+    from backend.settings import settings
+
+    monkeypatch.setattr(settings, "JANUSGRAPH_HOST", os.environ["JANUSGRAPH_TEST_HOST"])
+    monkeypatch.setattr(settings, "TRAVERSAL_SOURCE", "g_test")
+    janusgraph_schema.bootstrap(timeout=120)
+    assert janusgraph_schema.bootstrap(timeout=120) == []
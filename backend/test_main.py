@@ -12,9 +12,11 @@ from backend.db.connections import get_graph_db, get_graph_history_db
 from backend.main import app
 from backend.db.janusgraph import JanusGraphDB
 from backend.db.postgresql import GraphHistoryPostgreSQLDB
+from backend.db.postgresql_async import AsyncGraphHistoryPostgreSQLDB
 from backend.config import valid_node_types, valid_edge_types
 from backend.api.auth import get_current_user
-from backend.models.fixed import UserRead
+from backend.models.fixed import EntityState, EntityType, GraphHistoryEvent, UserRead
+from sqlmodel import Session
 
 # Database configuration
 POSTGRES_TEST_DB_URL = os.getenv(
@@ -42,11 +44,15 @@ def graph_db(request):
 
 
 @pytest.fixture(autouse=True, scope="module")
-def setup_test_db(graph_db):
+def setup_test_db(graph_db, db_async):
     """Set up test database and override app dependencies."""
     # Set up PostgreSQL test database
-    graph_history_db = GraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
-    graph_history_db.reset_whole_graph()
+    GraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL).reset_whole_graph()
+    graph_history_db = (
+        AsyncGraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
+        if db_async
+        else GraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
+    )
 
     # Override dependencies
     app.dependency_overrides[get_graph_history_db] = lambda: graph_history_db
@@ -76,7 +82,8 @@ def setup_test_db(graph_db):
 @pytest.fixture(scope="module")
 def client(setup_test_db):
     """Fixture to provide TestClient with proper database setup."""
-    return TestClient(app)
+    with TestClient(app) as client:
+        yield client
 
 
 @pytest.fixture
@@ -135,6 +142,78 @@ def test_graph_summary(client):
     assert isinstance(summary["edges"], int)
 
 
+def test_whole_graph_conditional_get(client):
+    """Test that /graph is tagged, encoded, and answered 304 until a change."""
+    response = client.get("/graph", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/graph", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    node_type = list(valid_node_types())[0]
+    client.post("/nodes", json={"node_type": node_type})
+    response = client.get("/graph", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_graph_generation_follows_commits(client):
+    """Test that the generation tagging graph reads moves on commits only."""
+    db = GraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
+    before = db.get_generation()
+    node_type = list(valid_node_types())[0]
+    with Session(db.engine) as session:
+        session.add(
+            GraphHistoryEvent(
+                state=EntityState.created,
+                entity_type=EntityType.node,
+                node_id=10**7,
+                payload={"node_id": 10**7, "node_type": node_type},
+                username="test",
+            )
+        )
+        session.flush()  # an event ID is taken, but not committed
+        assert db.get_generation() == before
+        session.rollback()
+    assert db.get_generation() == before
+
+    client.post("/nodes", json={"node_type": node_type})
+    assert db.get_generation() > before
+
+
+def test_graph_writers_only_queue_for_the_generation_on_commit(client):
+    """Test that a transaction bumps the generation once, as it commits."""
+    from sqlalchemy import text
+
+    db = GraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
+    before = db.get_generation()
+    node_type = list(valid_node_types())[0]
+
+    def write(session, node_id):
+        session.add(
+            GraphHistoryEvent(
+                state=EntityState.created,
+                entity_type=EntityType.node,
+                node_id=node_id,
+                payload={"node_id": node_id, "node_type": node_type},
+                username="test",
+            )
+        )
+        session.flush()
+
+    with Session(db.engine) as first, Session(db.engine) as second:
+        write(first, 10**7 + 1)
+        write(first, 10**7 + 2)
+        # fails rather than waits, should the first writer hold the generation
+        second.exec(text("SET LOCAL lock_timeout = '1s'"))
+        write(second, 10**7 + 3)
+        second.commit()
+        first.commit()
+    assert db.get_generation() == before + 2
+
+
 def test_reset_whole_graph(client):
     """Test resetting the entire graph."""
     # Create a node first
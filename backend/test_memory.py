@@ -0,0 +1,165 @@
+import pytest
+from fastapi import HTTPException
+
+from backend.config import valid_edge_types, valid_node_types
+from backend.db.memory import GraphArrays, MemoryGraphDB
+from backend.properties import NodeStatus
+
+NODE_TYPE = sorted(valid_node_types())[0]
+EDGE_TYPE = sorted(valid_edge_types())[0]
+
+
+def a_node(node_id: int, **props) -> dict:
+    return {"node_id": node_id, "node_type": NODE_TYPE, **props}
+
+
+def an_edge(source: int, target: int) -> dict:
+    return {"source": source, "target": target, "edge_type": EDGE_TYPE}
+
+
+@pytest.fixture
+def graph():
+    """1 -> 2 -> 3 -> 4, and 1 -> 5."""
+    graph = MemoryGraphDB()
+    graph._arrays = GraphArrays.build(
+        [
+            a_node(1, title="Solar panels", tags=["Energy", "roofs"]),
+            a_node(2, title="Wind farms", status="realised", tags=["energy"]),
+            a_node(3, title="Heat pumps"),
+            a_node(4),
+            a_node(5, title="Solar roads"),
+        ],
+        [an_edge(1, 2), an_edge(2, 3), an_edge(3, 4), an_edge(1, 5), an_edge(9, 1)],
+    )
+    return graph
+
+
+def test_arrays_intern_strings_and_index_edges(graph):
+    arrays = graph.arrays
+    assert arrays.strings.count(NODE_TYPE) == 1
+    assert len(arrays.edge_types) == 4  # the edge from missing node 9 is dropped
+    assert sorted(arrays.neighbours(arrays.position[1])) == [
+        arrays.position[2],
+        arrays.position[5],
+    ]
+    node = graph.get_node(2)
+    assert (node.node_type, node.title, node.tags) == (
+        NODE_TYPE,
+        "Wind farms",
+        ["energy"],
+    )
+    if "status" in type(node).model_fields:
+        assert node.status is NodeStatus.realised
+
+
+def test_searches_match_those_of_the_history(graph):
+    assert [n.node_id for n in graph.search_nodes(title="solar")] == [1, 5]
+    assert [n.node_id for n in graph.search_nodes(title="solar pan")] == [1]
+    assert [n.node_id for n in graph.search_nodes(tags=["ENERGY"])] == [1, 2]
+    assert graph.search_nodes(node_type="unknown") == []
+    if "status" in graph.arrays.node_props:
+        found = graph.search_nodes(status=[NodeStatus.realised])
+        assert [n.node_id for n in found] == [2]
+
+
+def test_subgraphs_are_expanded_in_memory(graph):
+    induced = graph.get_induced_subgraph(2, 1)
+    assert {n.node_id for n in induced.nodes} == {1, 2, 3}
+    assert {(e.source, e.target) for e in induced.edges} == {(1, 2), (2, 3)}
+    assert len(graph.get_induced_subgraph(1, 1, max_degree=1).nodes) == 2
+    with pytest.raises(HTTPException):
+        graph.get_induced_subgraph(42, 1)
+
+    found = graph.get_search_subgraph(title="wind", levels=2)
+    assert {n.node_id for n in found.nodes} == {1, 2, 3, 4, 5}
+    capped = graph.get_search_subgraph(title="wind", levels=2, max_elements=4)
+    assert [n.node_id for n in capped.nodes] == [2, 3, 1, 4]  # out, then in
+    assert capped.edges == []
+    capped = graph.get_search_subgraph(title="wind", levels=1, max_elements=4)
+    assert len(capped.nodes) == 3 and len(capped.edges) == 1
+
+
+def test_edges_are_found_and_written_in_memory(graph):
+    assert [(e.source, e.target) for e in graph.find_edges(source_id=1)] == [
+        (1, 2),
+        (1, 5),
+    ]
+    assert [e.source for e in graph.find_edges(target_id=2)] == [1]
+    assert graph.find_edges(source_id=1, target_id=3) == []
+    assert graph.find_edges(edge_type="unknown") == []
+
+    graph.delete_node(2)
+    assert graph.get_graph_summary() == {"nodes": 4, "edges": 2}
+    with pytest.raises(HTTPException):
+        graph.get_edge(1, 2)
+    assert graph.get_random_node(NODE_TYPE).node_id in {1, 3, 4, 5}
+
+
+def test_workers_share_snapshots(graph, tmp_path, monkeypatch):
+    writer = MemoryGraphDB(snapshot_dir=str(tmp_path))
+    writer._arrays = graph.arrays
+    writer._first_event, writer._last_event = 1, 7
+    writer._publish()
+    assert isinstance(writer.arrays.node_ids, memoryview)
+    assert writer.get_graph_summary() == graph.get_graph_summary()
+
+    reader = MemoryGraphDB(snapshot_dir=str(tmp_path))
+    monkeypatch.setattr(reader, "_load_history", None)  # no replay
+    reader.load()
+    assert reader._last_event == 7
+    assert reader.get_whole_graph() == graph.get_whole_graph()
+    assert [n.node_id for n in reader.search_nodes(tags=["energy"])] == [1, 2]
+    assert reader.get_induced_subgraph(2, 1) == graph.get_induced_subgraph(2, 1)
+
+    writer.delete_node(2)
+    writer._publish()
+    with reader.snapshots.lock() as writing:
+        assert writing
+        with writer.snapshots.lock() as other:
+            assert not other
+    assert reader._follow() and reader.get_graph_summary() == {"nodes": 4, "edges": 2}
+
+
+def test_changes_are_appended_without_a_rebuild(graph, tmp_path, monkeypatch):
+    def state(arrays: GraphArrays) -> tuple:
+        nodes = sorted(
+            (arrays.node_payload(p) for p in arrays.positions()),
+            key=lambda n: n["node_id"],
+        )
+        edges = sorted(
+            (arrays.edge_payload(e) for e in arrays.edge_indexes()),
+            key=lambda e: (e["source"], e["target"]),
+        )
+        around = {
+            arrays.node_ids[p]: sorted(arrays.node_ids[q] for q in arrays.neighbours(p))
+            for p in arrays.positions()
+        }
+        return nodes, edges, around, [arrays.node_ids[p] for p in arrays.search()]
+
+    arrays = graph.arrays
+    nodes = {
+        2: a_node(2, title="Wind turbines", tags=["wind"]),
+        6: a_node(6, title="Tidal power"),
+        4: None,
+    }
+    edges = {(1, 5): None, (6, 1): an_edge(6, 1), (2, 6): an_edge(2, 6)}
+    monkeypatch.setattr(GraphArrays, "build", None)  # no rebuild
+    changed = arrays.apply(nodes, edges)
+    assert changed.out_edges is arrays.out_edges
+    monkeypatch.undo()
+
+    expected = GraphArrays.build(
+        [a_node(1, title="Solar panels", tags=["Energy", "roofs"])]
+        + [a_node(3, title="Heat pumps"), a_node(5, title="Solar roads")]
+        + [p for p in nodes.values() if p is not None],
+        [an_edge(1, 2), an_edge(2, 3), *(p for p in edges.values() if p)],
+    )
+    assert state(changed) == state(expected)
+    assert changed.code("wind") is not None and len(changed) == 5
+
+    writer = MemoryGraphDB(snapshot_dir=str(tmp_path))
+    writer._arrays = changed
+    writer._first_event, writer._last_event = 1, 9
+    writer._publish()
+    assert state(writer.arrays) == state(expected)
+    assert [n.node_id for n in writer.search_nodes(tags=["wind"])] == [2]
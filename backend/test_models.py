@@ -155,6 +155,72 @@ def test_dynamic_edge_model_has_properties():
     assert edge.edge_type == edge_type
 
 
+def test_dynamic_unions_are_tagged_by_type():
+    """DynamicSubgraph validates each element as the model its type names"""
+    from backend.models.dynamic import DynamicNodeAdapter, DynamicSubgraph
+
+    node_types = sorted(valid_node_types())
+    subgraph = DynamicSubgraph(
+        nodes=[{"node_type": nt, "node_id": i} for i, nt in enumerate(node_types)],
+        edges=[],
+    )
+    assert [type(n) for n in subgraph.nodes] == [NodeTypeModels[nt] for nt in node_types]
+
+    with pytest.raises(ValidationError) as exc_info:
+        DynamicNodeAdapter.validate_python({"node_type": "unknown"})
+    assert exc_info.value.errors()[0]['type'] == 'union_tag_invalid'
+
+
+def test_stored_payloads_are_constructed_as_validated():
+    """construct_node/construct_edge build what validation would, without it"""
+    from backend.models.dynamic import construct_edge, construct_node
+
+    node_type = sorted(valid_node_types())[0]
+    payload = {"node_type": node_type, "node_id": 3, "title": "t", "stale": "?"}
+    node = construct_node(payload)
+    assert type(node) is NodeTypeModels[node_type]
+    assert node == NodeTypeModels[node_type](**payload)
+
+    edge_type = sorted(valid_edge_types())[0]
+    edge = construct_edge({"edge_type": edge_type, "source": 1, "target": 2})
+    assert edge == EdgeTypeModels[edge_type](source=1, target=2)
+    assert isinstance(valid_node_types(), frozenset)
+
+
+def test_graph_reads_build_from_prefetched_events():
+    """Graph reads of a prefetched repository build without a session"""
+    from backend.db.postgresql import GraphHistoryPostgreSQLDB
+    from backend.models.fixed import EntityState, EntityType, GraphHistoryEvent
+
+    node_type = sorted(valid_node_types())[0]
+    edge_type = sorted(valid_edge_types())[0]
+    nodes = [
+        GraphHistoryEvent(
+            state=EntityState.created,
+            entity_type=EntityType.node,
+            node_id=i,
+            payload={"node_id": i, "node_type": node_type},
+            username="u",
+        )
+        for i in (1, 2, 3)
+    ]
+    edges = [
+        GraphHistoryEvent(
+            state=EntityState.created,
+            entity_type=EntityType.edge,
+            node_id=None,
+            source_id=1,
+            target_id=2,
+            payload={"source": 1, "target": 2, "edge_type": edge_type},
+            username="u",
+        )
+    ]
+    repo = GraphHistoryPostgreSQLDB.prefetched((nodes, edges))
+    assert repo.get_graph_summary() == {"nodes": 3, "edges": 1}
+    subgraph = repo.get_induced_subgraph(1, levels=1)
+    assert {node.node_id for node in subgraph.nodes} == {1, 2}
+
+
 # Test Subgraph Model
 # ===================
 
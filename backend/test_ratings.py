@@ -24,12 +24,16 @@ from backend.config import valid_node_types, valid_edge_types
 
 
 @pytest.fixture(scope="module", autouse=True)
-def setup_test_env():
+def setup_test_env(db_async):
     """Set up test environment including authentication override and database reset."""
     from backend.db.postgresql import (
         RatingHistoryPostgreSQLDB,
         GraphHistoryPostgreSQLDB,
     )
+    from backend.db.postgresql_async import (
+        AsyncGraphHistoryPostgreSQLDB,
+        AsyncRatingHistoryPostgreSQLDB,
+    )
     from backend.db.connections import get_graph_history_db, get_rating_history_db
 
     # Override authentication
@@ -44,12 +48,20 @@ def setup_test_env():
     # Reset rating database
     rating_db = RatingHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
     rating_db.reset_table()
-    app.dependency_overrides[get_rating_history_db] = lambda: rating_db
+    served_rating_db = (
+        AsyncRatingHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL) if db_async else rating_db
+    )
+    app.dependency_overrides[get_rating_history_db] = lambda: served_rating_db
 
     # Reset graph history and seed minimal nodes/edges
     graph_history_db = GraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
     graph_history_db.reset_whole_graph()
-    app.dependency_overrides[get_graph_history_db] = lambda: graph_history_db
+    served_graph_history_db = (
+        AsyncGraphHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
+        if db_async
+        else graph_history_db
+    )
+    app.dependency_overrides[get_graph_history_db] = lambda: served_graph_history_db
 
     node_type = list(valid_node_types())[0]
     edge_type = list(valid_edge_types())[0]
@@ -83,7 +95,8 @@ def setup_test_env():
             )
         )
 
-    yield
+    with client:
+        yield
 
     # Cleanup
     rating_db.reset_table()
@@ -229,3 +242,184 @@ def test_edge_median_rating():
     data = response.json()
     # Ratings [1.0, 3.0, 4.0] median is 3.0
     assert data["median_rating"] == 3.0
+
+
+def test_top_rated_nodes():
+    client.post(
+        "/nodes/10/ratings",
+        json={
+            "entity_type": "node",
+            "node_id": 10,
+            "poll_label": "support",
+            "rating": 1.0,
+        },
+    )
+
+    response = client.get("/polls/support/top", params={"k": 2})
+    assert response.status_code == 200
+    top = response.json()
+    assert len(top) == 2
+    assert all(entry["value"] == 4.0 for entry in top)
+    assert {entry["node_id"] for entry in top} == {1, 2}
+
+    response = client.get("/polls/support/top", params={"k": 1, "order": "asc"})
+    assert response.status_code == 200
+    bottom = response.json()
+    assert bottom[0]["node_id"] == 10
+    assert bottom[0]["value"] == 1.0
+    assert bottom[0]["count"] == 1
+
+
+def test_top_rated_unknown_poll():
+    response = client.get("/polls/does-not-exist/top")
+    assert response.status_code == 404
+
+
+def test_rating_distributions():
+    response = client.get(
+        "/polls/support/distribution",
+        params={"node_ids": [1, 10, 20], "edge_ids": ["30-40"]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["nodes"]["20"] is None
+    assert data["edges"]["30-40"] is None
+    stats = data["nodes"]["1"]
+    assert stats["count"] == 1
+    assert stats["median"] == 4.0
+    assert stats["iqr"] == 0.0
+    assert stats["stddev"] == 0.0
+    # discrete poll: one bucket per configured option
+    assert set(stats["histogram"]) == {"1", "2", "3"}
+    assert data["nodes"]["10"]["histogram"]["1"] == 1
+
+
+def test_get_my_ratings_batch():
+    response = client.get(
+        "/users/me/ratings",
+        params={"node_ids": [1, 20], "edge_ids": ["10-20"]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["nodes"]["1"]["support"]["rating"] == 4.0
+    assert data["nodes"]["20"] == {}
+    assert data["edges"]["10-20"]["necessity"]["rating"] == 2.0
+
+    response = client.get(
+        "/users/me/ratings",
+        params={"edge_ids": ["10-20"], "poll_label": "support"},
+    )
+    assert response.status_code == 200
+    assert response.json()["edges"]["10-20"] == {}
+
+
+def test_log_ratings_batch():
+    items = [
+        {"entity_type": "node", "node_id": 30, "poll_label": "support", "rating": 1},
+        {"entity_type": "node", "node_id": 40, "poll_label": "support", "rating": 5},
+        {"entity_type": "node", "node_id": 999, "poll_label": "support", "rating": 2},
+        {"entity_type": "node", "node_id": 30, "poll_label": "nope", "rating": 2},
+        {
+            "entity_type": "edge",
+            "source_id": 30,
+            "target_id": 40,
+            "poll_label": "support",
+            "rating": 3,
+        },
+    ]
+    response = client.post("/ratings/batch", json=items)
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["status"] for r in results] == [201, 400, 404, 400, 201]
+    assert results[0]["rating"]["node_id"] == 30
+    assert results[0]["rating"]["username"] == "testuser"
+    assert results[4]["rating"]["source_id"] == 30
+
+    response = client.get("/nodes/30/ratings/me", params={"poll_label": "support"})
+    assert response.status_code == 200
+    assert response.json()["rating"] == 1.0
+
+
+def test_concurrent_ratings_are_all_aggregated():
+    """A rating of an entity logged while another commits is not lost."""
+    import threading
+
+    from sqlmodel import Session, select
+
+    from backend.db.postgresql import RatingHistoryPostgreSQLDB
+    from backend.models.fixed import RatingAggregate, RatingEvent
+
+    rating_db = RatingHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
+
+    def rating(username):
+        return RatingEvent(
+            entity_type=EntityType.node,
+            node_id=20,
+            poll_label="support",
+            rating=3,
+            username=username,
+        )
+
+    with Session(rating_db.engine) as session:
+        rating_db.with_session(session).log_rating(rating("first"))
+        other = threading.Thread(target=rating_db.log_rating, args=(rating("second"),))
+        other.start()
+        other.join(timeout=0.5)
+        assert other.is_alive()  # waits for the first to commit
+        session.commit()
+    other.join()
+
+    with Session(rating_db.engine) as session:
+        aggregate = session.exec(
+            select(RatingAggregate).where(
+                RatingAggregate.poll_label == "support",
+                RatingAggregate.entity_type == EntityType.node,
+                RatingAggregate.entity_key == "20",
+            )
+        ).one()
+    assert aggregate.count == 2
+
+
+def test_node_rating_timeline():
+    from backend.db.postgresql import RatingHistoryPostgreSQLDB
+
+    response = client.get("/nodes/1/ratings/timeline", params={"poll_label": "support"})
+    assert response.status_code == 200
+    points = response.json()
+    assert len(points) == 1
+    assert points[0]["value"] == 4.0
+    assert points[0]["count"] == 1
+
+    response = client.get(
+        "/nodes/1/ratings/timeline",
+        params={"poll_label": "support", "bucket": "hour"},
+    )
+    assert response.status_code == 200
+    assert response.json()[-1]["value"] == 4.0
+
+    # rebuilding from the event log gives the same series
+    rating_db = RatingHistoryPostgreSQLDB(POSTGRES_TEST_DB_URL)
+    assert rating_db.backfill_rating_rollups("support") > 0
+    response = client.get("/nodes/1/ratings/timeline", params={"poll_label": "support"})
+    assert response.json() == points
+
+
+def test_node_rating_timeline_is_bounded():
+    def timeline(**params):
+        return client.get(
+            "/nodes/1/ratings/timeline", params={"poll_label": "support", **params}
+        )
+
+    # ends now at the latest
+    future = timeline(end="9999-12-31T00:00:00")
+    assert future.status_code == 200
+    assert future.json() == timeline().json()
+
+    assert (
+        timeline(start="2024-02-01T00:00:00", end="2024-01-01T00:00:00").status_code
+        == 400
+    )
+    # more buckets than a timeline returns
+    assert timeline(bucket="hour", start="2000-01-01T00:00:00").status_code == 400
+    # not representable in UTC
+    assert timeline(start="0001-01-01T00:00:00+01:00").status_code == 400
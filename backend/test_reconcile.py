@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from backend.config import valid_edge_types, valid_node_types
+from backend.db.reconcile import Diff, compare, repair_calls
+
+NODE_TYPE = sorted(valid_node_types())[0]
+EDGE_TYPE = sorted(valid_edge_types())[0]
+
+
+class MemoryStore:
+    """Canonical states held in memory; records the ranges read back."""
+
+    def __init__(self, states: dict):
+        self._states = states
+        self.reads = []
+
+    def states(self, kind, ranges=None):
+        self.reads.append(ranges)
+        for key, state in self._states[kind].items():
+            source = key if kind == "node" else key[0]
+            if ranges is None or any(lo <= source < hi for lo, hi in ranges):
+                yield key, state
+
+
+def a_graph(nodes: int = 50) -> dict:
+    return {
+        "node": {i: {"type": NODE_TYPE, "title": f"node {i}"} for i in range(nodes)},
+        "edge": {(i, i + 1): {"type": EDGE_TYPE} for i in range(nodes - 1)},
+    }
+
+
+def test_identical_stores_are_not_read_back():
+    source, replica = MemoryStore(a_graph()), MemoryStore(a_graph())
+    assert compare(source, replica, "node", width=8) == []
+    assert source.reads == replica.reads == [None]
+
+
+def test_only_mismatching_buckets_are_read_back():
+    states = a_graph()
+    states["node"][3]["title"] = "renamed"
+    del states["node"][20]
+    states["node"][1000] = {"type": NODE_TYPE}
+    replica = MemoryStore(states)
+
+    diffs = compare(MemoryStore(a_graph()), replica, "node", width=8)
+    assert [(d.key, d.expected is None, d.actual is None) for d in diffs] == [
+        (3, False, False),
+        (20, False, True),
+        (1000, True, False),
+    ]
+    assert replica.reads[1] == [(0, 8), (16, 24), (1000, 1008)]
+    assert str(diffs[0]) == "node 3: differs on title"
+
+
+def test_repairs_upsert_from_history_and_delete_extras():
+    class History:
+        def get_node(self, node_id):
+            return f"node {node_id}"
+
+        def get_edge(self, source_id, target_id):
+            return f"edge {source_id}-{target_id}"
+
+    diffs = [
+        Diff("node", 1, {"type": NODE_TYPE}, {"type": NODE_TYPE, "title": "x"}),
+        Diff("node", 2, {"type": NODE_TYPE}, None),  # cannot be recreated
+        Diff("node", 3, None, {"type": NODE_TYPE}),
+        Diff("edge", (1, 3), {"type": EDGE_TYPE}, None),
+        Diff("edge", (3, 1), None, {"type": EDGE_TYPE}),
+    ]
+    assert list(repair_calls(diffs, History())) == [
+        ("update_node", {"node": "node 1"}),
+        ("delete_node", {"node_id": 3}),
+        ("update_edge", {"edge": "edge 1-3"}),
+        (
+            "delete_edge",
+            {"source_id": 3, "target_id": 1, "edge_type": EDGE_TYPE},
+        ),
+    ]
+
+
+@pytest.mark.skipif(
+    not os.getenv("GREMLIN_TEST_HOST"),
+    reason="needs a local Gremlin server, e.g. that of docker-compose",
+)
+def test_janusgraph_states_match_history_form():
+    from gremlin_python.process.graph_traversal import __
+
+    from backend.db.janusgraph import JanusGraphDB
+    from backend.db.reconcile import JanusGraphStore, canonical
+    from backend.config import NODE_TYPE_PROPS
+
+    graph = JanusGraphDB(os.environ["GREMLIN_TEST_HOST"], "g")
+    try:
+        with graph.connection() as g:
+            g.V().drop().iterate()
+            a = g.add_v().property("node_type", NODE_TYPE).property("title", "a").next()
+            b = g.add_v().property("node_type", NODE_TYPE).next()
+            g.V(a.id).add_e(EDGE_TYPE).to(__.V(b.id)).iterate()
+        store = JanusGraphStore(graph)
+        nodes = dict(store.states("node"))
+        assert nodes[a.id] == canonical(NODE_TYPE, {"title": "a"}, NODE_TYPE_PROPS)
+        assert dict(store.states("node", [(b.id, b.id + 1)])).keys() == {b.id}
+        assert dict(store.states("edge")) == {(a.id, b.id): {"type": EDGE_TYPE}}
+        paged = JanusGraphStore(graph, batch_size=1)  # a page per node
+        assert dict(paged.states("node")) == nodes
+        assert dict(paged.states("edge", [(a.id, a.id + 1)])).keys() == {(a.id, b.id)}
+    finally:
+        graph.close()
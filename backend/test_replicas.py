@@ -0,0 +1,137 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.config import get_current_config_hash, valid_node_types
+from backend.db import routing
+from backend.db.connections import get_graph_history_db
+from backend.db.routing import (
+    READ_PRIMARY_HEADER,
+    ReplicaSet,
+    one_replica,
+    read_only,
+    replica_url,
+    routed,
+)
+from backend.main import app
+from backend.models.dynamic import DynamicSubgraph, construct_node
+from backend.settings import settings
+from backend.utils.responses import etag
+
+NODE_TYPE = sorted(valid_node_types())[0]
+
+
+@pytest.fixture
+def two_replicas(monkeypatch):
+    lags = {"r1": 0.5, "r2": 1.0}
+    replica_set = ReplicaSet(["r1", "r2"], probe=lags.__getitem__, max_lag=10)
+    replica_set.check()
+    monkeypatch.setattr(routing, "_replicas", replica_set)
+    return replica_set, lags
+
+
+def test_replicas_round_robin_over_healthy(two_replicas):
+    replica_set, lags = two_replicas
+    assert [replica_set.pick() for _ in range(4)] == ["r1", "r2", "r1", "r2"]
+
+    lags["r2"] = 60  # lagging too far behind
+    replica_set.check()
+    assert {replica_set.pick() for _ in range(4)} == {"r1"}
+
+    replica_set.mark_down("r1")
+    assert replica_set.pick() is None
+    lags["r2"] = 0
+    replica_set.check()
+    assert {replica_set.pick() for _ in range(4)} == {"r1", "r2"}
+
+
+def test_only_outermost_read_only_calls_use_replicas(two_replicas):
+    seen = []
+
+    @routed
+    @read_only
+    def get_node():
+        seen.append(replica_url())
+
+    @routed
+    def update_node():
+        get_node()  # a read within a write must see the primary
+
+    get_node()
+    update_node()
+    assert seen[0] in {"r1", "r2"}
+    assert seen[1] is None
+
+    token = routing._pinned.set(True)
+    try:
+        get_node()
+    finally:
+        routing._pinned.reset(token)
+    assert seen[2] is None
+
+
+def test_writes_issue_read_your_writes_token(monkeypatch):
+    monkeypatch.setattr(settings, "POSTGRES_REPLICA_URLS_RAW", "postgresql://r1")
+    client = TestClient(app)
+
+    assert READ_PRIMARY_HEADER not in client.get("/").headers
+    response = client.post("/auth/logout")
+    assert response.status_code == 200
+    until = float(response.headers[READ_PRIMARY_HEADER])
+    assert time.time() < until <= time.time() + settings.READ_YOUR_WRITES_SECONDS
+    assert routing._pinned_until(str(until))
+    assert not routing._pinned_until(str(time.time() - 1))
+    assert not routing._pinned_until(str(time.time() + 3600))
+
+
+@pytest.mark.skipif(
+    not os.getenv("POSTGRES_REPLICA_TEST_URL"),
+    reason="needs a streaming replica of POSTGRES_DB_URL",
+)
+def test_probe_replica_lag():
+    lag = routing.probe_lag(os.environ["POSTGRES_REPLICA_TEST_URL"])
+    assert lag is not None and lag >= 0
+    assert routing.probe_lag(settings.POSTGRES_DB_URL) is None
+
+
+class LaggingHistory:
+    """A history whose replicas are at different generations."""
+
+    generations = {None: 7, "r1": 7, "r2": 5}
+
+    @routed
+    @read_only
+    def get_generation(self):
+        return self.generations[replica_url()]
+
+    @routed
+    @read_only
+    def get_whole_graph(self):
+        node = construct_node(
+            {"node_id": self.generations[replica_url()], "node_type": NODE_TYPE}
+        )
+        return DynamicSubgraph(nodes=[node], edges=[])
+
+
+def test_a_request_reads_a_single_replica(two_replicas):
+    replica_set, lags = two_replicas
+    app.dependency_overrides[get_graph_history_db] = LaggingHistory
+    client = TestClient(app)
+    try:
+        for _ in range(4):  # round robin would alternate replicas
+            response = client.get("/graph", headers={"Accept-Encoding": "identity"})
+            (node,) = response.json()["nodes"]
+            tag = etag(node["node_id"], get_current_config_hash(), "/graph", "")
+            assert response.headers["ETag"] == tag
+
+        with one_replica():
+            first = replica_url(read_only=True)
+            assert replica_url(read_only=True) == first
+            replica_set.mark_down(first)
+            assert replica_url(read_only=True) is None  # the primary, ahead
+            replica_set.check()
+            assert replica_url(read_only=True) is None
+    finally:
+        del app.dependency_overrides[get_graph_history_db]
@@ -0,0 +1,32 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from backend.utils.metrics import metrics
+from backend.utils.security import BoundedPool, hash_password, verify_password
+
+
+def test_hash_and_verify_password():
+    hashed = hash_password("securepassword")
+    assert verify_password("securepassword", hashed)
+    assert not verify_password("wrongpassword", hashed)
+    assert metrics.snapshot()["observations"]["password_hash.seconds"]["count"] >= 2
+
+
+def test_bounded_pool_rejects_when_saturated():
+    pool = BoundedPool("test_pool", workers=1, queue_limit=1)
+    release = threading.Event()
+    running = pool.submit(release.wait)
+    queued = pool.submit(release.wait)
+
+    with pytest.raises(HTTPException) as excinfo:
+        pool.submit(release.wait)
+    assert excinfo.value.status_code == 503
+    assert metrics.snapshot()["counters"]["test_pool.rejected"] == 1
+
+    release.set()
+    running.result()
+    queued.result()
+    pool.submit(lambda: None).result()
+    assert metrics.snapshot()["gauges"]["test_pool.queue_depth"] == 0
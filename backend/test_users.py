@@ -16,10 +16,11 @@ client = TestClient(app)
 
 
 @pytest.fixture(scope="module", autouse=True)
-def reset_db():
+def reset_db(db_async):
     db = UserPostgreSQLDB(POSTGRES_TEST_DB_URL)
     db.reset_user_table()
-    yield
+    with client:
+        yield
     db.reset_user_table()
 
 
@@ -90,3 +91,59 @@ def test_logout():
     response = client.post("/auth/logout")
     assert response.status_code == 200
     assert response.json()["msg"] == "Logout successful"
+
+
+def test_access_token_carries_role_version():
+    import jwt
+
+    from backend.api.auth import SECRET_KEY, ALGORITHM, invalidate_user
+
+    login_data = {"username": "testuser", "password": "securepassword"}
+    login_resp = client.post("/auth/login", data=login_data)
+    token = login_resp.json()["access_token"]
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    assert claims["sub"] == "testuser"
+    assert claims["ver"] == 0
+
+    # a role change revokes the token until it is refreshed
+    db = UserPostgreSQLDB(POSTGRES_TEST_DB_URL)
+    user = db.get_user("testuser")
+    user.token_version += 1
+    db.update_user(user)
+    invalidate_user("testuser")  # as the role endpoints do
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+    refresh_token = login_resp.json()["refresh_token"]
+    refresh_resp = client.post(
+        "/auth/refresh", headers={"Authorization": f"Bearer {refresh_token}"}
+    )
+    headers = {"Authorization": f"Bearer {refresh_resp.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+
+def test_duplicate_user_keeps_the_unit_of_work():
+    from fastapi import HTTPException
+    from sqlmodel import Session
+
+    from backend.models.fixed import UserCreate
+
+    db = UserPostgreSQLDB(POSTGRES_TEST_DB_URL)
+
+    def new_user(username):
+        return UserCreate(
+            username=username,
+            password="securepassword",
+            security_question="What is your favorite color?",
+            security_answer="Blue",
+        )
+
+    with Session(db.engine) as session:
+        bound = db.with_session(session)
+        bound.create_user(new_user("uowuser"))
+        with pytest.raises(HTTPException) as exc:
+            bound.create_user(new_user("testuser"))
+        assert exc.value.status_code == 400
+        session.commit()
+    # the duplicate rolled back its savepoint only, not the earlier insert
+    assert db.get_user("uowuser") is not None
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU mapping with an optional per-entry time-to-live. With
+    `max_bytes`, values are bytes and the least recently used are evicted to
+    keep their total length within it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl: float | None = None,
+        max_bytes: int | None = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _size(self, value: Any) -> int:
+        return len(value) if self.max_bytes is not None else 0
+
+    def _pop(self, key: Hashable, last: bool = True) -> None:
+        if last:
+            _, value = self._data.pop(key)
+        else:
+            key, (_, value) = self._data.popitem(last=False)
+        self.nbytes -= self._size(value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (expires_at, value)
+            self.nbytes += self._size(value)
+            while len(self._data) > self.maxsize or (
+                self.max_bytes is not None and self.nbytes > self.max_bytes
+            ):
+                self._pop(None, last=False)
+
+    def invalidate(
+        self,
+        key: Hashable = _MISSING,
+        predicate: Callable[[Hashable], bool] | None = None,
+    ) -> None:
+        """Drop one key, every key matching `predicate`, or everything."""
+        with self._lock:
+            if key is not _MISSING:
+                if key in self._data:
+                    self._pop(key)
+            elif predicate is not None:
+                for k in [k for k in self._data if predicate(k)]:
+                    self._pop(k)
+            else:
+                self._data.clear()
+                self.nbytes = 0
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedCache:
+    """
+    Bytes values shared by every worker, in a store with the get/set(ex=)
+    interface of a redis client, e.g. `SharedCache.from_url("redis://...")`.
+    Entries expire after `ttl` seconds; the store evicts by its own policy.
+    """
+
+    def __init__(self, client: Any, prefix: str = "", ttl: float | None = None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "SharedCache":
+        import redis  # optional: only with a shared cache configured
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        ex = max(1, round(self.ttl)) if self.ttl else None
+        self.client.set(self.prefix + key, value, ex=ex)
@@ -0,0 +1,73 @@
+"""
+In-process metrics: counters, gauges and timing observations, served as JSON
+by GET /metrics. Values are per worker process.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# observations keep this many recent samples for percentiles
+_SAMPLES = 1024
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._observations: dict[str, dict] = {}
+
+    def inc(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            obs = self._observations.get(name)
+            if obs is None:
+                obs = self._observations[name] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": value,
+                    "samples": deque(maxlen=_SAMPLES),
+                }
+            obs["count"] += 1
+            obs["sum"] += value
+            obs["max"] = max(obs["max"], value)
+            obs["samples"].append(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observe the wall time, in seconds, spent in the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            observations = {}
+            for name, obs in self._observations.items():
+                samples = sorted(obs["samples"])
+                observations[name] = {
+                    "count": obs["count"],
+                    "mean": obs["sum"] / obs["count"],
+                    "max": obs["max"],
+                    "p50": samples[len(samples) // 2],
+                    "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "observations": observations,
+            }
+
+
+metrics = Metrics()
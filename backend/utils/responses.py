@@ -0,0 +1,131 @@
+"""
+JSON responses of models built by the backend, for large graph payloads.
+
+Returned from an endpoint, a response is sent as is: FastAPI neither validates
+its content against the response model, which the endpoint should still
+declare for the API documentation, nor serializes it through
+jsonable_encoder. The models are serialized straight to bytes by
+pydantic-core instead, in one pass, then brotli- or gzip-encoded when the
+client accepts it and they are at least RESPONSE_COMPRESSION_MIN_BYTES.
+
+Graph responses are tagged with strong ETags derived from the generation of
+the history the graph they were built from reflects (see GraphGeneration),
+the schema hash and the URL, so that a request whose If-None-Match has the current one is answered 304
+without building the payload. An encoded response has the encoding appended
+to its ETag, as the representations differ; a client sending it back is
+answered 304 all the same.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+from backend.config import get_current_config_hash
+from backend.db.base import GraphDatabaseInterface
+from backend.db.connections import run_db
+from backend.settings import settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# the content codings produced, by preference
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 5
+
+
+def accepted_encoding(request: Request) -> str | None:
+    """The content coding to send to `request`, None for the identity."""
+    weights = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.partition(";")
+        params = params.strip()
+        try:
+            weight = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            continue
+        weights[coding.strip().lower()] = weight
+    for coding in ENCODINGS:
+        if weights.get(coding, weights.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def _encode(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=_GZIP_LEVEL)
+
+
+class ModelResponse(Response):
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: Any,
+        request: Request | None = None,
+        etag: str | None = None,
+        **kwargs,
+    ):
+        self.encoding = accepted_encoding(request) if request is not None else None
+        super().__init__(content, **kwargs)
+        if request is not None:
+            self.headers["Vary"] = "Accept-Encoding"
+        if self.encoding is not None:
+            self.headers["Content-Encoding"] = self.encoding
+        if etag is not None:
+            suffix = f"-{self.encoding}" if self.encoding else ""
+            self.headers["ETag"] = f'{etag[:-1]}{suffix}"'
+
+    def render(self, content: Any) -> bytes:
+        body = to_json(content)
+        if self.encoding is None or len(body) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            self.encoding = None
+            return body
+        return _encode(body, self.encoding)
+
+
+def etag(*parts) -> str:
+    """A strong entity tag of `parts`."""
+    digest = hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+async def graph_etag(request: Request, graph: GraphDatabaseInterface) -> str | None:
+    """
+    The ETag of the response to `request` built from `graph`, None if the
+    graph cannot tell which generation of the history it reflects. It is read
+    first, from the replica the payload is then read from (see db/routing.py),
+    so the payload is at least as recent.
+    """
+    generation = await run_db(graph.get_generation)
+    if generation is None:
+        return None
+    return etag(
+        generation, get_current_config_hash(), request.url.path, request.url.query
+    )
+
+
+def not_modified(request: Request, tag: str | None) -> Response | None:
+    """A 304 response if `request` has ETag `tag` in its If-None-Match."""
+    header = request.headers.get("if-none-match")
+    if tag is None or header is None:
+        return None
+    for candidate in header.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        stem, _, coding = candidate.strip('"').rpartition("-")
+        if candidate == tag or (coding in ENCODINGS and f'"{stem}"' == tag):
+            return Response(
+                status_code=304,
+                headers={"ETag": candidate, "Vary": "Accept-Encoding"},
+            )
+        if candidate == "*":
+            return Response(status_code=304, headers={"ETag": tag})
+    return None
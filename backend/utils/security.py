@@ -1,11 +1,95 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from backend.settings import settings
+from backend.utils.metrics import metrics
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+
+class BoundedPool:
+    """
+    Thread pool that refuses work, with a 503, once `workers` tasks are running
+    and `queue_limit` more are waiting. bcrypt releases the GIL, so threads are
+    enough to keep hashing on its own few cores and off the request workers.
+    """
+
+    def __init__(self, name: str, workers: int, queue_limit: int):
+        self.name = name
+        self.capacity = workers + queue_limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+
+    def _publish_depth(self) -> None:
+        metrics.set_gauge(f"{self.name}.queue_depth", self._in_flight - self._running)
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                metrics.inc(f"{self.name}.rejected")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server busy, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+            self._publish_depth()
+        enqueued = time.perf_counter()
+
+        def run():
+            with self._lock:
+                self._running += 1
+                self._publish_depth()
+            metrics.observe(
+                f"{self.name}.queue_wait_seconds", time.perf_counter() - enqueued
+            )
+            try:
+                with metrics.timer(f"{self.name}.seconds"):
+                    return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight -= 1
+                    self._publish_depth()
+
+        return self._executor.submit(run)
+
+
+_hash_pool = BoundedPool(
+    "password_hash",
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return _hash_pool.submit(pwd_context.hash, password).result()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _hash_pool.submit(
+        pwd_context.verify, plain_password, hashed_password
+    ).result()
+
+
+async def hash_password_async(password: str) -> str:
+    """`hash_password` for coroutines: waits on the pool, not in a thread."""
+    return await asyncio.wrap_future(_hash_pool.submit(pwd_context.hash, password))
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.wrap_future(
+        _hash_pool.submit(pwd_context.verify, plain_password, hashed_password)
+    )